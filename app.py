@@ -1,10 +1,21 @@
+import os
+import time
+
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import numpy as np
 
+from bmw_data import kpi_text, load_bmw
+from bmw_index import DatasetIndex, FilterState
+from bmw_cube import Cube
+from bmw_store import SharedCache, open_store
+import bmw_warmup
+from bmw_export import FORMATS, ExportCache
+import bmw_table
+from bmw_charts import (FOLLOWS, binned_histogram, box_figure, bubble_figure, category_bar, donut,
+                        heatmap, hierarchy, ranked_bar, swap_traces, tiered_scatter, violin_figure)
+
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 #  PAGE CONFIG
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -274,14 +285,30 @@ div[data-baseweb="tab-list"] {
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 #  DATA
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-@st.cache_data
+@st.cache_resource
 def load_data():
-    df = pd.read_csv("bmw.csv")
-    df.dropna(inplace=True)
-    df.drop_duplicates(inplace=True)
-    return df
+    # one memory-mapped, read-only frame shared by every session
+    # (cache_data would hand each rerun its own unpickled copy)
+    return load_bmw()
+
+@st.cache_resource
+def load_index(_df):
+    return DatasetIndex(_df)
+
+@st.cache_resource
+def load_cube(_df):
+    return Cube(_df)
+
+@st.cache_resource
+def load_results(version):
+    # in-process LRU in front of the host-wide result store (bmw_store),
+    # shared by every session here and every Streamlit process on the host
+    return SharedCache(int(os.environ.get("BMW_RESULT_CACHE_MB", "64")) << 20, open_store(version))
 
 df = load_data()
+index = load_index(df)
+cube = load_cube(df)
+results = load_results(df.attrs.get("version"))
 
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -307,6 +334,52 @@ def apply_bmw(fig):
 
 BMW_COLORS = ["#1B69D1", "#00B4D8", "#2EC4B6", "#FFB703", "#E63946", "#A78BFA", "#F472B6"]
 BMW_SEQ = ["#0D0D0D", "#1B69D1", "#4A90E2", "#00B4D8"]
+LEGEND_BELOW = dict(orientation="h", x=0.5, xanchor="center")
+
+
+def plot(name, fig, follow=(), **layout):
+    """Draw ``fig``'s traces in the session's skeleton of chart ``name``.
+
+    The first draw styles ``fig`` (BMW_LAYOUT, ``layout``, grid) and keeps
+    it; later reruns only swap the new traces, and the ``follow`` layout
+    entries, into it instead of validating the theme again.  This saves
+    server CPU only: st.plotly_chart still sends the whole figure.
+    """
+    skeletons = st.session_state.setdefault("chart_skeletons", {})
+    if name in skeletons:
+        fig = swap_traces(skeletons[name], fig, follow)
+    else:
+        fig.update_layout(**BMW_LAYOUT, **layout)
+        skeletons[name] = apply_bmw(fig)
+    st.plotly_chart(fig, width="stretch")
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  SLIDER UPDATES
+#  live     filters apply as they change (default).  Streamlit already
+#           folds widget changes that arrive during a run into a single
+#           rerun from the newest values.  While a drag goes on — the
+#           last run was cut short by a newer slider value — a rerun is
+#           also held for SLIDER_DEBOUNCE_MS first, so the next value
+#           stops it before any panel computes a passed-over range; a
+#           single move (click, keyboard) runs at once
+#  release  the filters sit in a form and apply together on its button
+#           (st.slider has no let-go event of its own)
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+SLIDER_UPDATE      = os.environ.get("BMW_SLIDER_UPDATE", "live")
+SLIDER_DEBOUNCE_MS = int(os.environ.get("BMW_SLIDER_DEBOUNCE_MS", "300"))
+
+
+def settle(sliders):
+    """Debounce a rerun a slider started while the previous run was cut
+    short (a drag); the caller's next st call is where Streamlit abandons
+    it if the slider moved again meanwhile."""
+    moved = st.session_state.get("slider_values", sliders) != sliders
+    interrupted = st.session_state.get("run_finished") is False   # set at the script's end
+    st.session_state["slider_values"] = sliders
+    st.session_state["run_finished"] = False
+    if moved and interrupted and SLIDER_UPDATE == "live" and SLIDER_DEBOUNCE_MS:
+        time.sleep(SLIDER_DEBOUNCE_MS / 1e3)
 
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -329,19 +402,24 @@ with st.sidebar:
     st.markdown('<p style="color:#999;font-size:0.7rem;font-weight:600;letter-spacing:0.12em;text-transform:uppercase;margin-bottom:0.5rem">FILTERS</p>', unsafe_allow_html=True)
 
     min_year, max_year = int(df["year"].min()), int(df["year"].max())
-    year_range = st.slider("Model Year", min_year, max_year, (min_year, max_year))
+    # "release": the filters apply together from the form's button
+    with st.form("filters", border=False) if SLIDER_UPDATE == "release" else st.container():
+        year_range = st.slider("Model Year", min_year, max_year, (min_year, max_year))
 
-    fuel_options = sorted(df["fuelType"].unique().tolist())
-    selected_fuels = st.multiselect("Fuel Type", fuel_options, default=fuel_options)
+        fuel_options = sorted(df["fuelType"].unique().tolist())
+        selected_fuels = st.multiselect("Fuel Type", fuel_options, default=fuel_options)
 
-    trans_options = sorted(df["transmission"].unique().tolist())
-    selected_trans = st.multiselect("Transmission", trans_options, default=trans_options)
+        trans_options = sorted(df["transmission"].unique().tolist())
+        selected_trans = st.multiselect("Transmission", trans_options, default=trans_options)
 
-    min_price, max_price = int(df["price"].min()), int(df["price"].max())
-    price_range = st.slider("Price (£)", min_price, max_price, (min_price, max_price), step=500)
+        min_price, max_price = int(df["price"].min()), int(df["price"].max())
+        price_range = st.slider("Price (£)", min_price, max_price, (min_price, max_price), step=500)
 
-    model_options = sorted(df["model"].unique().tolist())
-    selected_models = st.multiselect("Model", model_options, default=[])
+        model_options = sorted(df["model"].unique().tolist())
+        selected_models = st.multiselect("Model", model_options, default=[])
+        if SLIDER_UPDATE == "release":
+            st.form_submit_button("Apply filters", width="stretch")
+    settle((year_range, price_range))   # the next st call is a yield point
 
     st.markdown("---")
     st.markdown("""
@@ -356,16 +434,13 @@ with st.sidebar:
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 #  FILTERS
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-mask = (
-    df["year"].between(*year_range)
-    & df["fuelType"].isin(selected_fuels)
-    & df["transmission"].isin(selected_trans)
-    & df["price"].between(*price_range)
-)
-if selected_models:
-    mask &= df["model"].isin(selected_models)
-filtered = df[mask]
-n = len(filtered)
+def sidebar_state(year_range, fuels, trans, price_range, models):
+    return FilterState.make(year_range, price_range, fuels, trans, models or None)
+
+state = sidebar_state(year_range, selected_fuels, selected_trans, price_range, selected_models)
+st.session_state["filter_state"] = state   # what every panel fragment reads
+sel = index.select(state)
+n = sel.count
 
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -387,11 +462,12 @@ st.markdown(f"""
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 #  KPI CARDS
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-avg_price   = filtered["price"].mean()      if n else 0
-avg_mileage = filtered["mileage"].mean()    if n else 0
-avg_mpg     = filtered["mpg"].mean()        if n else 0
-avg_engine  = filtered["engineSize"].mean() if n else 0
-median_tax  = filtered["tax"].median()      if n else 0
+means       = cube.means(state, sel.rows)
+avg_price   = means["price"]
+avg_mileage = means["mileage"]
+avg_mpg     = means["mpg"]
+avg_engine  = means["engineSize"]
+median_tax  = cube.median(state, "tax", sel.rows)
 
 st.markdown(f"""
 <div class="kpi-row">
@@ -399,7 +475,7 @@ st.markdown(f"""
         <div class="kpi-top">
             <div class="kpi-badge badge-blue">💷</div>
         </div>
-        <div class="kpi-value">£{avg_price:,.0f}</div>
+        <div class="kpi-value">{kpi_text(avg_price, ",.0f", "£")}</div>
         <div class="kpi-label">Average Price</div>
         <div class="kpi-accent kpi-accent-blue"></div>
     </div>
@@ -407,7 +483,7 @@ st.markdown(f"""
         <div class="kpi-top">
             <div class="kpi-badge badge-cyan">🛣️</div>
         </div>
-        <div class="kpi-value">{avg_mileage:,.0f}</div>
+        <div class="kpi-value">{kpi_text(avg_mileage, ",.0f")}</div>
         <div class="kpi-label">Average Mileage</div>
         <div class="kpi-accent kpi-accent-cyan"></div>
     </div>
@@ -415,7 +491,7 @@ st.markdown(f"""
         <div class="kpi-top">
             <div class="kpi-badge badge-green">⛽</div>
         </div>
-        <div class="kpi-value">{avg_mpg:.1f}</div>
+        <div class="kpi-value">{kpi_text(avg_mpg, ".1f")}</div>
         <div class="kpi-label">Average MPG</div>
         <div class="kpi-accent kpi-accent-green"></div>
     </div>
@@ -423,7 +499,7 @@ st.markdown(f"""
         <div class="kpi-top">
             <div class="kpi-badge badge-amber">🔧</div>
         </div>
-        <div class="kpi-value">{avg_engine:.1f}L</div>
+        <div class="kpi-value">{kpi_text(avg_engine, ".1f", suffix="L")}</div>
         <div class="kpi-label">Avg Engine Size</div>
         <div class="kpi-accent kpi-accent-amber"></div>
     </div>
@@ -431,7 +507,7 @@ st.markdown(f"""
         <div class="kpi-top">
             <div class="kpi-badge badge-red">📋</div>
         </div>
-        <div class="kpi-value">£{median_tax:.0f}</div>
+        <div class="kpi-value">{kpi_text(median_tax, ".0f", "£")}</div>
         <div class="kpi-label">Median Road Tax</div>
         <div class="kpi-accent kpi-accent-red"></div>
     </div>
@@ -440,278 +516,390 @@ st.markdown(f"""
 
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-#  TABS
+#  PANEL DATA
+#  Every panel is a fragment: its own widgets rerun only that panel.
+#  Panels read the sidebar selection from st.session_state["filter_state"]
+#  and fetch their numbers through these caches, keyed on that state plus
+#  the panel's options — a filter change is a new key for every panel,
+#  a panel option recomputes only its own entry.
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-tab1, tab2, tab3, tab4 = st.tabs([
-    "Overview", "Price Analysis", "Inventory", "Data"
-])
-
-
-# ═══════════════════════ TAB 1 — OVERVIEW ════════════════════
-with tab1:
+def filter_state():
+    return st.session_state["filter_state"]
+
+# The results are shared by every session, not copied per rerun: panels
+# must not modify what these return.
+def tab_stats(state, name):
+    return results.get_or_compute("tab_stats", (state, name),
+                                  lambda: cube.tab(state, name, index.select(state).rows))
+
+def mpg_box(state):
+    def compute():
+        rows = index.select(state).rows
+        box = cube.box_stats(state, "mpg", "fuelType", rows)
+        return box, cube.outliers("mpg", box, "fuelType", rows)
+    return results.get_or_compute("mpg_box", (state,), compute)
+
+def mileage_histogram(state, bins):
+    def compute():
+        sel = index.select(state)
+        edges, hist = cube.histogram(state, "mileage", sel.rows, bins=bins)
+        box = cube.box_stats(state, "mileage", rows=sel.rows).iloc[0] if sel.count else None
+        return edges, hist, box
+    return results.get_or_compute("mileage_histogram", (state, bins), compute)
+
+def price_violins(state):
+    return results.get_or_compute("price_violins", (state,),
+                                  lambda: cube.violins(state, "price", "fuelType", index.select(state).rows))
+
+MILEAGE_BINS = 40   # the histogram's default
+
+# Warm-up (bmw_warmup): once per process, a background thread fills the
+# panel caches above for the default view and the one-filter views.
+def warm(year_range, fuels, trans, price_range, models):
+    state = sidebar_state(year_range, fuels, trans, price_range, models)
+    for name in ("overview", "pricing", "inventory"):
+        tab_stats(state, name)
+    mpg_box(state)
+    mileage_histogram(state, MILEAGE_BINS)
+    price_violins(state)
+
+@st.cache_resource
+def start_warmup():
+    warmup = bmw_warmup.Warmup(bmw_warmup.warm_filters(df), warm, sidebar_state)
+    return warmup.start() if bmw_warmup.ENABLED else warmup
+
+# a session's view counts once — not again on every rerun it makes
+if st.session_state.get("warmup_recorded") != state:
+    st.session_state["warmup_recorded"] = state
+    start_warmup().record(state)
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def table_rows(state, sort_col, descending, query):
+    rows = bmw_table.filter_rows(df, index.select(state).rows, query)
+    return bmw_table.sort_rows(df, rows, [{"column_id": sort_col,
+                                           "direction": "desc" if descending else "asc"}])
+
+@st.cache_resource
+def load_exports():
+    # finished exports on disk, per filter state and format, for every session
+    return ExportCache(int(os.environ.get("BMW_EXPORT_CACHE_MB", "512")) << 20)
+
+def export_file(state, fmt):
+    return load_exports().open(state, df, index.select(state).rows, fmt)
 
-    # ── Row 1: Fuel Bar + Transmission Donut ──
-    c1, c2 = st.columns([1.15, 1])
 
-    with c1:
-        st.markdown("""<div class="panel">
-            <div class="panel-header"><p class="panel-title">Fuel Type Breakdown</p><span class="panel-tag">Bar</span></div>
-            <p class="panel-subtitle">Number of listings per fuel category</p>""", unsafe_allow_html=True)
-        fc = filtered["fuelType"].value_counts().reset_index()
-        fc.columns = ["Fuel", "Count"]
-        fig = px.bar(fc, x="Fuel", y="Count", color="Fuel", text_auto=True,
-                     color_discrete_sequence=BMW_COLORS)
-        fig.update_layout(**BMW_LAYOUT, showlegend=False, height=360)
-        apply_bmw(fig)
-        fig.update_traces(textposition="outside", marker_line_width=0,
-                          marker_cornerradius=4)
-        st.plotly_chart(fig, width="stretch")
-        st.markdown('</div>', unsafe_allow_html=True)
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  PANELS
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+@st.fragment
+def fuel_panel():
+    st.markdown("""<div class="panel">
+        <div class="panel-header"><p class="panel-title">Fuel Type Breakdown</p><span class="panel-tag">Bar</span></div>
+        <p class="panel-subtitle">Number of listings per fuel category</p>""", unsafe_allow_html=True)
+    fig = category_bar(tab_stats(filter_state(), "overview").counts("fuelType"), "Fuel", BMW_COLORS)
+    fig.update_traces(textposition="outside", marker_line_width=0,
+                      marker_cornerradius=4)
+    plot("fuel", fig, showlegend=False, height=360, xaxis_title="Fuel", yaxis_title="Count")
+    st.markdown('</div>', unsafe_allow_html=True)
 
-    with c2:
-        st.markdown("""<div class="panel">
-            <div class="panel-header"><p class="panel-title">Transmission Split</p><span class="panel-tag">Donut</span></div>
-            <p class="panel-subtitle">Proportion by gearbox type</p>""", unsafe_allow_html=True)
-        tc = filtered["transmission"].value_counts().reset_index()
-        tc.columns = ["Trans", "Count"]
-        fig = px.pie(tc, names="Trans", values="Count", hole=0.58,
-                     color_discrete_sequence=BMW_COLORS)
-        fig.update_layout(**BMW_LAYOUT, height=360, showlegend=True,
-                          legend=dict(orientation="h", y=-0.12, x=0.5, xanchor="center",
-                                      font=dict(size=11)))
-        apply_bmw(fig)
-        fig.update_traces(textinfo="percent+label", textfont_size=11,
-                          pull=[0.015]*len(tc), marker_line_width=0)
-        st.plotly_chart(fig, width="stretch")
-        st.markdown('</div>', unsafe_allow_html=True)
+@st.fragment
+def transmission_panel():
+    st.markdown("""<div class="panel">
+        <div class="panel-header"><p class="panel-title">Transmission Split</p><span class="panel-tag">Donut</span></div>
+        <p class="panel-subtitle">Proportion by gearbox type</p>""", unsafe_allow_html=True)
+    tc = tab_stats(filter_state(), "overview").counts("transmission")
+    fig = donut(tc, "Trans", 0.58)
+    fig.update_traces(textinfo="percent+label", textfont_size=11,
+                      pull=[0.015]*len(tc), marker_line_width=0)
+    plot("transmission", fig, height=360, showlegend=True, piecolorway=BMW_COLORS,
+         legend=dict(LEGEND_BELOW, y=-0.12, font=dict(size=11)))
+    st.markdown('</div>', unsafe_allow_html=True)
 
-    # ── Row 2: Price Trend — Full Width ──
+@st.fragment
+def price_trend_panel():
     st.markdown("""<div class="panel">
         <div class="panel-header"><p class="panel-title">Average Price Trajectory</p><span class="panel-tag">Trend</span></div>
         <p class="panel-subtitle">Year-over-year average price with volume overlay</p>""", unsafe_allow_html=True)
 
-    agg = filtered.groupby("year").agg(avg=("price","mean"), cnt=("price","count")).reset_index()
-    fig = make_subplots(specs=[[{"secondary_y": True}]])
-    fig.add_trace(go.Bar(
-        x=agg["year"], y=agg["cnt"], name="Volume",
+    agg = (tab_stats(filter_state(), "overview")["year"]
+           .rename(columns={"price_mean": "avg", "count": "cnt"}))
+    fig = go.Figure([go.Bar(
+        x=agg["year"], y=agg["cnt"], name="Volume", yaxis="y2",
         marker_color="rgba(27,105,209,0.15)", marker_line_width=0,
         hovertemplate="<b>%{x}</b><br>Listings: %{y:,}<extra></extra>",
-    ), secondary_y=True)
-    fig.add_trace(go.Scatter(
+    ), go.Scatter(
         x=agg["year"], y=agg["avg"], name="Avg Price", mode="lines+markers",
         line=dict(color="#1B69D1", width=2.5, shape="spline"),
         marker=dict(size=7, color="#1B69D1", line=dict(width=2, color="#0D0D0D")),
         fill="tozeroy", fillcolor="rgba(27,105,209,0.06)",
         hovertemplate="<b>%{x}</b><br>Avg: £%{y:,.0f}<extra></extra>",
-    ), secondary_y=False)
-    fig.update_layout(**BMW_LAYOUT, height=370, showlegend=True,
-                      legend=dict(orientation="h", y=1.08, x=0.5, xanchor="center", font=dict(size=11)))
-    fig.update_xaxes(dtick=1, title="Year", gridcolor="#2A2A2A")
-    fig.update_yaxes(title="Avg Price (£)", tickprefix="£", separatethousands=True,
-                     secondary_y=False, gridcolor="#2A2A2A")
-    fig.update_yaxes(title="Listings", showgrid=False, secondary_y=True)
-    apply_bmw(fig)
-    st.plotly_chart(fig, width="stretch")
+    )])
+    # volume on a secondary axis, as make_subplots(secondary_y=True) lays it out
+    plot("price_trend", fig, height=370, showlegend=True,
+         legend=dict(LEGEND_BELOW, y=1.08, font=dict(size=11)),
+         xaxis=dict(dtick=1, title="Year", domain=[0, 0.94]),
+         yaxis=dict(title="Avg Price (£)", tickprefix="£", separatethousands=True),
+         yaxis2=dict(title="Listings", showgrid=False, anchor="x", overlaying="y", side="right"))
     st.markdown('</div>', unsafe_allow_html=True)
 
-    # ── Row 3: MPG by Fuel + Engine Distribution ──
-    c3, c4 = st.columns(2)
-    with c3:
-        st.markdown("""<div class="panel">
-            <div class="panel-header"><p class="panel-title">MPG by Fuel Type</p><span class="panel-tag">Box</span></div>
-            <p class="panel-subtitle">Spread of fuel efficiency per category</p>""", unsafe_allow_html=True)
-        fig = px.box(filtered, x="fuelType", y="mpg", color="fuelType",
-                     color_discrete_sequence=BMW_COLORS)
-        fig.update_layout(**BMW_LAYOUT, height=360, showlegend=False,
-                          xaxis_title="Fuel Type", yaxis_title="MPG")
-        apply_bmw(fig)
-        st.plotly_chart(fig, width="stretch")
-        st.markdown('</div>', unsafe_allow_html=True)
-
-    with c4:
-        st.markdown("""<div class="panel">
-            <div class="panel-header"><p class="panel-title">Engine Size Mix</p><span class="panel-tag">Donut</span></div>
-            <p class="panel-subtitle">Share of each engine displacement</p>""", unsafe_allow_html=True)
-        ec = filtered["engineSize"].value_counts().sort_index().reset_index()
-        ec.columns = ["Size", "Count"]
-        ec["Label"] = ec["Size"].astype(str) + "L"
-        fig = px.pie(ec, names="Label", values="Count", hole=0.55,
-                     color_discrete_sequence=BMW_COLORS)
-        fig.update_layout(**BMW_LAYOUT, height=360,
-                          legend=dict(orientation="h", y=-0.15, x=0.5, xanchor="center", font=dict(size=10)))
-        apply_bmw(fig)
-        fig.update_traces(textinfo="percent+label", textfont_size=10)
-        st.plotly_chart(fig, width="stretch")
-        st.markdown('</div>', unsafe_allow_html=True)
-
+@st.fragment
+def mpg_panel():
+    st.markdown("""<div class="panel">
+        <div class="panel-header"><p class="panel-title">MPG by Fuel Type</p><span class="panel-tag">Box</span></div>
+        <p class="panel-subtitle">Spread of fuel efficiency per category</p>""", unsafe_allow_html=True)
+    box, outliers = mpg_box(filter_state())
+    fig = box_figure(box, "fuelType", BMW_COLORS, outliers)
+    plot("mpg", fig, height=360, showlegend=False, xaxis_title="Fuel Type", yaxis_title="MPG")
+    st.markdown('</div>', unsafe_allow_html=True)
 
-# ═══════════════════════ TAB 2 — PRICING ═════════════════════
-with tab2:
+@st.fragment
+def engine_panel():
+    st.markdown("""<div class="panel">
+        <div class="panel-header"><p class="panel-title">Engine Size Mix</p><span class="panel-tag">Donut</span></div>
+        <p class="panel-subtitle">Share of each engine displacement</p>""", unsafe_allow_html=True)
+    ec = tab_stats(filter_state(), "overview").counts("engineSize").sort_index()
+    ec.index = ec.index.to_series().astype(str) + "L"
+    fig = donut(ec, "Label", 0.55)
+    fig.update_traces(textinfo="percent+label", textfont_size=10)
+    plot("engine", fig, height=360, piecolorway=BMW_COLORS,
+         legend=dict(LEGEND_BELOW, y=-0.15, font=dict(size=10)))
+    st.markdown('</div>', unsafe_allow_html=True)
 
-    c5, c6 = st.columns(2)
-    with c5:
-        st.markdown("""<div class="panel">
-            <div class="panel-header"><p class="panel-title">Price vs Mileage</p><span class="panel-tag">Scatter</span></div>
-            <p class="panel-subtitle">Each point = 1 listing · bubble size = engine capacity</p>""", unsafe_allow_html=True)
-        fig = px.scatter(filtered, x="mileage", y="price", color="fuelType",
-                         size="engineSize", opacity=0.6,
-                         hover_data=["model","year","transmission"],
-                         color_discrete_sequence=BMW_COLORS)
-        fig.update_layout(**BMW_LAYOUT, height=440, xaxis_title="Mileage",
-                          yaxis_title="Price (£)",
-                          legend=dict(orientation="h", y=-0.16, x=0.5, xanchor="center", font=dict(size=10)))
-        apply_bmw(fig)
-        st.plotly_chart(fig, width="stretch")
-        st.markdown('</div>', unsafe_allow_html=True)
+@st.fragment
+def scatter_panel():
+    st.markdown("""<div class="panel">
+        <div class="panel-header"><p class="panel-title">Price vs Mileage</p><span class="panel-tag">Scatter</span></div>
+        <p class="panel-subtitle">Each point = 1 listing · bubble size = engine capacity</p>""", unsafe_allow_html=True)
+    color = st.segmented_control("Colour by", ["fuelType", "transmission"], default="fuelType",
+                                 format_func={"fuelType": "Fuel", "transmission": "Gearbox"}.get,
+                                 key="scatter_color") or "fuelType"
+    hover = tuple(h for h in ("model", "year", "transmission", "fuelType") if h != color)
+    fig = tiered_scatter(df, index.select(filter_state()).rows, BMW_COLORS, opacity=0.6,
+                         color=color, hover=hover)
+    plot("scatter", fig, FOLLOWS[tiered_scatter], height=440, xaxis_title="Mileage",
+         yaxis_title="Price (£)", legend=dict(LEGEND_BELOW, y=-0.16, font=dict(size=10)))
+    st.markdown('</div>', unsafe_allow_html=True)
 
-    with c6:
-        st.markdown("""<div class="panel">
-            <div class="panel-header"><p class="panel-title">Mileage Distribution</p><span class="panel-tag">Histogram</span></div>
-            <p class="panel-subtitle">Frequency with marginal box plot</p>""", unsafe_allow_html=True)
-        fig = px.histogram(filtered, x="mileage", nbins=40, marginal="box",
-                           color_discrete_sequence=["#1B69D1"])
-        fig.update_layout(**BMW_LAYOUT, height=440, xaxis_title="Mileage",
-                          yaxis_title="Frequency", bargap=0.04)
-        apply_bmw(fig)
-        fig.update_traces(marker_line_width=0)
-        st.plotly_chart(fig, width="stretch")
-        st.markdown('</div>', unsafe_allow_html=True)
+@st.fragment
+def mileage_panel():
+    st.markdown("""<div class="panel">
+        <div class="panel-header"><p class="panel-title">Mileage Distribution</p><span class="panel-tag">Histogram</span></div>
+        <p class="panel-subtitle">Frequency with marginal box plot</p>""", unsafe_allow_html=True)
+    bins = st.select_slider("Bins", [10, 20, 40], value=MILEAGE_BINS, key="mileage_bins")
+    edges, hist, box = mileage_histogram(filter_state(), bins)
+    fig = binned_histogram(edges, hist, box, "mileage", "#1B69D1")
+    fig.update_traces(marker_line_width=0)
+    plot("mileage", fig, FOLLOWS[binned_histogram], height=440, xaxis_title="Mileage",
+         yaxis_title="Frequency", bargap=0.04)
+    st.markdown('</div>', unsafe_allow_html=True)
 
-    # Violin
+@st.fragment
+def violin_panel():
     st.markdown("""<div class="panel">
         <div class="panel-header"><p class="panel-title">Price Distribution by Fuel</p><span class="panel-tag">Violin</span></div>
         <p class="panel-subtitle">Density and quartile breakdown per fuel type</p>""", unsafe_allow_html=True)
-    fig = px.violin(filtered, x="fuelType", y="price", color="fuelType",
-                    box=True, points=False, color_discrete_sequence=BMW_COLORS)
-    fig.update_layout(**BMW_LAYOUT, height=400, showlegend=False,
-                      xaxis_title="Fuel Type", yaxis_title="Price (£)")
-    apply_bmw(fig)
-    st.plotly_chart(fig, width="stretch")
+    fig = violin_figure(price_violins(filter_state()), "fuelType", BMW_COLORS)
+    plot("violin", fig, FOLLOWS[violin_figure], height=400, showlegend=False,
+         xaxis_title="Fuel Type", yaxis_title="Price (£)")
     st.markdown('</div>', unsafe_allow_html=True)
 
-    # Heatmap
+@st.fragment
+def price_matrix_panel():
     st.markdown("""<div class="panel">
         <div class="panel-header"><p class="panel-title">Year × Fuel — Price Matrix</p><span class="panel-tag">Heatmap</span></div>
         <p class="panel-subtitle">Identify value pockets across year and fuel type</p>""", unsafe_allow_html=True)
-    hd = filtered.pivot_table(values="price", index="fuelType", columns="year", aggfunc="mean")
-    fig = px.imshow(hd, text_auto=",.0f", color_continuous_scale=["#0D0D0D","#1B69D1","#00B4D8"],
-                    aspect="auto")
-    fig.update_layout(**BMW_LAYOUT, height=320, xaxis_title="Year", yaxis_title="Fuel",
-                      coloraxis_colorbar=dict(title="£", tickprefix="£"))
-    apply_bmw(fig)
-    st.plotly_chart(fig, width="stretch")
+    hd = (tab_stats(filter_state(), "pricing")["fuelType", "year"]
+          .pivot(index="fuelType", columns="year", values="price_mean"))
+    plot("price_matrix", heatmap(hd), height=320, xaxis_title="Year",
+         yaxis=dict(title="Fuel", autorange="reversed"),
+         coloraxis=dict(colorscale=["#0D0D0D","#1B69D1","#00B4D8"],
+                        colorbar=dict(title="£", tickprefix="£")))
     st.markdown('</div>', unsafe_allow_html=True)
 
+@st.fragment
+def top_models_panel():
+    # the title shows the current top-N, which its widget below sets
+    top_n = st.session_state.get("top_models_n", 12)
+    st.markdown(f"""<div class="panel">
+        <div class="panel-header"><p class="panel-title">Top {top_n} Models</p><span class="panel-tag">Ranking</span></div>
+        <p class="panel-subtitle">Most listed models in current selection</p>""", unsafe_allow_html=True)
+    st.slider("Models shown", 5, 25, 12, key="top_models_n")
+    fig = ranked_bar(tab_stats(filter_state(), "inventory").counts("model").head(top_n), "Model", "Count")
+    fig.update_traces(marker_line_width=0, textposition="outside",
+                      marker_cornerradius=3)
+    plot("top_models", fig, height=470, xaxis_title="Count",
+         yaxis=dict(title="Model", autorange="reversed"),
+         coloraxis=dict(colorscale=BMW_SEQ, showscale=False))
+    st.markdown('</div>', unsafe_allow_html=True)
 
-# ═══════════════════════ TAB 3 — INVENTORY ═══════════════════
-with tab3:
-
-    c7, c8 = st.columns([3, 2])
-    with c7:
-        st.markdown("""<div class="panel">
-            <div class="panel-header"><p class="panel-title">Top 12 Models</p><span class="panel-tag">Ranking</span></div>
-            <p class="panel-subtitle">Most listed models in current selection</p>""", unsafe_allow_html=True)
-        top = filtered["model"].value_counts().head(12).reset_index()
-        top.columns = ["Model", "Count"]
-        fig = px.bar(top, x="Count", y="Model", orientation="h", text_auto=True,
-                     color="Count", color_continuous_scale=BMW_SEQ)
-        fig.update_layout(**BMW_LAYOUT, height=470, coloraxis_showscale=False)
-        fig.update_yaxes(autorange="reversed")
-        apply_bmw(fig)
-        fig.update_traces(marker_line_width=0, textposition="outside",
-                          marker_cornerradius=3)
-        st.plotly_chart(fig, width="stretch")
-        st.markdown('</div>', unsafe_allow_html=True)
-
-    with c8:
-        st.markdown("""<div class="panel">
-            <div class="panel-header"><p class="panel-title">Avg Price by Model</p><span class="panel-tag">Ranking</span></div>
-            <p class="panel-subtitle">Top 10 most expensive models (avg)</p>""", unsafe_allow_html=True)
-        price_rank = (filtered.groupby("model")["price"].mean()
-                      .sort_values(ascending=False).head(10).reset_index())
-        price_rank.columns = ["Model", "Avg Price"]
-        fig = px.bar(price_rank, x="Avg Price", y="Model", orientation="h",
-                     text_auto=",.0f",
-                     color="Avg Price", color_continuous_scale=["#0D0D0D","#FFB703","#E63946"])
-        fig.update_layout(**BMW_LAYOUT, height=470, coloraxis_showscale=False)
-        fig.update_yaxes(autorange="reversed")
-        fig.update_xaxes(title="Avg Price (£)", tickprefix="£")
-        apply_bmw(fig)
-        fig.update_traces(marker_line_width=0, textposition="outside",
-                          texttemplate="£%{x:,.0f}", marker_cornerradius=3)
-        st.plotly_chart(fig, width="stretch")
-        st.markdown('</div>', unsafe_allow_html=True)
+@st.fragment
+def model_price_panel():
+    st.markdown("""<div class="panel">
+        <div class="panel-header"><p class="panel-title">Avg Price by Model</p><span class="panel-tag">Ranking</span></div>
+        <p class="panel-subtitle">Top 10 most expensive models (avg)</p>""", unsafe_allow_html=True)
+    price_rank = (tab_stats(filter_state(), "inventory")["model"]
+                  .set_index("model")["price_mean"].sort_values(ascending=False).head(10))
+    fig = ranked_bar(price_rank, "Model", "Avg Price", texttemplate="£%{x:,.0f}")
+    fig.update_traces(marker_line_width=0, textposition="outside", marker_cornerradius=3)
+    plot("model_price", fig, height=470, xaxis=dict(title="Avg Price (£)", tickprefix="£"),
+         yaxis=dict(title="Model", autorange="reversed"),
+         coloraxis=dict(colorscale=["#0D0D0D","#FFB703","#E63946"], showscale=False))
+    st.markdown('</div>', unsafe_allow_html=True)
 
-    # Treemap
+@st.fragment
+def treemap_panel():
     st.markdown("""<div class="panel">
         <div class="panel-header"><p class="panel-title">Model × Transmission Treemap</p><span class="panel-tag">Proportional</span></div>
         <p class="panel-subtitle">Larger blocks = more listings in that segment</p>""", unsafe_allow_html=True)
-    tree_df = (filtered.groupby(["model","transmission"]).size()
-               .reset_index(name="count").sort_values("count", ascending=False).head(40))
-    fig = px.treemap(tree_df, path=["model","transmission"], values="count",
-                     color="count", color_continuous_scale=BMW_SEQ)
-    fig.update_layout(**BMW_LAYOUT, height=450, coloraxis_showscale=False)
-    apply_bmw(fig)
-    fig.update_traces(marker_line_width=0.5, marker_line_color="#333", textfont_size=12)
-    st.plotly_chart(fig, width="stretch")
+    tree_df = (tab_stats(filter_state(), "inventory")["model","transmission"][["model","transmission","count"]]
+               .sort_values("count", ascending=False).head(40))
+    sectors = hierarchy(tree_df, ["model","transmission"], "count", color="count")
+    fig = go.Figure(go.Treemap(
+        ids=sectors["ids"], labels=sectors["labels"], parents=sectors["parents"],
+        values=sectors["values"], branchvalues="total", textfont_size=12,
+        marker=dict(colors=sectors["colors"], coloraxis="coloraxis", line=dict(width=0.5, color="#333")),
+        hovertemplate="%{label}<br>count=%{value}<br>parent=%{parent}<extra></extra>",
+    ))
+    plot("treemap", fig, height=450, coloraxis=dict(colorscale=BMW_SEQ, showscale=False))
     st.markdown('</div>', unsafe_allow_html=True)
 
-    # Sunburst + Bubble
-    s1, s2 = st.columns(2)
-    with s1:
-        st.markdown("""<div class="panel">
-            <div class="panel-header"><p class="panel-title">Inventory Sunburst</p><span class="panel-tag">Hierarchy</span></div>
-            <p class="panel-subtitle">Fuel → Transmission → Engine Size drill-down</p>""", unsafe_allow_html=True)
-        sun = (filtered.assign(eng=filtered["engineSize"].astype(str)+"L")
-               .groupby(["fuelType","transmission","eng"]).size().reset_index(name="count"))
-        fig = px.sunburst(sun, path=["fuelType","transmission","eng"], values="count",
-                          color_discrete_sequence=BMW_COLORS)
-        fig.update_layout(**BMW_LAYOUT, height=430)
-        apply_bmw(fig)
-        fig.update_traces(textfont_size=11)
-        st.plotly_chart(fig, width="stretch")
-        st.markdown('</div>', unsafe_allow_html=True)
+@st.fragment
+def sunburst_panel():
+    st.markdown("""<div class="panel">
+        <div class="panel-header"><p class="panel-title">Inventory Sunburst</p><span class="panel-tag">Hierarchy</span></div>
+        <p class="panel-subtitle">Fuel → Transmission → Engine Size drill-down</p>""", unsafe_allow_html=True)
+    sun = tab_stats(filter_state(), "inventory")["fuelType","transmission","engineSize"]
+    sun = sun.assign(eng=sun["engineSize"].astype(str) + "L")
+    sectors = hierarchy(sun, ["fuelType","transmission","eng"], "count")
+    fig = go.Figure(go.Sunburst(
+        ids=sectors["ids"], labels=sectors["labels"], parents=sectors["parents"],
+        values=sectors["values"], branchvalues="total", textfont_size=11,
+        hovertemplate="%{label}<br>count=%{value}<br>parent=%{parent}<extra></extra>",
+    ))
+    plot("sunburst", fig, height=430, sunburstcolorway=BMW_COLORS)
+    st.markdown('</div>', unsafe_allow_html=True)
 
-    with s2:
-        st.markdown("""<div class="panel">
-            <div class="panel-header"><p class="panel-title">Efficiency Matrix</p><span class="panel-tag">Bubble</span></div>
-            <p class="panel-subtitle">MPG vs Tax — bubble = listing volume</p>""", unsafe_allow_html=True)
-        eff = (filtered.groupby("fuelType")
-               .agg(mpg=("mpg","mean"), tax=("tax","mean"),
-                    count=("price","count"), price=("price","mean")).reset_index())
-        fig = px.scatter(eff, x="mpg", y="tax", size="count", color="fuelType",
-                         hover_data=["price"], color_discrete_sequence=BMW_COLORS,
-                         size_max=55)
-        fig.update_layout(**BMW_LAYOUT, height=430,
-                          xaxis_title="Avg MPG", yaxis_title="Avg Tax (£)")
-        apply_bmw(fig)
-        st.plotly_chart(fig, width="stretch")
-        st.markdown('</div>', unsafe_allow_html=True)
+@st.fragment
+def efficiency_panel():
+    st.markdown("""<div class="panel">
+        <div class="panel-header"><p class="panel-title">Efficiency Matrix</p><span class="panel-tag">Bubble</span></div>
+        <p class="panel-subtitle">MPG vs Tax — bubble = listing volume</p>""", unsafe_allow_html=True)
+    eff = (tab_stats(filter_state(), "inventory")["fuelType"]
+           .rename(columns={"mpg_mean": "mpg", "tax_mean": "tax", "price_mean": "price"}))
+    fig = bubble_figure(eff, "mpg", "tax", "count", "fuelType", BMW_COLORS, size_max=55, hover=["price"])
+    plot("efficiency", fig, height=430, xaxis_title="Avg MPG", yaxis_title="Avg Tax (£)",
+         legend=dict(title="fuelType", itemsizing="constant"))
+    st.markdown('</div>', unsafe_allow_html=True)
 
+TABLE_COLUMNS = ["model","year","price","transmission","mileage","fuelType","tax","mpg","engineSize"]
+TABLE_PAGE_SIZE = 200
+
+@st.fragment
+def data_table_panel():
+    # the table's own filter / sort / page run over the whole selection;
+    # only the visible page is taken from the dataset
+    f1, f2, f3 = st.columns([3, 1.2, 0.8], vertical_alignment="bottom")
+    query = f1.text_input("Filter rows", key="table_query",
+                          placeholder="{price} >= 20000 && {model} contains X && {fuelType} = Diesel")
+    sort_col = f2.selectbox("Sort by", TABLE_COLUMNS, index=TABLE_COLUMNS.index("price"), key="table_sort")
+    descending = f3.toggle("Descending", value=True, key="table_desc")
+    ordered = table_rows(filter_state(), sort_col, descending, query)
+    pages = bmw_table.page_count(len(ordered), TABLE_PAGE_SIZE)
+    if st.session_state.get("table_page", 1) > pages:
+        st.session_state["table_page"] = pages
 
-# ═══════════════════════ TAB 4 — DATA EXPLORER ═══════════════
-with tab4:
     st.markdown(f"""<div class="panel">
-        <div class="panel-header"><p class="panel-title">Filtered Dataset</p><span class="panel-tag">{n:,} rows</span></div>
-        <p class="panel-subtitle">Full data view — sortable columns · use sidebar to refine</p>""", unsafe_allow_html=True)
-
-    cols = ["model","year","price","transmission","mileage","fuelType","tax","mpg","engineSize"]
-    st.dataframe(
-        filtered[cols].sort_values("price", ascending=False).reset_index(drop=True),
-        width="stretch", height=520,
-    )
+        <div class="panel-header"><p class="panel-title">Filtered Dataset</p><span class="panel-tag">{len(ordered):,} rows</span></div>
+        <p class="panel-subtitle">Server-side sort, filter and paging · use sidebar to refine</p>""", unsafe_allow_html=True)
+    st.dataframe(bmw_table.page_frame(df, ordered, st.session_state.get("table_page", 1) - 1,
+                                      TABLE_PAGE_SIZE, TABLE_COLUMNS),
+                 width="stretch", height=520)
+    st.number_input(f"Page (of {pages:,})", 1, pages, 1, key="table_page")
     st.markdown('</div>', unsafe_allow_html=True)
 
-    # Download
-    csv_out = filtered.to_csv(index=False).encode("utf-8")
-    st.download_button("⬇  Export Filtered CSV", csv_out, "bmw_filtered.csv", "text/csv")
 
-    # Stats
-    st.markdown("""<div class="panel">
-        <div class="panel-header"><p class="panel-title">Descriptive Statistics</p><span class="panel-tag">Summary</span></div>
-        <p class="panel-subtitle">Key statistical measures for all numeric fields</p>""", unsafe_allow_html=True)
-    st.dataframe(filtered.describe().T.style.format("{:,.1f}"), width="stretch")
-    st.markdown('</div>', unsafe_allow_html=True)
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  TABS
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# Lazy tabs: the selection lives in session state under "active_tab" and
+# switching tabs reruns the script, so only the open tab's panels are
+# computed and sent to the browser.
+tab1, tab2, tab3, tab4 = st.tabs([
+    "Overview", "Price Analysis", "Inventory", "Data"
+], key="active_tab", on_change="rerun")
+
+
+# ═══════════════════════ TAB 1 — OVERVIEW ════════════════════
+if tab1.open:
+    with tab1:
+        # ── Row 1: Fuel Bar + Transmission Donut ──
+        c1, c2 = st.columns([1.15, 1])
+        with c1:
+            fuel_panel()
+        with c2:
+            transmission_panel()
+
+        # ── Row 2: Price Trend — Full Width ──
+        price_trend_panel()
+
+        # ── Row 3: MPG by Fuel + Engine Distribution ──
+        c3, c4 = st.columns(2)
+        with c3:
+            mpg_panel()
+        with c4:
+            engine_panel()
+
+
+# ═══════════════════════ TAB 2 — PRICING ═════════════════════
+if tab2.open:
+    with tab2:
+        c5, c6 = st.columns(2)
+        with c5:
+            scatter_panel()
+        with c6:
+            mileage_panel()
+
+        violin_panel()
+        price_matrix_panel()
+
+
+# ═══════════════════════ TAB 3 — INVENTORY ═══════════════════
+if tab3.open:
+    with tab3:
+        c7, c8 = st.columns([3, 2])
+        with c7:
+            top_models_panel()
+        with c8:
+            model_price_panel()
+
+        treemap_panel()
+
+        # Sunburst + Bubble
+        s1, s2 = st.columns(2)
+        with s1:
+            sunburst_panel()
+        with s2:
+            efficiency_panel()
+
+
+# ═══════════════════════ TAB 4 — DATA EXPLORER ═══════════════
+if tab4.open:
+    with tab4:
+        data_table_panel()
+
+        # Download — the file is only built when the button is clicked
+        fmt = st.radio("Export format", list(FORMATS), format_func=lambda f: FORMATS[f][0],
+                       horizontal=True, key="export_format")
+        label, ext, mime = FORMATS[fmt]
+        st.download_button(f"⬇  Export Filtered {label}", lambda: export_file(state, fmt),
+                           f"bmw_filtered{ext}", mime)
+
+        # Stats
+        st.markdown("""<div class="panel">
+            <div class="panel-header"><p class="panel-title">Descriptive Statistics</p><span class="panel-tag">Summary</span></div>
+            <p class="panel-subtitle">Key statistical measures for all numeric fields</p>""", unsafe_allow_html=True)
+        st.dataframe(df.take(sel.rows).describe().T.style.format("{:,.1f}"), width="stretch")
+        st.markdown('</div>', unsafe_allow_html=True)
 
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -728,3 +916,5 @@ st.markdown("""
     </p>
 </div>
 """, unsafe_allow_html=True)
+
+st.session_state["run_finished"] = True   # see settle()
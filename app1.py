@@ -1,9 +1,22 @@
+import os
+import time
+
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 import plotly.graph_objects as go
+from plotly.colors import sequential
 import numpy as np
 
+from bmw_data import kpi_text, load_bmw
+from bmw_index import DatasetIndex, FilterState
+from bmw_cube import Cube
+from bmw_store import SharedCache, open_store
+import bmw_warmup
+from bmw_export import FORMATS, ExportCache
+import bmw_table
+from bmw_charts import (FOLLOWS, binned_histogram, bubble_figure, category_bar, donut, heatmap,
+                        hierarchy, ranked_bar, swap_traces, tiered_scatter, violin_figure)
+
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 #  PAGE CONFIG
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -156,14 +169,86 @@ button[data-baseweb="tab"][aria-selected="true"] {
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 #  DATA
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-@st.cache_data
+@st.cache_resource
 def load_data():
-    df = pd.read_csv("bmw.csv")
-    df.dropna(inplace=True)
-    df.drop_duplicates(inplace=True)
-    return df
+    # one memory-mapped, read-only frame shared by every session
+    # (cache_data would hand each rerun its own unpickled copy)
+    return load_bmw()
+
+@st.cache_resource
+def load_index(_df):
+    return DatasetIndex(_df)
+
+@st.cache_resource
+def load_cube(_df):
+    return Cube(_df)
+
+@st.cache_resource
+def load_results(version):
+    # in-process LRU in front of the host-wide result store (bmw_store),
+    # shared by every session here and every Streamlit process on the host
+    return SharedCache(int(os.environ.get("BMW_RESULT_CACHE_MB", "64")) << 20, open_store(version))
+
+TABLE_COLUMNS = ["model", "year", "price", "transmission", "mileage", "fuelType", "tax", "mpg", "engineSize"]
+TABLE_PAGE_SIZE = 200
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def table_rows(state, sort_col, descending, query):
+    rows = bmw_table.filter_rows(df, index.select(state).rows, query)
+    return bmw_table.sort_rows(df, rows, [{"column_id": sort_col,
+                                           "direction": "desc" if descending else "asc"}])
+
+@st.cache_resource
+def load_exports():
+    # finished exports on disk, per filter state and format, for every session
+    return ExportCache(int(os.environ.get("BMW_EXPORT_CACHE_MB", "512")) << 20)
+
+def export_file(state, fmt):
+    return load_exports().open(state, df, index.select(state).rows, fmt)
 
 df = load_data()
+index = load_index(df)
+cube = load_cube(df)
+results = load_results(df.attrs.get("version"))
+
+# ── Results: every aggregate a render reads, keyed on the filter state ──
+def kpi_means(state, rows):
+    return results.get_or_compute("means", (state,), lambda: cube.means(state, rows))
+
+def tab_stats(state, name, rows):
+    return results.get_or_compute("tab_stats", (state, name), lambda: cube.tab(state, name, rows))
+
+def mileage_histogram(state, rows):
+    def compute():
+        edges, hist = cube.histogram(state, "mileage", rows)
+        box = cube.box_stats(state, "mileage", rows=rows).iloc[0] if len(rows) else None
+        return edges, hist, box
+    return results.get_or_compute("mileage_histogram", (state, None), compute)
+
+def price_violins(state, rows):
+    return results.get_or_compute("price_violins", (state,),
+                                  lambda: cube.violins(state, "price", "fuelType", rows))
+
+def sidebar_state(year_range, fuels, trans, price_range, models):
+    return FilterState.make(year_range, price_range, fuels, trans, models or None)
+
+# Warm-up (bmw_warmup): once per process, a background thread fills the
+# results above for the default view and the one-filter views.
+def warm(year_range, fuels, trans, price_range, models):
+    state = sidebar_state(year_range, fuels, trans, price_range, models)
+    rows = index.select(state).rows
+    kpi_means(state, rows)
+    for name in ("overview", "pricing", "inventory"):
+        tab_stats(state, name, rows)
+    mileage_histogram(state, rows)
+    price_violins(state, rows)
+
+@st.cache_resource
+def start_warmup():
+    warmup = bmw_warmup.Warmup(bmw_warmup.warm_filters(df), warm, sidebar_state)
+    return warmup.start() if bmw_warmup.ENABLED else warmup
+
+warmup = start_warmup()
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 #  SHARED CHART THEME
@@ -183,6 +268,52 @@ CHART_LAYOUT = dict(
 )
 
 PALETTE = ["#1C69D4", "#22D3EE", "#34D399", "#FBBF24", "#FB7185", "#A78BFA", "#F472B6"]
+RANK_SCALE = ["#0f172a", "#1C69D4", "#22D3EE"]
+LEGEND_BELOW = dict(orientation="h", x=0.5, xanchor="center")
+
+
+def plot(name, fig, follow=(), **layout):
+    """Draw ``fig``'s traces in the session's skeleton of chart ``name``.
+
+    The first draw styles ``fig`` (CHART_LAYOUT and ``layout``) and keeps
+    it; later reruns only swap the new traces, and the ``follow`` layout
+    entries, into it instead of validating the theme again.  This saves
+    server CPU only: st.plotly_chart still sends the whole figure.
+    """
+    skeletons = st.session_state.setdefault("chart_skeletons", {})
+    if name in skeletons:
+        fig = swap_traces(skeletons[name], fig, follow)
+    else:
+        skeletons[name] = fig.update_layout(**CHART_LAYOUT, **layout)
+    st.plotly_chart(fig, width="stretch")
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  SLIDER UPDATES
+#  live     filters apply as they change (default).  Streamlit already
+#           folds widget changes that arrive during a run into a single
+#           rerun from the newest values.  While a drag goes on — the
+#           last run was cut short by a newer slider value — a rerun is
+#           also held for SLIDER_DEBOUNCE_MS first, so the next value
+#           stops it before any panel computes a passed-over range; a
+#           single move (click, keyboard) runs at once
+#  release  the filters sit in a form and apply together on its button
+#           (st.slider has no let-go event of its own)
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+SLIDER_UPDATE      = os.environ.get("BMW_SLIDER_UPDATE", "live")
+SLIDER_DEBOUNCE_MS = int(os.environ.get("BMW_SLIDER_DEBOUNCE_MS", "300"))
+
+
+def settle(sliders):
+    """Debounce a rerun a slider started while the previous run was cut
+    short (a drag); the caller's next st call is where Streamlit abandons
+    it if the slider moved again meanwhile."""
+    moved = st.session_state.get("slider_values", sliders) != sliders
+    interrupted = st.session_state.get("run_finished") is False   # set at the script's end
+    st.session_state["slider_values"] = sliders
+    st.session_state["run_finished"] = False
+    if moved and interrupted and SLIDER_UPDATE == "live" and SLIDER_DEBOUNCE_MS:
+        time.sleep(SLIDER_DEBOUNCE_MS / 1e3)
+
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 #  SIDEBAR
@@ -201,19 +332,24 @@ with st.sidebar:
     st.markdown("##### 🎯 Refine Data")
 
     min_year, max_year = int(df["year"].min()), int(df["year"].max())
-    year_range = st.slider("Model Year", min_year, max_year, (min_year, max_year))
+    # "release": the filters apply together from the form's button
+    with st.form("filters", border=False) if SLIDER_UPDATE == "release" else st.container():
+        year_range = st.slider("Model Year", min_year, max_year, (min_year, max_year))
 
-    fuel_options = sorted(df["fuelType"].unique().tolist())
-    selected_fuels = st.multiselect("Fuel Type", fuel_options, default=fuel_options)
+        fuel_options = sorted(df["fuelType"].unique().tolist())
+        selected_fuels = st.multiselect("Fuel Type", fuel_options, default=fuel_options)
 
-    trans_options = sorted(df["transmission"].unique().tolist())
-    selected_trans = st.multiselect("Transmission", trans_options, default=trans_options)
+        trans_options = sorted(df["transmission"].unique().tolist())
+        selected_trans = st.multiselect("Transmission", trans_options, default=trans_options)
 
-    min_price, max_price = int(df["price"].min()), int(df["price"].max())
-    price_range = st.slider("Price Range (£)", min_price, max_price, (min_price, max_price), step=500)
+        min_price, max_price = int(df["price"].min()), int(df["price"].max())
+        price_range = st.slider("Price Range (£)", min_price, max_price, (min_price, max_price), step=500)
 
-    model_options = sorted(df["model"].unique().tolist())
-    selected_models = st.multiselect("Model (leave blank for all)", model_options, default=[])
+        model_options = sorted(df["model"].unique().tolist())
+        selected_models = st.multiselect("Model (leave blank for all)", model_options, default=[])
+        if SLIDER_UPDATE == "release":
+            st.form_submit_button("Apply filters", width="stretch")
+    settle((year_range, price_range))   # the next st call is a yield point
 
     st.markdown("---")
     st.markdown(
@@ -222,15 +358,13 @@ with st.sidebar:
     )
 
 # Apply filters
-mask = (
-    df["year"].between(*year_range)
-    & df["fuelType"].isin(selected_fuels)
-    & df["transmission"].isin(selected_trans)
-    & df["price"].between(*price_range)
-)
-if selected_models:
-    mask &= df["model"].isin(selected_models)
-filtered = df[mask]
+state = sidebar_state(year_range, selected_fuels, selected_trans, price_range, selected_models)
+# a session's view counts once — not again on every rerun it makes
+if st.session_state.get("warmup_recorded") != state:
+    st.session_state["warmup_recorded"] = state
+    warmup.record(state)
+sel = index.select(state)
+n = sel.count
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 #  HERO BANNER
@@ -238,7 +372,7 @@ filtered = df[mask]
 st.markdown(f"""
 <div class="hero-banner">
     <h1>🏎️ BMW Used Car Intelligence</h1>
-    <p>Real-time analytics across <strong>{len(filtered):,}</strong> listings
+    <p>Real-time analytics across <strong>{n:,}</strong> listings
        from a universe of <strong>{len(df):,}</strong> vehicles</p>
 </div>
 """, unsafe_allow_html=True)
@@ -246,34 +380,35 @@ st.markdown(f"""
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 #  KPI ROW
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-avg_price   = filtered["price"].mean()      if len(filtered) else 0
-avg_mileage = filtered["mileage"].mean()    if len(filtered) else 0
-avg_mpg     = filtered["mpg"].mean()        if len(filtered) else 0
-avg_engine  = filtered["engineSize"].mean() if len(filtered) else 0
+means       = kpi_means(state, sel.rows)
+avg_price   = means["price"]
+avg_mileage = means["mileage"]
+avg_mpg     = means["mpg"]
+avg_engine  = means["engineSize"]
 
 st.markdown(f"""
 <div class="kpi-grid">
     <div class="kpi-chip kpi-blue">
         <div class="kpi-icon">💷</div>
-        <div class="kpi-value">£{avg_price:,.0f}</div>
+        <div class="kpi-value">{kpi_text(avg_price, ",.0f", "£")}</div>
         <div class="kpi-label">Avg Price</div>
         <div class="kpi-bar"></div>
     </div>
     <div class="kpi-chip kpi-cyan">
         <div class="kpi-icon">🛣️</div>
-        <div class="kpi-value">{avg_mileage:,.0f}</div>
+        <div class="kpi-value">{kpi_text(avg_mileage, ",.0f")}</div>
         <div class="kpi-label">Avg Mileage</div>
         <div class="kpi-bar"></div>
     </div>
     <div class="kpi-chip kpi-green">
         <div class="kpi-icon">⛽</div>
-        <div class="kpi-value">{avg_mpg:.1f}</div>
+        <div class="kpi-value">{kpi_text(avg_mpg, ".1f")}</div>
         <div class="kpi-label">Avg MPG</div>
         <div class="kpi-bar"></div>
     </div>
     <div class="kpi-chip kpi-amber">
         <div class="kpi-icon">🔧</div>
-        <div class="kpi-value">{avg_engine:.1f}L</div>
+        <div class="kpi-value">{kpi_text(avg_engine, ".1f", suffix="L")}</div>
         <div class="kpi-label">Avg Engine</div>
         <div class="kpi-bar"></div>
     </div>
@@ -283,271 +418,244 @@ st.markdown(f"""
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 #  TABBED LAYOUT
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# Lazy tabs: the selection lives in session state under "active_tab" and
+# switching tabs reruns the script, so only the open tab's panels are
+# computed and sent to the browser.
 tab_overview, tab_pricing, tab_inventory, tab_data = st.tabs(
-    ["📊  Overview", "💰  Pricing Deep-Dive", "🏗️  Inventory Mix", "📋  Data Explorer"]
+    ["📊  Overview", "💰  Pricing Deep-Dive", "🏗️  Inventory Mix", "📋  Data Explorer"],
+    key="active_tab", on_change="rerun",
 )
 
 # ──────────────────────── TAB 1 — OVERVIEW ────────────────────
-with tab_overview:
-    r1c1, r1c2 = st.columns(2)
-
-    # — Fuel type bar —
-    with r1c1:
+if tab_overview.open:
+    with tab_overview:
+        ov = tab_stats(state, "overview", sel.rows)
+        r1c1, r1c2 = st.columns(2)
+
+        # — Fuel type bar —
+        with r1c1:
+            st.markdown('<div class="glass-card">', unsafe_allow_html=True)
+            st.markdown('<p class="chart-title">Fuel Type Breakdown</p>', unsafe_allow_html=True)
+            st.markdown('<p class="chart-subtitle">Number of listings per fuel category</p>', unsafe_allow_html=True)
+            fig = category_bar(ov.counts("fuelType"), "Fuel Type", PALETTE)
+            fig.update_traces(textposition="outside", marker_line_width=0)
+            plot("fuel", fig, showlegend=False, height=370, xaxis_title="Fuel Type", yaxis_title="Count")
+            st.markdown('</div>', unsafe_allow_html=True)
+
+        # — Transmission donut —
+        with r1c2:
+            st.markdown('<div class="glass-card">', unsafe_allow_html=True)
+            st.markdown('<p class="chart-title">Transmission Split</p>', unsafe_allow_html=True)
+            st.markdown('<p class="chart-subtitle">Proportion by gearbox type</p>', unsafe_allow_html=True)
+            trans_counts = ov.counts("transmission")
+            fig = donut(trans_counts, "Transmission", 0.55)
+            fig.update_traces(textinfo="percent+label", textfont_size=12,
+                              pull=[0.02] * len(trans_counts))
+            plot("transmission", fig, height=370, showlegend=True, piecolorway=PALETTE,
+                 legend=dict(LEGEND_BELOW, y=-0.15))
+            st.markdown('</div>', unsafe_allow_html=True)
+
+        # — Price trend line (full width) —
         st.markdown('<div class="glass-card">', unsafe_allow_html=True)
-        st.markdown('<p class="chart-title">Fuel Type Breakdown</p>', unsafe_allow_html=True)
-        st.markdown('<p class="chart-subtitle">Number of listings per fuel category</p>', unsafe_allow_html=True)
-        fuel_counts = filtered["fuelType"].value_counts().reset_index()
-        fuel_counts.columns = ["Fuel Type", "Count"]
-        fig = px.bar(
-            fuel_counts, x="Fuel Type", y="Count", color="Fuel Type",
-            color_discrete_sequence=PALETTE, text_auto=True,
-        )
-        fig.update_layout(**CHART_LAYOUT, showlegend=False, height=370)
-        fig.update_traces(textposition="outside", marker_line_width=0)
-        st.plotly_chart(fig, width="stretch")
+        st.markdown('<p class="chart-title">Average Price Trajectory</p>', unsafe_allow_html=True)
+        st.markdown('<p class="chart-subtitle">Year-over-year average listing price with area fill</p>', unsafe_allow_html=True)
+        avg_by_year = ov["year"].rename(columns={"price_mean": "avg_price"})
+        fig = go.Figure()
+        fig.add_trace(go.Scatter(
+            x=avg_by_year["year"], y=avg_by_year["avg_price"],
+            mode="lines+markers",
+            line=dict(color="#22D3EE", width=3, shape="spline"),
+            marker=dict(size=8, color="#22D3EE", line=dict(width=2, color="#0A0E17")),
+            fill="tozeroy", fillcolor="rgba(34,211,238,0.08)",
+            hovertemplate="<b>%{x}</b><br>Avg Price: £%{y:,.0f}<extra></extra>",
+        ))
+        plot("price_trend", fig, height=380,
+             xaxis=dict(title="Year", dtick=1),
+             yaxis=dict(title="Average Price (£)", tickprefix="£", separatethousands=True))
         st.markdown('</div>', unsafe_allow_html=True)
 
-    # — Transmission donut —
-    with r1c2:
-        st.markdown('<div class="glass-card">', unsafe_allow_html=True)
-        st.markdown('<p class="chart-title">Transmission Split</p>', unsafe_allow_html=True)
-        st.markdown('<p class="chart-subtitle">Proportion by gearbox type</p>', unsafe_allow_html=True)
-        trans_counts = filtered["transmission"].value_counts().reset_index()
-        trans_counts.columns = ["Transmission", "Count"]
-        fig = px.pie(
-            trans_counts, names="Transmission", values="Count",
-            hole=0.55, color_discrete_sequence=PALETTE,
-        )
-        fig.update_layout(**CHART_LAYOUT, height=370, showlegend=True,
-                          legend=dict(orientation="h", y=-0.15, x=0.5, xanchor="center"))
-        fig.update_traces(textinfo="percent+label", textfont_size=12,
-                          pull=[0.02] * len(trans_counts))
-        st.plotly_chart(fig, width="stretch")
-        st.markdown('</div>', unsafe_allow_html=True)
-
-    # — Price trend line (full width) —
-    st.markdown('<div class="glass-card">', unsafe_allow_html=True)
-    st.markdown('<p class="chart-title">Average Price Trajectory</p>', unsafe_allow_html=True)
-    st.markdown('<p class="chart-subtitle">Year-over-year average listing price with area fill</p>', unsafe_allow_html=True)
-    avg_by_year = filtered.groupby("year").agg(
-        avg_price=("price", "mean"), count=("price", "count")
-    ).reset_index()
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(
-        x=avg_by_year["year"], y=avg_by_year["avg_price"],
-        mode="lines+markers",
-        line=dict(color="#22D3EE", width=3, shape="spline"),
-        marker=dict(size=8, color="#22D3EE", line=dict(width=2, color="#0A0E17")),
-        fill="tozeroy", fillcolor="rgba(34,211,238,0.08)",
-        hovertemplate="<b>%{x}</b><br>Avg Price: £%{y:,.0f}<extra></extra>",
-    ))
-    fig.update_layout(**CHART_LAYOUT, height=380,
-                      xaxis=dict(title="Year", dtick=1),
-                      yaxis=dict(title="Average Price (£)", tickprefix="£", separatethousands=True))
-    st.plotly_chart(fig, width="stretch")
-    st.markdown('</div>', unsafe_allow_html=True)
-
 
 # ──────────────────────── TAB 2 — PRICING ─────────────────────
-with tab_pricing:
-    r2c1, r2c2 = st.columns(2)
-
-    with r2c1:
+if tab_pricing.open:
+    with tab_pricing:
+        pri = tab_stats(state, "pricing", sel.rows)
+        r2c1, r2c2 = st.columns(2)
+
+        with r2c1:
+            st.markdown('<div class="glass-card">', unsafe_allow_html=True)
+            st.markdown('<p class="chart-title">Price vs Mileage</p>', unsafe_allow_html=True)
+            st.markdown('<p class="chart-subtitle">Each dot = one listing · sized by engine capacity</p>', unsafe_allow_html=True)
+            fig = tiered_scatter(df, sel.rows, PALETTE, opacity=0.65)
+            plot("scatter", fig, FOLLOWS[tiered_scatter], height=440,
+                 xaxis_title="Mileage", yaxis_title="Price (£)", legend=dict(LEGEND_BELOW, y=-0.18))
+            st.markdown('</div>', unsafe_allow_html=True)
+
+        with r2c2:
+            st.markdown('<div class="glass-card">', unsafe_allow_html=True)
+            st.markdown('<p class="chart-title">Mileage Distribution</p>', unsafe_allow_html=True)
+            st.markdown('<p class="chart-subtitle">Histogram with marginal box plot</p>', unsafe_allow_html=True)
+            edges, hist, box = mileage_histogram(state, sel.rows)
+            fig = binned_histogram(edges, hist, box, "mileage", "#1C69D4")
+            fig.update_traces(marker_line_width=0)
+            plot("mileage", fig, FOLLOWS[binned_histogram], height=440,
+                 xaxis_title="Mileage", yaxis_title="Frequency", bargap=0.03)
+            st.markdown('</div>', unsafe_allow_html=True)
+
+        # — Price distribution violin (full width) —
         st.markdown('<div class="glass-card">', unsafe_allow_html=True)
-        st.markdown('<p class="chart-title">Price vs Mileage</p>', unsafe_allow_html=True)
-        st.markdown('<p class="chart-subtitle">Each dot = one listing · sized by engine capacity</p>', unsafe_allow_html=True)
-        fig = px.scatter(
-            filtered, x="mileage", y="price", color="fuelType",
-            size="engineSize", opacity=0.65,
-            hover_data=["model", "year", "transmission"],
-            color_discrete_sequence=PALETTE,
-        )
-        fig.update_layout(**CHART_LAYOUT, height=440,
-                          xaxis_title="Mileage", yaxis_title="Price (£)",
-                          legend=dict(orientation="h", y=-0.18, x=0.5, xanchor="center"))
-        st.plotly_chart(fig, width="stretch")
+        st.markdown('<p class="chart-title">Price Distribution by Fuel Type</p>', unsafe_allow_html=True)
+        st.markdown('<p class="chart-subtitle">Violin plot showing density + quartiles</p>', unsafe_allow_html=True)
+        fig = violin_figure(price_violins(state, sel.rows), "fuelType", PALETTE)
+        plot("violin", fig, FOLLOWS[violin_figure], height=420, showlegend=False,
+             xaxis_title="Fuel Type", yaxis_title="Price (£)")
         st.markdown('</div>', unsafe_allow_html=True)
 
-    with r2c2:
+        # — Year × Fuel Price Heatmap —
         st.markdown('<div class="glass-card">', unsafe_allow_html=True)
-        st.markdown('<p class="chart-title">Mileage Distribution</p>', unsafe_allow_html=True)
-        st.markdown('<p class="chart-subtitle">Histogram with marginal box plot</p>', unsafe_allow_html=True)
-        fig = px.histogram(
-            filtered, x="mileage", nbins=40,
-            color_discrete_sequence=["#1C69D4"],
-            marginal="box",
-        )
-        fig.update_layout(**CHART_LAYOUT, height=440,
-                          xaxis_title="Mileage", yaxis_title="Frequency", bargap=0.03)
-        fig.update_traces(marker_line_width=0)
-        st.plotly_chart(fig, width="stretch")
+        st.markdown('<p class="chart-title">Year × Fuel Type — Average Price Matrix</p>', unsafe_allow_html=True)
+        st.markdown('<p class="chart-subtitle">Spot value pockets across year and fuel combinations</p>', unsafe_allow_html=True)
+        heat_data = (pri["fuelType", "year"]
+                     .pivot(index="fuelType", columns="year", values="price_mean"))
+        plot("price_matrix", heatmap(heat_data), height=350, xaxis_title="Year",
+             yaxis=dict(title="Fuel Type", autorange="reversed"),
+             coloraxis=dict(colorscale=sequential.Blues, colorbar=dict(title="Avg £", tickprefix="£")))
         st.markdown('</div>', unsafe_allow_html=True)
 
-    # — Price distribution violin (full width) —
-    st.markdown('<div class="glass-card">', unsafe_allow_html=True)
-    st.markdown('<p class="chart-title">Price Distribution by Fuel Type</p>', unsafe_allow_html=True)
-    st.markdown('<p class="chart-subtitle">Violin plot showing density + quartiles</p>', unsafe_allow_html=True)
-    fig = px.violin(
-        filtered, x="fuelType", y="price", color="fuelType", box=True, points=False,
-        color_discrete_sequence=PALETTE,
-    )
-    fig.update_layout(**CHART_LAYOUT, height=420, showlegend=False,
-                      xaxis_title="Fuel Type", yaxis_title="Price (£)")
-    st.plotly_chart(fig, width="stretch")
-    st.markdown('</div>', unsafe_allow_html=True)
-
-    # — Year × Fuel Price Heatmap —
-    st.markdown('<div class="glass-card">', unsafe_allow_html=True)
-    st.markdown('<p class="chart-title">Year × Fuel Type — Average Price Matrix</p>', unsafe_allow_html=True)
-    st.markdown('<p class="chart-subtitle">Spot value pockets across year and fuel combinations</p>', unsafe_allow_html=True)
-    heat_data = filtered.pivot_table(values="price", index="fuelType", columns="year", aggfunc="mean")
-    fig = px.imshow(
-        heat_data, text_auto=",.0f", color_continuous_scale="Blues", aspect="auto",
-    )
-    fig.update_layout(**CHART_LAYOUT, height=350,
-                      xaxis_title="Year", yaxis_title="Fuel Type",
-                      coloraxis_colorbar=dict(title="Avg £", tickprefix="£"))
-    st.plotly_chart(fig, width="stretch")
-    st.markdown('</div>', unsafe_allow_html=True)
-
 
 # ──────────────────────── TAB 3 — INVENTORY ──────────────────
-with tab_inventory:
-    r3c1, r3c2 = st.columns([3, 2])
-
-    with r3c1:
+if tab_inventory.open:
+    with tab_inventory:
+        inv = tab_stats(state, "inventory", sel.rows)
+        r3c1, r3c2 = st.columns([3, 2])
+
+        with r3c1:
+            st.markdown('<div class="glass-card">', unsafe_allow_html=True)
+            st.markdown('<p class="chart-title">Top 12 Models by Volume</p>', unsafe_allow_html=True)
+            st.markdown('<p class="chart-subtitle">Horizontal ranking of most-listed models</p>', unsafe_allow_html=True)
+            fig = ranked_bar(inv.counts("model").head(12), "Model", "Count")
+            fig.update_traces(marker_line_width=0, textposition="outside")
+            plot("top_models", fig, height=480, xaxis_title="Count",
+                 yaxis=dict(title="Model", autorange="reversed"),
+                 coloraxis=dict(colorscale=RANK_SCALE, showscale=False))
+            st.markdown('</div>', unsafe_allow_html=True)
+
+        with r3c2:
+            st.markdown('<div class="glass-card">', unsafe_allow_html=True)
+            st.markdown('<p class="chart-title">Engine Size Split</p>', unsafe_allow_html=True)
+            st.markdown('<p class="chart-subtitle">Distribution of engine capacities</p>', unsafe_allow_html=True)
+            eng_counts = inv.counts("engineSize").sort_index()
+            eng_counts.index = eng_counts.index.to_series().astype(str) + "L"
+            fig = donut(eng_counts, "Engine (L)", 0.5)
+            fig.update_traces(textinfo="percent+label", textfont_size=11)
+            plot("engine", fig, height=480, piecolorway=PALETTE, legend=dict(LEGEND_BELOW, y=-0.2))
+            st.markdown('</div>', unsafe_allow_html=True)
+
+        # — Treemap (full width) —
         st.markdown('<div class="glass-card">', unsafe_allow_html=True)
-        st.markdown('<p class="chart-title">Top 12 Models by Volume</p>', unsafe_allow_html=True)
-        st.markdown('<p class="chart-subtitle">Horizontal ranking of most-listed models</p>', unsafe_allow_html=True)
-        top = filtered["model"].value_counts().head(12).reset_index()
-        top.columns = ["Model", "Count"]
-        fig = px.bar(
-            top, x="Count", y="Model", orientation="h",
-            color="Count", color_continuous_scale=["#0f172a", "#1C69D4", "#22D3EE"],
-            text_auto=True,
+        st.markdown('<p class="chart-title">Model × Transmission Treemap</p>', unsafe_allow_html=True)
+        st.markdown('<p class="chart-subtitle">Proportional area map — larger blocks = more listings</p>', unsafe_allow_html=True)
+        tree_df = (
+            inv["model", "transmission"][["model", "transmission", "count"]]
+            .sort_values("count", ascending=False)
+            .head(40)
         )
-        fig.update_layout(**CHART_LAYOUT, height=480,
-                          yaxis=dict(autorange="reversed"),
-                          coloraxis_showscale=False)
-        fig.update_traces(marker_line_width=0, textposition="outside")
-        st.plotly_chart(fig, width="stretch")
+        sectors = hierarchy(tree_df, ["model", "transmission"], "count", color="count")
+        fig = go.Figure(go.Treemap(
+            ids=sectors["ids"], labels=sectors["labels"], parents=sectors["parents"],
+            values=sectors["values"], branchvalues="total", textfont_size=13,
+            marker=dict(colors=sectors["colors"], coloraxis="coloraxis",
+                        line=dict(width=1, color="rgba(255,255,255,0.06)")),
+            hovertemplate="%{label}<br>count=%{value}<br>parent=%{parent}<extra></extra>",
+        ))
+        plot("treemap", fig, height=460, coloraxis=dict(colorscale=RANK_SCALE, showscale=False))
         st.markdown('</div>', unsafe_allow_html=True)
 
-    with r3c2:
-        st.markdown('<div class="glass-card">', unsafe_allow_html=True)
-        st.markdown('<p class="chart-title">Engine Size Split</p>', unsafe_allow_html=True)
-        st.markdown('<p class="chart-subtitle">Distribution of engine capacities</p>', unsafe_allow_html=True)
-        eng_counts = filtered["engineSize"].value_counts().sort_index().reset_index()
-        eng_counts.columns = ["Engine (L)", "Count"]
-        eng_counts["Engine (L)"] = eng_counts["Engine (L)"].astype(str) + "L"
-        fig = px.pie(
-            eng_counts, names="Engine (L)", values="Count",
-            hole=0.5, color_discrete_sequence=PALETTE,
-        )
-        fig.update_layout(**CHART_LAYOUT, height=480,
-                          legend=dict(orientation="h", y=-0.2, x=0.5, xanchor="center"))
-        fig.update_traces(textinfo="percent+label", textfont_size=11)
-        st.plotly_chart(fig, width="stretch")
-        st.markdown('</div>', unsafe_allow_html=True)
+        # — Sunburst + Bubble Row —
+        sb_cols = st.columns([1, 1])
+        with sb_cols[0]:
+            st.markdown('<div class="glass-card">', unsafe_allow_html=True)
+            st.markdown('<p class="chart-title">Fuel → Transmission → Engine Sunburst</p>', unsafe_allow_html=True)
+            st.markdown('<p class="chart-subtitle">Hierarchical drill-down of inventory structure</p>', unsafe_allow_html=True)
+            sun_df = inv["fuelType", "transmission", "engineSize"]
+            # inv is shared by every session (SharedCache): never modify it in place
+            sun_df = sun_df.assign(engine_label=sun_df["engineSize"].astype(str) + "L")
+            sectors = hierarchy(sun_df, ["fuelType", "transmission", "engine_label"], "count")
+            fig = go.Figure(go.Sunburst(
+                ids=sectors["ids"], labels=sectors["labels"], parents=sectors["parents"],
+                values=sectors["values"], branchvalues="total", textfont_size=12,
+                hovertemplate="%{label}<br>count=%{value}<br>parent=%{parent}<extra></extra>",
+            ))
+            plot("sunburst", fig, height=450, sunburstcolorway=PALETTE)
+            st.markdown('</div>', unsafe_allow_html=True)
+
+        with sb_cols[1]:
+            st.markdown('<div class="glass-card">', unsafe_allow_html=True)
+            st.markdown('<p class="chart-title">MPG vs Tax — Efficiency Matrix</p>', unsafe_allow_html=True)
+            st.markdown('<p class="chart-subtitle">Bubble size = number of listings per fuel type</p>', unsafe_allow_html=True)
+            eff_df = inv["fuelType"].rename(
+                columns={"mpg_mean": "mpg", "tax_mean": "tax", "price_mean": "price"},
+            )
+            fig = bubble_figure(eff_df, "mpg", "tax", "count", "fuelType", PALETTE,
+                                size_max=55, hover=["price"])
+            plot("efficiency", fig, height=450, xaxis_title="Avg MPG", yaxis_title="Avg Tax (£)",
+                 legend=dict(title="fuelType", itemsizing="constant"))
+            st.markdown('</div>', unsafe_allow_html=True)
 
-    # — Treemap (full width) —
-    st.markdown('<div class="glass-card">', unsafe_allow_html=True)
-    st.markdown('<p class="chart-title">Model × Transmission Treemap</p>', unsafe_allow_html=True)
-    st.markdown('<p class="chart-subtitle">Proportional area map — larger blocks = more listings</p>', unsafe_allow_html=True)
-    tree_df = (
-        filtered.groupby(["model", "transmission"])
-        .size()
-        .reset_index(name="count")
-        .sort_values("count", ascending=False)
-        .head(40)
-    )
-    fig = px.treemap(
-        tree_df, path=["model", "transmission"], values="count",
-        color="count", color_continuous_scale=["#0f172a", "#1C69D4", "#22D3EE"],
-    )
-    fig.update_layout(**CHART_LAYOUT, height=460, coloraxis_showscale=False)
-    fig.update_traces(
-        marker_line_width=1,
-        marker_line_color="rgba(255,255,255,0.06)",
-        textfont_size=13,
-    )
-    st.plotly_chart(fig, width="stretch")
-    st.markdown('</div>', unsafe_allow_html=True)
 
-    # — Sunburst + Bubble Row —
-    sb_cols = st.columns([1, 1])
-    with sb_cols[0]:
+# ──────────────────────── TAB 4 — DATA EXPLORER ──────────────
+if tab_data.open:
+    with tab_data:
         st.markdown('<div class="glass-card">', unsafe_allow_html=True)
-        st.markdown('<p class="chart-title">Fuel → Transmission → Engine Sunburst</p>', unsafe_allow_html=True)
-        st.markdown('<p class="chart-subtitle">Hierarchical drill-down of inventory structure</p>', unsafe_allow_html=True)
-        sun_df = (
-            filtered.assign(engine_label=filtered["engineSize"].astype(str) + "L")
-            .groupby(["fuelType", "transmission", "engine_label"])
-            .size()
-            .reset_index(name="count")
+        st.markdown('<p class="chart-title">Filtered Dataset</p>', unsafe_allow_html=True)
+
+        # filter / sort / page run over the whole selection; only the
+        # visible page is taken from the dataset
+        f1, f2, f3 = st.columns([3, 1.2, 0.8], vertical_alignment="bottom")
+        query = f1.text_input(
+            "Filter rows", key="table_query",
+            placeholder="{price} >= 20000 && {model} contains X && {fuelType} = Diesel",
         )
-        fig = px.sunburst(
-            sun_df, path=["fuelType", "transmission", "engine_label"], values="count",
-            color_discrete_sequence=PALETTE,
+        sort_col = f2.selectbox("Sort by", TABLE_COLUMNS, index=TABLE_COLUMNS.index("price"), key="table_sort")
+        descending = f3.toggle("Descending", value=True, key="table_desc")
+        ordered = table_rows(state, sort_col, descending, query)
+        pages = bmw_table.page_count(len(ordered), TABLE_PAGE_SIZE)
+        if st.session_state.get("table_page", 1) > pages:
+            st.session_state["table_page"] = pages
+
+        st.markdown(f'<p class="chart-subtitle">Showing {len(ordered):,} of {n:,} records — use sidebar to refine</p>', unsafe_allow_html=True)
+        st.dataframe(
+            bmw_table.page_frame(df, ordered, st.session_state.get("table_page", 1) - 1,
+                                 TABLE_PAGE_SIZE, TABLE_COLUMNS),
+            width="stretch",
+            height=520,
         )
-        fig.update_layout(**CHART_LAYOUT, height=450)
-        fig.update_traces(textfont_size=12)
-        st.plotly_chart(fig, width="stretch")
+        st.number_input(f"Page (of {pages:,})", 1, pages, 1, key="table_page")
         st.markdown('</div>', unsafe_allow_html=True)
 
-    with sb_cols[1]:
+        # Download — the file is only built when the button is clicked
+        fmt = st.radio(
+            "Export format", list(FORMATS), format_func=lambda f: FORMATS[f][0],
+            horizontal=True, key="export_format",
+        )
+        label, ext, mime = FORMATS[fmt]
+        st.download_button(
+            label=f"⬇️  Download Filtered Data as {label}",
+            data=lambda: export_file(state, fmt),
+            file_name=f"bmw_filtered_export{ext}",
+            mime=mime,
+        )
+
+        # Summary statistics
         st.markdown('<div class="glass-card">', unsafe_allow_html=True)
-        st.markdown('<p class="chart-title">MPG vs Tax — Efficiency Matrix</p>', unsafe_allow_html=True)
-        st.markdown('<p class="chart-subtitle">Bubble size = number of listings per fuel type</p>', unsafe_allow_html=True)
-        eff_df = filtered.groupby(["fuelType"]).agg(
-            mpg=("mpg", "mean"), tax=("tax", "mean"), count=("price", "count"),
-            price=("price", "mean"),
-        ).reset_index()
-        fig = px.scatter(
-            eff_df, x="mpg", y="tax", size="count", color="fuelType",
-            hover_data=["price"], color_discrete_sequence=PALETTE,
-            size_max=55,
+        st.markdown('<p class="chart-title">Quick Statistics</p>', unsafe_allow_html=True)
+        st.markdown('<p class="chart-subtitle">Summary of numeric columns in current filter</p>', unsafe_allow_html=True)
+        st.dataframe(
+            df.take(sel.rows).describe().T.style.format("{:,.1f}"),
+            width="stretch",
         )
-        fig.update_layout(**CHART_LAYOUT, height=450,
-                          xaxis_title="Avg MPG", yaxis_title="Avg Tax (£)")
-        st.plotly_chart(fig, width="stretch")
         st.markdown('</div>', unsafe_allow_html=True)
 
 
-# ──────────────────────── TAB 4 — DATA EXPLORER ──────────────
-with tab_data:
-    st.markdown('<div class="glass-card">', unsafe_allow_html=True)
-    st.markdown('<p class="chart-title">Filtered Dataset</p>', unsafe_allow_html=True)
-    st.markdown(f'<p class="chart-subtitle">Showing {len(filtered):,} records — use sidebar to refine</p>', unsafe_allow_html=True)
-
-    col_order = ["model", "year", "price", "transmission", "mileage", "fuelType", "tax", "mpg", "engineSize"]
-    st.dataframe(
-        filtered[col_order].sort_values("price", ascending=False).reset_index(drop=True),
-        width="stretch",
-        height=520,
-    )
-    st.markdown('</div>', unsafe_allow_html=True)
-
-    # Download CSV
-    csv_out = filtered.to_csv(index=False).encode("utf-8")
-    st.download_button(
-        label="⬇️  Download Filtered Data as CSV",
-        data=csv_out,
-        file_name="bmw_filtered_export.csv",
-        mime="text/csv",
-    )
-
-    # Summary statistics
-    st.markdown('<div class="glass-card">', unsafe_allow_html=True)
-    st.markdown('<p class="chart-title">Quick Statistics</p>', unsafe_allow_html=True)
-    st.markdown('<p class="chart-subtitle">Summary of numeric columns in current filter</p>', unsafe_allow_html=True)
-    st.dataframe(
-        filtered.describe().T.style.format("{:,.1f}"),
-        width="stretch",
-    )
-    st.markdown('</div>', unsafe_allow_html=True)
-
-
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 #  FOOTER
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -557,3 +665,5 @@ st.markdown("""
     BMW Used Car Intelligence · Built with Streamlit & Plotly · Data for demonstration purposes
 </p>
 """, unsafe_allow_html=True)
+
+st.session_state["run_finished"] = True   # see settle()
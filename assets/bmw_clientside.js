@@ -0,0 +1,171 @@
+// ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+//  BMW Used Car Intelligence — browser-side analytics (BMW_CLIENTSIDE=1)
+// ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+//  dash_app puts the dataset blob (bmw_blob.py) and the trace templates
+//  of the browser-side charts in the "client-data" store.  The blob is
+//  inflated once per page; a filter change is then one pass over the
+//  rows, shared by the KPI row and the fuel bar, transmission donut,
+//  price trend and top-models charts, with no request to the server.
+(function () {
+    const TYPES = {uint8: Uint8Array, uint16: Uint16Array, int32: Int32Array, float32: Float32Array};
+    const KPIS = [   // mirrors update_summary's kpi_card row
+        ["💷", "price", "Avg Price", "blue", v => "£" + fmt(v, 0)],
+        ["🛣️", "mileage", "Avg Mileage", "cyan", v => fmt(v, 0)],
+        ["⛽", "mpg", "Avg MPG", "green", v => v.toFixed(1)],
+        ["🔧", "engineSize", "Avg Engine", "amber", v => v.toFixed(1) + "L"],
+    ];
+    const TOP_MODELS = 12;
+
+    let dataset = null;   // {version, promise}
+    let last = null;      // {key, summary} of the latest filter state
+
+    function fmt(v, digits) {
+        return v.toLocaleString("en-GB", {minimumFractionDigits: digits, maximumFractionDigits: digits});
+    }
+
+    async function inflate(b64) {
+        const bytes = Uint8Array.from(atob(b64), ch => ch.charCodeAt(0));
+        const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream("gzip"));
+        return new Response(stream).arrayBuffer();
+    }
+
+    // column → {codes, dictionary} for categories, plus Float64 values for numbers
+    async function decodeColumn(col, rows) {
+        const raw = new TYPES[col.dtype](await inflate(col.data));
+        if (!col.dictionary) {
+            return {values: Float64Array.from(raw)};
+        }
+        const out = {codes: raw, dictionary: col.dictionary};
+        if (typeof col.dictionary[0] === "number") {
+            out.values = new Float64Array(rows);
+            for (let i = 0; i < rows; i++) out.values[i] = col.dictionary[raw[i]];
+        }
+        return out;
+    }
+
+    function load(blob) {
+        if (!dataset || dataset.version !== blob.version) {
+            dataset = {version: blob.version, promise: (async () => {
+                const cols = {};
+                for (const [name, col] of Object.entries(blob.columns)) {
+                    cols[name] = await decodeColumn(col, blob.rows);
+                }
+                return {rows: blob.rows, cols};
+            })()};
+            last = null;
+        }
+        return dataset.promise;
+    }
+
+    // per-code 0/1 table: is the category allowed (an empty dropdown means all)
+    function allowed(col, picked) {
+        const keep = picked && picked.length ? new Set(picked) : null;
+        return Uint8Array.from(col.dictionary, v => (keep === null || keep.has(v)) ? 1 : 0);
+    }
+
+    // one pass: row count, measure sums and the grouped counts the charts need
+    function summarize(data, year, fuels, trans, price, models) {
+        const c = data.cols;
+        const fuelOk = allowed(c.fuelType, fuels), transOk = allowed(c.transmission, trans),
+              modelOk = allowed(c.model, models);
+        const f = c.fuelType.codes, t = c.transmission.codes, m = c.model.codes, yc = c.year.codes;
+        const yv = c.year.values, pv = c.price.values, mv = c.mileage.values,
+              gv = c.mpg.values, ev = c.engineSize.values;
+        const s = {
+            count: 0, sums: {price: 0, mileage: 0, mpg: 0, engineSize: 0},
+            fuelType: new Float64Array(fuelOk.length), transmission: new Float64Array(transOk.length),
+            model: new Float64Array(modelOk.length),
+            yearCount: new Float64Array(c.year.dictionary.length),
+            yearPrice: new Float64Array(c.year.dictionary.length),
+        };
+        for (let i = 0; i < data.rows; i++) {
+            if (!fuelOk[f[i]] || !transOk[t[i]] || !modelOk[m[i]]) continue;
+            const y = yv[i], p = pv[i];
+            if (y < year[0] || y > year[1] || p < price[0] || p > price[1]) continue;
+            s.count++;
+            s.sums.price += p; s.sums.mileage += mv[i]; s.sums.mpg += gv[i]; s.sums.engineSize += ev[i];
+            s.fuelType[f[i]]++; s.transmission[t[i]]++; s.model[m[i]]++;
+            s.yearCount[yc[i]]++; s.yearPrice[yc[i]] += p;
+        }
+        return s;
+    }
+
+    // the latest state is summarised once for all the callbacks it fires
+    async function current(store, filters) {
+        const data = await load(store.dataset);
+        const key = JSON.stringify(filters);
+        if (!last || last.key !== key) {
+            last = {key, summary: summarize(data, ...filters)};
+        }
+        return {data, s: last.summary};
+    }
+
+    // non-zero counts per label, largest first, ties in dictionary order
+    function counts(col, totals) {
+        const order = [];
+        totals.forEach((n, code) => { if (n > 0) order.push(code); });
+        order.sort((a, b) => totals[b] - totals[a] || a - b);
+        return {labels: order.map(code => String(col.dictionary[code])), values: order.map(code => totals[code])};
+    }
+
+    function trace(store, graphId, fields) {
+        return Object.assign(JSON.parse(JSON.stringify(store.traces[graphId])), fields);
+    }
+
+    function withTrace(figure, tr) {
+        return Object.assign({}, figure, {data: [tr]});
+    }
+
+    function div(className, children) {
+        const props = {className};
+        if (children !== undefined) props.children = children;
+        return {namespace: "dash_html_components", type: "Div", props};
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        bmw: {
+            summary: async function (year, fuels, trans, price, models, store) {
+                const {data, s} = await current(store, [year, fuels, trans, price, models]);
+                const subtitle = `Real-time analytics across ${fmt(s.count, 0)} listings ` +
+                                 `from a universe of ${fmt(data.rows, 0)} vehicles`;
+                const kpis = KPIS.map(([icon, col, label, accent, show]) => div(`kpi-card accent-${accent}`, [
+                    div("kpi-icon", icon), div("kpi-value", s.count ? show(s.sums[col] / s.count) : "—"),
+                    div("kpi-label", label), div("kpi-bar"),
+                ]));
+                return [subtitle, kpis];
+            },
+
+            overview: async function (year, fuels, trans, price, models, store, fuelFig, transFig, trendFig) {
+                const {data, s} = await current(store, [year, fuels, trans, price, models]);
+                const c = data.cols, palette = store.palette;
+                const fuel = counts(c.fuelType, s.fuelType);
+                const tr = counts(c.transmission, s.transmission);
+                const years = [], avg = [];
+                s.yearCount.forEach((n, code) => {
+                    if (n > 0) { years.push(c.year.dictionary[code]); avg.push(s.yearPrice[code] / n); }
+                });
+                return [
+                    withTrace(fuelFig, trace(store, "chart-fuel-bar", {
+                        x: fuel.labels, y: fuel.values,
+                        marker: Object.assign({}, store.traces["chart-fuel-bar"].marker,
+                                              {color: fuel.labels.map((_, i) => palette[i % palette.length])}),
+                    })),
+                    withTrace(transFig, trace(store, "chart-trans-donut", {
+                        labels: tr.labels, values: tr.values, pull: tr.labels.map(() => 0.02),
+                    })),
+                    withTrace(trendFig, trace(store, "chart-price-trend", {x: years, y: avg})),
+                ];
+            },
+
+            inventory: async function (year, fuels, trans, price, models, store, topFig) {
+                const {data, s} = await current(store, [year, fuels, trans, price, models]);
+                const top = counts(data.cols.model, s.model);
+                const values = top.values.slice(0, TOP_MODELS);
+                return withTrace(topFig, trace(store, "chart-top-models", {
+                    x: values, y: top.labels.slice(0, TOP_MODELS),
+                    marker: Object.assign({}, store.traces["chart-top-models"].marker, {color: values}),
+                }));
+            },
+        },
+    });
+})();
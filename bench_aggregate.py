@@ -0,0 +1,89 @@
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  BMW Used Car Intelligence — tab aggregation benchmark
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  Per-chart pandas code of the Overview + Inventory tabs vs the fused
+#  engine (bmw_agg) over the same row selection, and vs the cube path.
+#  Datasets are bmw.csv resampled to the requested size.
+#
+#      python bench_aggregate.py                 # 10K, 1M, 10M rows
+#      python bench_aggregate.py 100000 2000000
+import sys
+import time
+
+import numpy as np
+
+from bmw_agg import TABS
+from bmw_data import load_bmw
+from bmw_index import FilterState
+from bmw_cube import Cube
+
+SIZES = [10_000, 1_000_000, 10_000_000]
+
+
+def resample(df, n, seed=0):
+    rows = np.random.default_rng(seed).integers(0, len(df), n)
+    return df.take(rows).reset_index(drop=True)
+
+
+def pandas_tabs(filtered):
+    """The per-chart pandas passes the Overview and Inventory tabs used to run."""
+    out = {}
+    out["fuel"] = filtered["fuelType"].value_counts()
+    out["trans"] = filtered["transmission"].value_counts()
+    out["trend"] = filtered.groupby("year").agg(avg=("price", "mean"), cnt=("price", "count"))
+    out["engine"] = filtered["engineSize"].value_counts().sort_index()
+    out["models"] = filtered["model"].value_counts().head(12)
+    out["rank"] = filtered.groupby("model", observed=True)["price"].mean().sort_values().head(10)
+    out["tree"] = filtered.groupby(["model", "transmission"], observed=True).size()
+    out["sun"] = (filtered.assign(eng=filtered["engineSize"].astype(str) + "L")
+                  .groupby(["fuelType", "transmission", "eng"], observed=True).size())
+    out["eff"] = filtered.groupby("fuelType", observed=True).agg(
+        mpg=("mpg", "mean"), tax=("tax", "mean"), count=("price", "count"), price=("price", "mean"))
+    return out
+
+
+def fused_rows(cube, rows):
+    return [cube.aggregate_rows(rows, TABS[tab]["groupings"], TABS[tab]["measures"])
+            for tab in ("overview", "inventory")]
+
+
+def fused_cube(cube, state):
+    return [cube.tab(state, tab) for tab in ("overview", "inventory")]
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def main(sizes):
+    base = load_bmw(use_sidecar=False)
+    years, prices = base["year"], base["price"]
+    print(f"{'rows':>11} {'selection':>10} {'pandas':>10} {'fused rows':>11} {'cube':>9} {'speed-up':>9}")
+    for n in sizes:
+        df = resample(base, n)
+        t = time.perf_counter()
+        cube = Cube(df)
+        build = time.perf_counter() - t
+        repeat = 5 if n <= 1_000_000 else 2
+        full = FilterState.make((years.min(), years.max()), (prices.min(), prices.max()))
+        for label, state, mask in [
+            ("all", full, np.ones(n, dtype=bool)),
+            ("Diesel", full._replace(fuelType=("Diesel",)), (df["fuelType"] == "Diesel").to_numpy()),
+        ]:
+            rows = np.flatnonzero(mask).astype(np.int32)
+            filtered = df.take(rows)
+            t_pd = best_of(lambda: pandas_tabs(filtered), repeat)
+            t_rows = best_of(lambda: fused_rows(cube, rows), repeat)
+            t_cube = best_of(lambda: fused_cube(cube, state), repeat)
+            print(f"{n:>11,} {label:>10} {t_pd * 1e3:>8.1f}ms {t_rows * 1e3:>9.1f}ms "
+                  f"{t_cube * 1e3:>7.2f}ms {t_pd / t_rows:>8.1f}x")
+        print(f"{'':>11} cube build {build:.2f}s, {cube.n_cells:,} cells")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or SIZES)
@@ -0,0 +1,173 @@
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  BMW Used Car Intelligence — Dash callback traffic benchmark
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  Replays a short session against dash_app through Flask's test
+#  client and reports, per interaction, how many callback requests the
+#  page sends, the server CPU time they cost and the response bytes.
+#
+#  The dispatch rules of the Dash renderer are emulated: a property
+#  change fires every callback with that input whose outputs are in
+#  the layout, and components mounted by a callback's returned children
+#  fire their own callbacks as initial calls.  A PreventUpdate (204)
+#  still counts — it was a round-trip.  Background callbacks are polled
+#  every JOB_POLL_MS until their job answers, and each poll counts; the
+#  jobs' own CPU is spent in forked processes and is not in the total.
+#
+#  It measures a cold worker: the startup warm-up only starts from
+#  dash_app.init(), which this doesn't call, and it skips the
+#  host-wide result store unless BMW_SHARED_CACHE names one, or is set
+#  empty for the default (run twice to see a warm host).
+#
+#      python bench_callbacks.py
+#      BMW_CSV=big.csv python bench_callbacks.py
+import json
+import os
+import time
+from urllib.parse import urlencode
+
+os.environ.setdefault("BMW_SHARED_CACHE", "off")
+
+import dash_app
+
+
+def parse_outputs(spec):
+    """``"..a.children...b.figure.."`` / ``"a.figure"`` → [("a", "children"), ...]."""
+    parts = spec[2:-2].split("...") if spec.startswith("..") else [spec]
+    return [tuple(p.rsplit(".", 1)) for p in parts]
+
+
+class Page:
+    """Component props of the rendered page, plus the callbacks it sends."""
+
+    def __init__(self, client):
+        self.client = client
+        self.deps = client.get("/_dash-dependencies").get_json()
+        self.props = {}
+        self.owned = {}   # component id → ids mounted in its children
+        self.requests = 0
+        self.cpu = 0.0
+        self.bytes = 0
+        self.mount(client.get("/_dash-layout").get_json())
+
+    def mount(self, tree):
+        """Record the ids and props of a layout subtree; return the new ids."""
+        found = []
+
+        def walk(node):
+            if isinstance(node, list):
+                for child in node:
+                    walk(child)
+            elif isinstance(node, dict) and "props" in node:
+                props = node["props"]
+                if isinstance(props.get("id"), str):
+                    found.append(props["id"])
+                    for prop, value in props.items():
+                        self.props[(props["id"], prop)] = value
+                walk(props.get("children"))
+        walk(tree)
+        return found
+
+    def unmount(self, cid):
+        for child in self.owned.pop(cid, []):
+            self.unmount(child)
+            for key in [k for k in self.props if k[0] == child]:
+                del self.props[key]
+
+    def present(self, dep):
+        if dep.get("clientside_function"):
+            return False   # runs in the browser, no request
+        ids = {i for i, _ in self.props}
+        return all(o in ids for o, _ in parse_outputs(dep["output"])) and \
+            all(i["id"] in ids for i in dep["inputs"])
+
+    def body(self, dep, changed):
+        """The request the renderer sends for ``dep`` with the current props."""
+        outputs = parse_outputs(dep["output"])
+        return {
+            "output": dep["output"],
+            "outputs": [{"id": o, "property": p} for o, p in outputs]
+            if dep["output"].startswith("..") else {"id": outputs[0][0], "property": outputs[0][1]},
+            "inputs": [dict(i, value=self.props.get((i["id"], i["property"]))) for i in dep["inputs"]],
+            "state": [dict(s, value=self.props.get((s["id"], s["property"]))) for s in dep["state"]],
+            "changedPropIds": changed,
+        }
+
+    def call(self, dep, changed):
+        body = self.body(dep, changed)
+        resp = self.post("/_dash-update-component", body)
+        job = resp.get_json() if resp.status_code == 200 else None
+        if job and "cacheKey" in job:
+            query = urlencode({"cacheKey": job["cacheKey"], "job": job["job"]})
+            while True:
+                time.sleep(dash_app.JOB_POLL_MS / 1e3)
+                resp = self.post(f"/_dash-update-component?{query}", body)
+                if resp.status_code == 204 or "response" in resp.get_json():
+                    break
+        if resp.status_code == 204:
+            return []
+        mounted = []
+        for cid, values in resp.get_json()["response"].items():
+            for prop, value in values.items():
+                self.props[(cid, prop)] = value
+                if prop == "children":
+                    self.unmount(cid)
+                    self.owned[cid] = self.mount(value)
+                    mounted += self.owned[cid]
+        return mounted
+
+    def post(self, url, body):
+        t = time.process_time()
+        resp = self.client.post(url, data=json.dumps(body), content_type="application/json")
+        self.cpu += time.process_time() - t
+        self.requests += 1
+        self.bytes += len(resp.data)
+        return resp
+
+    def listeners(self, cid, prop):
+        """Callbacks the renderer fires when ``cid.prop`` changes."""
+        return [d for d in self.deps if self.present(d) and
+                any(i["id"] == cid and i["property"] == prop for i in d["inputs"])]
+
+    def fire(self, deps, changed):
+        mounted = []
+        for dep in deps:
+            mounted += self.call(dep, changed)
+        if mounted:
+            new = set(mounted)
+            self.fire([d for d in self.deps if not d["prevent_initial_call"] and self.present(d)
+                       and any(o in new for o, _ in parse_outputs(d["output"]))], [])
+
+    def load(self):
+        self.fire([d for d in self.deps if not d["prevent_initial_call"] and self.present(d)], [])
+
+    def set(self, cid, prop, value):
+        self.props[(cid, prop)] = value
+        self.fire(self.listeners(cid, prop), [f"{cid}.{prop}"])
+
+
+def measure(page, label, action):
+    page.requests, page.cpu, page.bytes = 0, 0.0, 0
+    t = time.perf_counter()
+    action()
+    wall = time.perf_counter() - t
+    print(f"{label:<34} {page.requests:>8} {page.cpu * 1e3:>11.1f}ms {page.bytes / 1024:>9.1f}KB"
+          f" {wall * 1e3:>9.0f}ms")
+
+
+def main():
+    page = Page(dash_app.server.test_client())
+    print(f"{'interaction':<34} {'requests':>8} {'server CPU':>13} {'response':>11} {'wall':>11}")
+    measure(page, "initial load", page.load)
+    defaults = {k: page.props[k] for k in [("filter-fuel", "value"), ("filter-price", "value")]}
+    for tab in ("tab-overview", "tab-pricing", "tab-inventory", "tab-data"):
+        if tab != "tab-overview":
+            measure(page, f"open {tab}", lambda: page.set("main-tabs", "active_tab", tab))
+        measure(page, f"  fuel filter on {tab}", lambda: page.set("filter-fuel", "value", ["Diesel"]))
+        measure(page, f"  price slider on {tab}",
+                lambda: page.set("filter-price", "value", [5200, 60200]))
+        page.props.update(defaults)   # back to the full selection, without a round-trip
+    measure(page, "  next table page on tab-data", lambda: page.set("data-table", "page_current", 1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  BMW Used Car Intelligence — slider drag replay
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  Replays one recorded drag of the year slider's lower handle against
+#  dash_app the way a threaded server sees it: each position the page
+#  reports becomes a request for every callback listening to the
+#  slider, sent without waiting for earlier answers (the renderer throws
+#  stale answers away itself).  For each update mode it reports the
+#  requests sent, computed and dropped, the server CPU spent and the
+#  time from letting go of the handle to the last answer.
+#
+#  Chart jobs are kept in this process so that their CPU is counted, and
+#  the warm-up and the host-wide result store are off so that every
+#  mode starts cold.
+#
+#      python bench_drag.py
+#      BMW_CSV=big.csv python bench_drag.py
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("BMW_BACKGROUND_ROWS", str(1 << 62))
+os.environ.setdefault("BMW_SHARED_CACHE", "off")
+
+import dash_app
+from bench_callbacks import Page
+
+SERVER_THREADS = 8
+PAUSE_EVERY    = 4     # the hand rests on every 4th position ...
+PAUSE_MS       = 400   # ... for this long; otherwise a position every
+MOVE_MS        = 45    # MOVE_MS, about what a slider reports mid-drag
+
+
+def recorded_drag(lo, hi):
+    """(ms after the previous position, lower handle) of the drag."""
+    return [(PAUSE_MS if i % PAUSE_EVERY == 0 and i else MOVE_MS, year)
+            for i, year in enumerate(range(lo + 1, hi - 1))]
+
+
+def schedule(drag, mode):
+    """(ms since the drag started, lower handle) of the values that reach the server."""
+    at, times = 0, []
+    for gap, year in drag:
+        at += gap
+        times.append((at, year))
+    if mode == "release":
+        return times[-1:]
+    if mode == "debounce":
+        # a value is sent once the handle has rested for SLIDER_DEBOUNCE_MS;
+        # letting go sends the last one straight away
+        rests = [(t + dash_app.SLIDER_DEBOUNCE_MS, y)
+                 for (t, y), (t_next, _) in zip(times, times[1:])
+                 if t_next - t >= dash_app.SLIDER_DEBOUNCE_MS]
+        return rests + times[-1:]
+    return times
+
+
+def replay(page, deps, sends, hi):
+    local = threading.local()
+
+    def post(body):
+        if not hasattr(local, "client"):
+            local.client = dash_app.server.test_client()
+        return local.client.post("/_dash-update-component", json=body).status_code
+
+    for cache in (dash_app.selection_cache, dash_app.tab_cache, dash_app.table_cache,
+                  dash_app.figure_cache):
+        cache.clear()
+    futures = []
+    with ThreadPoolExecutor(SERVER_THREADS) as pool:
+        cpu, start = time.process_time(), time.perf_counter()
+        for at, year in sends:
+            time.sleep(max(0.0, start + at / 1e3 - time.perf_counter()))
+            page.props[("filter-year", "value")] = [year, hi]
+            futures += [pool.submit(post, page.body(d, ["filter-year.value"])) for d in deps]
+        released = time.perf_counter()
+        codes = [f.result() for f in futures]
+        settled = time.perf_counter()
+    return len(codes), codes.count(200), codes.count(204), time.process_time() - cpu, settled - released
+
+
+def main():
+    page = Page(dash_app.server.test_client())
+    page.load()
+    lo, hi = page.props[("filter-year", "value")]
+    drag = recorded_drag(lo, hi)
+    print(f"{len(dash_app.raw_df):,} rows · {len(drag)} drag positions · "
+          f"{dash_app.COMPUTE_SLOTS} compute slot(s) · {SERVER_THREADS} server threads")
+    modes = [("every position", "drag", False), ("every position, coalesced", "drag", True),
+             (f"debounce {dash_app.SLIDER_DEBOUNCE_MS} ms, coalesced", "debounce", True),
+             ("update on release", "release", True)]
+    for tab in ("tab-overview", "tab-pricing"):
+        page.set("main-tabs", "active_tab", tab)
+        deps = page.listeners("filter-year", "value")
+        print(f"\n{tab} ({len(deps)} callbacks per position)")
+        print(f"{'mode':<34} {'sent':>6} {'computed':>9} {'dropped':>8} {'server CPU':>11} {'settle':>9}")
+        for label, mode, coalesce in modes:
+            dash_app.coalescer.enabled = coalesce
+            sent, computed, dropped, cpu, settle = replay(page, deps, schedule(drag, mode), hi)
+            print(f"{label:<34} {sent:>6} {computed:>9} {dropped:>8} {cpu:>10.2f}s {settle * 1e3:>7.0f}ms")
+        page.props[("filter-year", "value")] = [lo, hi]
+
+
+if __name__ == "__main__":
+    main()
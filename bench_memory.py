@@ -0,0 +1,148 @@
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  BMW Used Car Intelligence — gunicorn worker memory benchmark
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  Starts dash_app under gunicorn (gunicorn.conf.py) with 1, 4 and 16
+#  workers in three modes — every worker importing the app itself,
+#  preload-and-fork, and preload-and-fork with gc.freeze — and replays
+#  browser sessions (bench_callbacks.Page over HTTP) until every worker
+#  has served traffic.  Once the server is idle it reports each
+#  process's
+#
+#      USS  memory only that process maps — what stopping it would free
+#      PSS  USS plus its share of the pages it maps with others
+#
+#  per worker, for the master, and the PSS total of the deployment.
+#
+#      python bench_memory.py
+#      BMW_CSV=big.csv python bench_memory.py
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import psutil
+
+SERVER_ENV = dict(os.environ)
+# the replaying client imports dash_app too; keep it off the store
+os.environ.setdefault("BMW_SHARED_CACHE", "off")
+from bench_callbacks import Page
+
+WORKER_COUNTS = (1, 4, 16)
+MODES = [("import per worker", {"BMW_PRELOAD": "0"}),
+         ("preload", {"BMW_PRELOAD": "1", "BMW_GC_FREEZE": "0"}),
+         ("preload + gc.freeze", {"BMW_PRELOAD": "1", "BMW_GC_FREEZE": "1"})]
+SESSIONS_PER_WORKER = 3
+IDLE_SECONDS = 2.0
+
+
+class Response:
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self.data = data
+
+    def get_json(self):
+        return json.loads(self.data)
+
+
+class HTTPClient:
+    """The part of Flask's test client that Page uses, over real HTTP."""
+
+    def __init__(self, base):
+        self.base = base
+
+    def _send(self, request):
+        try:
+            with urlopen(request, timeout=300) as resp:
+                return Response(resp.status, resp.read())
+        except HTTPError as err:
+            return Response(err.code, err.read())
+
+    def get(self, path):
+        return self._send(Request(self.base + path))
+
+    def post(self, path, data, content_type):
+        return self._send(Request(self.base + path, data=data.encode(), method="POST",
+                                  headers={"Content-Type": content_type}))
+
+
+def session(base):
+    page = Page(HTTPClient(base))
+    page.load()
+    page.set("filter-fuel", "value", ["Diesel"])
+    page.set("main-tabs", "active_tab", "tab-pricing")
+    page.set("filter-price", "value", [5200, 60200])
+    page.set("main-tabs", "active_tab", "tab-inventory")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_idle(proc):
+    """Wait until the server tree stops using CPU (imports, warm-ups done)."""
+    def cpu():
+        tree = [proc] + proc.children(recursive=True)
+        return sum(sum(p.cpu_times()[:2]) for p in tree if p.is_running())
+    last = cpu()
+    while True:
+        time.sleep(IDLE_SECONDS)
+        now = cpu()
+        if now - last < 0.05 * IDLE_SECONDS:
+            return
+        last = now
+
+
+def wait_up(base, proc, workers):
+    while len(proc.children()) < workers:
+        time.sleep(0.2)
+    while True:
+        try:
+            urlopen(base + "/", timeout=300).read()
+            return
+        except OSError:
+            time.sleep(0.5)
+
+
+def measure(workers, env):
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "dash_app:server"],
+        env=dict(SERVER_ENV, BMW_WORKERS=str(workers), BMW_BIND=f"127.0.0.1:{port}", **env),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        proc = psutil.Process(server.pid)
+        wait_up(base, proc, workers)
+        wait_idle(proc)
+        with ThreadPoolExecutor(workers) as pool:
+            list(pool.map(session, [base] * (SESSIONS_PER_WORKER * workers)))
+        wait_idle(proc)
+        master = proc.memory_full_info()
+        mem = [p.memory_full_info() for p in proc.children()]
+    finally:
+        server.terminate()
+        server.wait()
+    return (master.pss, sum(m.uss for m in mem) / len(mem), sum(m.pss for m in mem) / len(mem),
+            master.pss + sum(m.pss for m in mem))
+
+
+def main():
+    mb = 1 << 20
+    print(f"{'mode':<22} {'workers':>7} {'master PSS':>11} {'worker USS':>11} "
+          f"{'worker PSS':>11} {'total PSS':>10}")
+    for label, env in MODES:
+        for workers in WORKER_COUNTS:
+            master, uss, pss, total = measure(workers, env)
+            print(f"{label:<22} {workers:>7} {master / mb:>9.0f}MB {uss / mb:>9.0f}MB "
+                  f"{pss / mb:>9.0f}MB {total / mb:>8.0f}MB", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  BMW Used Car Intelligence — fused tab aggregation
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  A tab asks for several groupings of the same selection (fuel counts,
+#  transmission counts, yearly means, ...).  Instead of one pandas pass
+#  per chart, the selection is folded once — a single bincount sweep
+#  over integer-coded columns — into the finest grouping the tab needs,
+#  and every chart's grouping is then rolled up from those few bins.
+#  The input units are either listings (weight 1) or cube cells.
+import numpy as np
+import pandas as pd
+
+# Groupings and measures each dashboard tab reads (both Streamlit apps
+# and the Dash app; a grouping one layout doesn't draw costs nothing).
+TABS = {
+    "overview":  {"groupings": [("fuelType",), ("transmission",), ("year",), ("engineSize",)],
+                  "measures": ["price"]},
+    "pricing":   {"groupings": [("fuelType", "year")],
+                  "measures": ["price"]},
+    "inventory": {"groupings": [("model",), ("engineSize",), ("model", "transmission"),
+                                ("fuelType", "transmission", "engineSize"), ("fuelType",)],
+                  "measures": ["price", "mpg", "tax"]},
+}
+
+# Up to this many fine bins the key is used directly as the bin id;
+# past it the occupied keys are compacted with np.unique first.
+DENSE_BINS = 1 << 22
+
+
+def as_grouping(by):
+    return (by,) if isinstance(by, str) else tuple(by)
+
+
+def group(labels, by, codes, count, sums, sumsq):
+    """Roll units up to one row per non-empty ``by`` group, sorted by key.
+
+    ``count`` is the number of listings per unit; ``sums`` / ``sumsq``
+    map each measure to its per-unit sum and sum of squares.  Returns
+    ``count`` plus ``<measure>_mean`` and ``<measure>_std`` columns.
+    """
+    key, radix = np.zeros(len(count), dtype=np.int64), 1
+    for dim in reversed(by):
+        key += codes[dim].astype(np.int64) * radix
+        radix *= len(labels[dim])
+    groups, inverse = np.unique(key, return_inverse=True)
+    n = np.bincount(inverse, weights=count, minlength=len(groups))
+    keep = n > 0
+    n = n[keep]
+
+    out = {}
+    for dim in reversed(by):
+        size = len(labels[dim])
+        out[dim] = labels[dim][(groups % size)[keep]]
+        groups = groups // size
+    out = {dim: out[dim] for dim in by}
+    out["count"] = n.astype(np.int64)
+    for m in sums:
+        s = np.bincount(inverse, weights=sums[m], minlength=len(keep))[keep]
+        sq = np.bincount(inverse, weights=sumsq[m], minlength=len(keep))[keep]
+        out[f"{m}_mean"] = s / n
+        with np.errstate(invalid="ignore", divide="ignore"):
+            var = (sq - s * s / n) / (n - 1)
+        out[f"{m}_std"] = np.sqrt(np.clip(var, 0, None))
+    return pd.DataFrame(out)
+
+
+def fuse(labels, codes, count, sums, sumsq, groupings):
+    """Answer every grouping in ``groupings`` from one sweep over the units.
+
+    ``count`` is the listings per unit, or a plain int — the number of
+    units — when every unit is a single listing.  The units are binned
+    once by the union of all grouping dimensions; the groupings
+    themselves are rolled up from the occupied bins only.
+    """
+    groupings = [as_grouping(g) for g in groupings]
+    dims = list(dict.fromkeys(dim for g in groupings for dim in g))
+    sizes = [len(labels[dim]) for dim in dims]
+
+    weights = None if isinstance(count, (int, np.integer)) else count
+    units = count if weights is None else len(count)
+    key, radix = np.zeros(units, dtype=np.int64), 1
+    for dim, size in zip(reversed(dims), reversed(sizes)):
+        key += codes[dim].astype(np.int64) * radix
+        radix *= size
+
+    if radix <= DENSE_BINS:
+        bins, nbins = None, radix
+    else:
+        bins, key = np.unique(key, return_inverse=True)
+        nbins = len(bins)
+    n = np.bincount(key, weights=weights, minlength=nbins)
+    live = np.flatnonzero(n)
+    fine = live if bins is None else bins[live]
+
+    fine_codes = {}
+    for dim, size in zip(reversed(dims), reversed(sizes)):
+        fine_codes[dim] = fine % size
+        fine = fine // size
+    fine_sums = {m: np.bincount(key, weights=v, minlength=nbins)[live] for m, v in sums.items()}
+    fine_sumsq = {m: np.bincount(key, weights=v, minlength=nbins)[live] for m, v in sumsq.items()}
+
+    return Aggregates({g: group(labels, g, fine_codes, n[live], fine_sums, fine_sumsq)
+                       for g in groupings}, list(sums))
+
+
+class Aggregates:
+    """Roll-ups of one selection, keyed by grouping — what chart builders read."""
+
+    def __init__(self, frames, measures):
+        self.frames = frames
+        self.measures = measures
+
+    def __getitem__(self, by):
+        return self.frames[as_grouping(by)]
+
+    def __contains__(self, by):
+        return as_grouping(by) in self.frames
+
+    @property
+    def nbytes(self):
+        """Bytes held by the roll-ups (what a cache charges for them)."""
+        return sum(int(np.sum(f.memory_usage(deep=True))) for f in self.frames.values())
+
+    def counts(self, dim):
+        """Rows per ``dim`` value, largest first — a drop-in for value_counts."""
+        r = self[dim]
+        return (pd.Series(r["count"].to_numpy(), index=pd.Index(r[dim], name=dim), name="count")
+                .sort_values(ascending=False, kind="stable"))
+
+    def means(self):
+        """Overall count and mean of every measure (NaN means for an empty selection)."""
+        r = self[()]
+        if not len(r):
+            return pd.Series({"count": 0.0, **{m: np.nan for m in self.measures}})
+        return pd.Series({"count": r["count"].iat[0],
+                          **{m: r[f"{m}_mean"].iat[0] for m in self.measures}})
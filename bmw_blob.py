@@ -0,0 +1,52 @@
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  BMW Used Car Intelligence — columnar dataset blob for the browser
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  dash_app's clientside mode ships the columns its browser-side charts
+#  need to the page once, as JSON with one gzip-compressed, base64 field
+#  per column (assets/bmw_clientside.js inflates them with the browser's
+#  DecompressionStream):
+#
+#      categories, and numbers with ≤ 256 distinct values (or up to
+#      65,536 when that is under a quarter of the rows)
+#                          uint8 / uint16 codes + the dictionary
+#      other numbers       little-endian int32 / float32 values
+import base64
+import gzip
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+
+def _pack(array):
+    return base64.b64encode(gzip.compress(array.tobytes(), compresslevel=9, mtime=0)).decode("ascii")
+
+
+def _label(value):
+    # float32 dictionary entries at their shortest repr: 0.6, not 0.6000000238418579
+    return float(str(value)) if isinstance(value, np.floating) else value.item()
+
+
+def encode_column(series):
+    """One column as ``{"dtype", "data"[, "dictionary"]}``."""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        dictionary = series.cat.categories.astype(str).tolist()
+        codes = series.array.codes
+    else:
+        values = series.to_numpy()
+        uniques, codes = np.unique(values, return_inverse=True)
+        if len(uniques) > 1 << 8 and (len(uniques) > 1 << 16 or 4 * len(uniques) > len(values)):
+            raw = values.astype("<f4" if values.dtype.kind == "f" else "<i4")
+            return {"dtype": "float32" if values.dtype.kind == "f" else "int32", "data": _pack(raw)}
+        dictionary = [_label(v) for v in uniques]
+    dtype = "uint8" if len(dictionary) <= 1 << 8 else "uint16"
+    return {"dtype": dtype, "dictionary": dictionary, "data": _pack(codes.astype(dtype))}
+
+
+def encode(df, columns):
+    """The blob of ``columns`` of ``df``; ``version`` changes with the content."""
+    encoded = {c: encode_column(df[c]) for c in columns}
+    digest = hashlib.sha1()
+    for c in columns:
+        digest.update(encoded[c]["data"].encode("ascii"))
+    return {"rows": len(df), "version": digest.hexdigest()[:16], "columns": encoded}
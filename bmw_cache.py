@@ -0,0 +1,118 @@
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  BMW Used Car Intelligence — in-process result cache
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+import os
+import sys
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+
+def sizeof(value):
+    """Approximate resident bytes of a cached value."""
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return int(np.sum(value.memory_usage(deep=True)))
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(sizeof(v) for v in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(k) + sizeof(v) for k, v in value.items())
+    if isinstance(getattr(value, "nbytes", None), int):
+        return value.nbytes   # a container of frames / arrays (bmw_agg.Aggregates)
+    return sys.getsizeof(value)
+
+
+_caches = weakref.WeakSet()
+
+
+def _after_fork():
+    # a forked child (a Dash chart job) has only the forking thread: locks
+    # other threads held and the misses they were computing stay behind
+    for cache in _caches:
+        cache._lock = threading.Lock()
+        cache._pending = {}
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+class LRUCache:
+    """Thread-safe LRU bounded by total bytes, with hit/miss counters.
+
+    ``get_or_compute`` also collapses concurrent misses on the same key:
+    the first caller computes, the others wait for its result instead of
+    repeating the work (Dash fires all of a page's callbacks at once).
+    """
+
+    def __init__(self, max_bytes, sizeof=sizeof):
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._data = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        _caches.add(self)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        size = self._sizeof(value)
+        with self._lock:
+            if key in self._data:
+                self.nbytes -= self._data.pop(key)[1]
+            if size > self.max_bytes:
+                return value  # larger than the whole budget — don't evict everything for it
+            self._data[key] = (value, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted) = self._data.popitem(last=False)
+                self.nbytes -= evicted
+        return value
+
+    def get_or_compute(self, key, compute):
+        while True:
+            with self._lock:
+                if key in self._data:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return self._data[key][0]
+                event = self._pending.get(key)
+                if event is None:
+                    self.misses += 1
+                    event = self._pending[key] = threading.Event()
+                    break
+            event.wait()
+            # loop: normally a hit now; recompute if it was evicted or failed
+        try:
+            return self.put(key, compute())
+        finally:
+            with self._lock:
+                del self._pending[key]
+            event.set()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._data), "bytes": self.nbytes,
+                "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
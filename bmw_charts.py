@@ -0,0 +1,325 @@
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  BMW Used Car Intelligence — figures from pre-aggregated data
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  Plotly Express builds distribution charts from raw rows, so every
+#  matching value is serialised into the figure and binned in the
+#  browser.  These builders take the cube's summaries instead and keep
+#  the Express layouts, so the payload no longer grows with the filter.
+#  Styling (templates, sizes, titles) stays with each app.
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+
+def box_trace(stats, name, color, **kw):
+    """A go.Box drawn from one row of Cube.box_stats (no raw points)."""
+    return go.Box(
+        q1=[stats["q1"]], median=[stats["median"]], q3=[stats["q3"]],
+        lowerfence=[stats["lowerfence"]], upperfence=[stats["upperfence"]],
+        name=name, marker_color=color, boxpoints=False, **kw)
+
+
+def binned_histogram(edges, counts, box, name, color):
+    """Histogram bars plus a marginal box, laid out like
+    ``px.histogram(..., marginal="box")``.
+
+    ``edges`` / ``counts`` come from Cube.histogram and ``box`` is a row
+    of Cube.box_stats (or None to skip the marginal).
+    """
+    edges = np.asarray(edges, dtype=np.float64)
+    fig = go.Figure(go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2, y=counts, name=name, marker_color=color,
+        customdata=np.column_stack([edges[:-1], edges[1:]]),
+        hovertemplate=name + "=%{customdata[0]:,.0f}–%{customdata[1]:,.0f}"
+                      "<br>count=%{y:,}<extra></extra>",
+    ))
+    # the marginal axes are laid out even with no box to draw: swap_traces
+    # reuses the first figure's layout, and later boxes need x2/y2 to exist
+    fig.update_layout(
+        barmode="overlay", showlegend=False,
+        xaxis=dict(range=[edges[0], edges[-1]]),
+        yaxis=dict(domain=[0, 0.7326]),
+        yaxis2=dict(domain=[0.7426, 1], showticklabels=False, showgrid=False),
+        xaxis2=dict(matches="x", anchor="y2", showticklabels=False, showgrid=True),
+    )
+    if box is not None and box["count"]:
+        fig.add_trace(box_trace(box, name, color, orientation="h", y=[name],
+                                xaxis="x2", yaxis="y2", hoverinfo="x"))
+    return fig
+
+
+def violin_figure(violins, dim, colors, width=0.8):
+    """Violins drawn from Cube.violins: a filled KDE outline per group,
+    each scaled to the same width (Plotly's default scalemode), with the
+    quartile box inside — ``px.violin(..., box=True, points=False)``."""
+    fig = go.Figure()
+    for i, v in enumerate(violins.itertuples(index=False)):
+        label, color = getattr(v, dim), colors[i % len(colors)]
+        half = width / 2 * v.density / v.density.max() if v.density.max() > 0 else v.density
+        fig.add_trace(go.Scatter(
+            # float32 halves the base64 payload; far finer than a pixel
+            x=np.concatenate([i - half, (i + half)[::-1]]).astype(np.float32),
+            y=np.concatenate([v.grid, v.grid[::-1]]).astype(np.float32),
+            fill="toself", fillcolor=color, opacity=0.5, mode="lines",
+            line=dict(color=color, width=1.5), name=str(label), hoverinfo="name",
+        ))
+        fig.add_trace(box_trace(v._asdict(), str(label), color, x=[i], width=width / 12,
+                                fillcolor="rgba(255,255,255,0.25)", line_width=1))
+    fig.update_layout(showlegend=False, xaxis=dict(
+        tickmode="array", tickvals=list(range(len(violins))),
+        ticktext=[str(x) for x in violins[dim]] if len(violins) else []))
+    return fig
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  TIERED SCATTER
+#  ≤ SCATTERGL_MAX rows       → every point, WebGL markers
+#  ≤ RASTER_MIN rows          → stratified sample of ~SAMPLE_POINTS
+#  larger                     → server-side 2-D density raster
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+SCATTERGL_MAX = 20_000
+SAMPLE_POINTS = 10_000
+RASTER_MIN = 1_000_000
+RASTER_BINS = (160, 120)
+
+
+def scatter_tier(n):
+    if n <= SCATTERGL_MAX:
+        return "webgl"
+    return "sample" if n < RASTER_MIN else "raster"
+
+
+def _bin(values, bins):
+    lo, hi = float(values.min()), float(values.max())
+    scale = bins / (hi - lo) if hi > lo else 0.0
+    return np.minimum(((values - lo) * scale).astype(np.int64), bins - 1)
+
+
+def stratified_sample(x, y, group, target, bins=32, seed=0):
+    """Sorted indices of about ``target`` points.
+
+    Strata are (group, x-bin, y-bin) cells.  Each stratum keeps its
+    proportional share, but never less than one point, so sparse
+    regions — the outliers a uniform sample would drop — always show,
+    and so do the extremes of both axes.
+    """
+    n = len(x)
+    if n <= target:
+        return np.arange(n)
+    stratum = (group.astype(np.int64) * bins + _bin(x, bins)) * bins + _bin(y, bins)
+    order = np.lexsort((np.random.default_rng(seed).random(n), stratum))
+    sorted_strata = stratum[order]
+    starts = np.flatnonzero(np.r_[True, sorted_strata[1:] != sorted_strata[:-1]])
+    sizes = np.diff(np.r_[starts, n])
+    quota = np.maximum(1, sizes * target // n)
+    rank = np.arange(n) - np.repeat(starts, sizes)
+    extremes = [x.argmin(), x.argmax(), y.argmin(), y.argmax()]
+    return np.union1d(order[rank < np.repeat(quota, sizes)], extremes)
+
+
+def _point_traces(sub, x, y, color, size, hover, colors, opacity):
+    fig = go.Figure()
+    sizes = sub[size].to_numpy()
+    sizeref = 2.0 * sizes.max() / 20 ** 2 if len(sizes) and sizes.max() > 0 else 1
+    labels = sub[color].to_numpy()
+    hovertemplate = (f"{color}=%{{fullData.name}}<br>{x}=%{{x:,}}<br>{y}=%{{y:,}}<br>{size}=%{{marker.size}}"
+                     + "".join(f"<br>{h}=%{{customdata[{i}]}}" for i, h in enumerate(hover))
+                     + "<extra></extra>")
+    for i, label in enumerate(pd.unique(labels)):
+        part = sub[labels == label]
+        fig.add_trace(go.Scattergl(
+            x=part[x].to_numpy(), y=part[y].to_numpy(), mode="markers", name=str(label),
+            marker=dict(size=part[size].to_numpy(), sizemode="area", sizeref=sizeref,
+                        color=colors[i % len(colors)], opacity=opacity, line_width=0),
+            customdata=np.column_stack([part[h].astype(str).to_numpy() for h in hover]),
+            hovertemplate=hovertemplate,
+        ))
+    return fig
+
+
+def _raster(xv, yv, x, y, colors):
+    nx, ny = RASTER_BINS
+    ix, iy = _bin(xv, nx), _bin(yv, ny)
+    counts = np.bincount(iy * nx + ix, minlength=nx * ny).reshape(ny, nx).astype(np.float64)
+    x_edges = np.linspace(xv.min(), xv.max(), nx + 1)
+    y_edges = np.linspace(yv.min(), yv.max(), ny + 1)
+    z = np.where(counts > 0, np.log10(np.maximum(counts, 1)), np.nan)  # empty bins transparent
+    return go.Figure(go.Heatmap(
+        x=(x_edges[:-1] + x_edges[1:]) / 2, y=(y_edges[:-1] + y_edges[1:]) / 2,
+        z=z.astype(np.float32), customdata=counts.astype(np.int32),
+        colorscale=[[0, colors[0]], [1, colors[1 % len(colors)]]],
+        colorbar=dict(title="listings", tickprefix="10^"),
+        hovertemplate=f"{x}≈%{{x:,.0f}}<br>{y}≈%{{y:,.0f}}<br>listings=%{{customdata:,}}<extra></extra>",
+    ))
+
+
+def tiered_scatter(df, rows, colors, opacity=0.65, x="mileage", y="price", color="fuelType",
+                   size="engineSize", hover=("model", "year", "transmission"), seed=0):
+    """Price-vs-mileage style scatter whose rendering tier follows the
+    number of selected ``rows`` of ``df`` (see scatter_tier)."""
+    n = len(rows)
+    tier = scatter_tier(n)
+    if tier == "raster":
+        fig = _raster(df[x].to_numpy()[rows], df[y].to_numpy()[rows], x, y, colors)
+        note = f"density of {n:,} listings"
+    else:
+        if tier == "sample":
+            codes = df[color].array.codes[rows] if isinstance(df[color].dtype, pd.CategoricalDtype) \
+                else pd.factorize(df[color].to_numpy()[rows])[0]
+            rows = rows[stratified_sample(df[x].to_numpy()[rows], df[y].to_numpy()[rows],
+                                          codes, SAMPLE_POINTS, seed=seed)]
+        fig = _point_traces(df.take(rows), x, y, color, size, hover, colors, opacity)
+        note = f"stratified sample: {len(rows):,} of {n:,} listings" if tier == "sample" else None
+    if note:
+        fig.add_annotation(text=note, xref="paper", yref="paper", x=1, y=1.02, xanchor="right",
+                           yanchor="bottom", showarrow=False, font=dict(size=10), opacity=0.7)
+    return fig
+
+
+def box_figure(box, dim, colors, outliers=None):
+    """Box plot per ``dim`` group from Cube.box_stats, with an optional
+    capped list of outlier values per group (Cube.outliers) drawn as
+    markers — ``px.box(..., color=dim)`` at a few hundred bytes."""
+    fig = go.Figure()
+    for i, row in enumerate(box.to_dict("records")):
+        label, color = str(row[dim]), colors[i % len(colors)]
+        fig.add_trace(box_trace(row, label, color, x=[label]))
+        if outliers is not None and len(outliers[i]):
+            fig.add_trace(go.Scatter(
+                x=[label] * len(outliers[i]), y=outliers[i], mode="markers", name=label,
+                marker=dict(color=color, size=4, opacity=0.7), hoverinfo="y",
+            ))
+    fig.update_layout(showlegend=False)
+    return fig
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  PX-FREE BUILDERS
+#  Plotly Express spends 50–200 ms per call on bookkeeping for a
+#  handful of bars or sectors.  These draw the same traces straight
+#  from the cube's roll-ups, in a few milliseconds.
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+def category_bar(counts, name, colors, value="Count"):
+    """One bar per category of the value-counts Series ``counts``, each in
+    the next palette colour — ``px.bar(color=name, text_auto=True)``."""
+    return go.Figure(go.Bar(
+        x=counts.index.astype(str), y=counts.to_numpy(), texttemplate="%{y}",
+        marker=dict(color=[colors[i % len(colors)] for i in range(len(counts))]),
+        hovertemplate=f"{name}=%{{x}}<br>{value}=%{{y}}<extra></extra>",
+    ))
+
+
+def ranked_bar(values, name, value, texttemplate="%{x}"):
+    """Horizontal bars of the Series ``values`` coloured by size on the
+    layout's coloraxis — ``px.bar(orientation="h", color=value)``."""
+    return go.Figure(go.Bar(
+        x=values.to_numpy(), y=values.index.astype(str), orientation="h",
+        marker=dict(color=values.to_numpy(), coloraxis="coloraxis"), texttemplate=texttemplate,
+        hovertemplate=f"{name}=%{{y}}<br>{value}=%{{x}}<extra></extra>",
+    ))
+
+
+def donut(counts, name, hole, value="Count"):
+    """Pie of the value-counts Series ``counts``; colours come from the
+    layout's piecolorway — ``px.pie(names=name, values=value, hole=hole)``."""
+    return go.Figure(go.Pie(
+        labels=counts.index.astype(str), values=counts.to_numpy(), hole=hole,
+        hovertemplate=f"{name}=%{{label}}<br>{value}=%{{value}}<extra></extra>",
+    ))
+
+
+def heatmap(pivot, texttemplate="%{z:,.0f}"):
+    """Annotated heatmap of a pivot table on the layout's coloraxis —
+    ``px.imshow(pivot, text_auto=True)`` (which also reverses the y axis)."""
+    return go.Figure(go.Heatmap(
+        x=pivot.columns.to_numpy(), y=pivot.index.astype(str), z=pivot.to_numpy(),
+        coloraxis="coloraxis", texttemplate=texttemplate,
+        hovertemplate=f"{pivot.columns.name}: %{{x}}<br>{pivot.index.name}: %{{y}}"
+                      "<br>color: %{z}<extra></extra>",
+    ))
+
+
+def hierarchy(frame, path, values, color=None):
+    """ids / labels / parents / values of the sectors ``px.treemap`` and
+    ``px.sunburst`` draw for ``path``, leaves first.  With ``color`` each
+    sector also gets its ``values``-weighted mean of that column."""
+    frame = frame.assign(**{c: frame[c].astype(str) for c in path})
+    if color is not None:
+        frame = frame.assign(_weighted=frame[color] * frame[values])
+    parts = {"ids": [], "labels": [], "parents": [], "values": [], "colors": []}
+    for depth in range(len(path), 0, -1):
+        cols = list(path[:depth])
+        level = frame.groupby(cols, sort=False, observed=True)[
+            [values] + (["_weighted"] if color is not None else [])].sum().reset_index()
+        ids = level[cols[0]]
+        for c in cols[1:]:
+            ids = ids + "/" + level[c]
+        parents = ids.str.rsplit("/", n=1).str[0] if depth > 1 else pd.Series("", index=level.index)
+        parts["ids"] += ids.tolist()
+        parts["labels"] += level[cols[-1]].tolist()
+        parts["parents"] += parents.tolist()
+        parts["values"] += level[values].tolist()
+        if color is not None:
+            parts["colors"] += (level["_weighted"] / level[values]).tolist()
+    if color is None:
+        del parts["colors"]
+    return parts
+
+
+def bubble_figure(frame, x, y, size, color, colors, size_max=20, hover=()):
+    """One marker trace per ``color`` group, areas scaled to ``size`` —
+    ``px.scatter(x, y, size=size, color=color, size_max=size_max)``."""
+    fig = go.Figure()
+    sizes = frame[size].to_numpy()
+    sizeref = 2.0 * sizes.max() / size_max ** 2 if len(sizes) and sizes.max() > 0 else 1
+    for i, row in enumerate(frame.to_dict("records")):
+        fig.add_trace(go.Scatter(
+            x=[row[x]], y=[row[y]], mode="markers", name=str(row[color]), legendgroup=str(row[color]),
+            marker=dict(color=colors[i % len(colors)], size=[row[size]], sizemode="area", sizeref=sizeref),
+            customdata=[[row[h] for h in hover]],
+            hovertemplate=f"{color}={row[color]}<br>{x}=%{{x}}<br>{y}=%{{y}}<br>{size}=%{{marker.size}}"
+                          + "".join(f"<br>{h}=%{{customdata[{j}]}}" for j, h in enumerate(hover))
+                          + "<extra></extra>",
+        ))
+    return fig
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  SKELETONS
+#  A chart's template, theme, axes and legend do not change with the
+#  filters — only its traces and a few data-driven layout entries
+#  (histogram range, violin ticks, scatter note) do.  The apps keep
+#  each chart's styled layout as a skeleton and, on a filter change,
+#  only build the traces.  The Dash app ships just those, as a
+#  dash.Patch; the Streamlit apps swap them into the session's skeleton
+#  figure, which spares building and validating the layout again — but
+#  st.plotly_chart has no partial update, so the whole spec is still
+#  sent on every rerun.
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+# layout entries, as "parent.child" paths, that the builders above set from the data
+FOLLOWS = {
+    binned_histogram: ("xaxis.range",),
+    violin_figure: ("xaxis.tickvals", "xaxis.ticktext"),
+    tiered_scatter: ("annotations",),
+}
+
+
+def layout_value(layout, path):
+    """The entry at ``path`` ("xaxis.range") of a layout dict, or None."""
+    for key in path.split("."):
+        if not isinstance(layout, dict) or key not in layout:
+            return None
+        layout = layout[key]
+    return layout
+
+
+def swap_traces(skeleton, fig, follow=()):
+    """Replace the traces of the ``skeleton`` figure with those of ``fig``,
+    copying the layout entries named in ``follow``; returns ``skeleton``."""
+    layout = fig.layout.to_plotly_json()
+    with skeleton.batch_update():
+        skeleton.data = ()
+        skeleton.add_traces(fig.data)
+        for path in follow:
+            skeleton.layout[path] = layout_value(layout, path)
+    return skeleton
@@ -0,0 +1,73 @@
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  BMW Used Car Intelligence — latest-wins request coalescing
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  A dragged slider sends one request per position, and the page keeps
+#  only the answer to the last one.  The coalescer admits the work of a
+#  (page, region) key one request at a time and lets at most ``slots``
+#  requests compute at once; a request still waiting when a newer one
+#  for its key arrives is dropped instead of computed.
+import itertools
+import threading
+from contextlib import contextmanager
+
+
+class Superseded(Exception):
+    """A newer request for the same page region arrived while this one waited."""
+
+
+class Coalescer:
+    def __init__(self, slots, enabled=True):
+        self.enabled = enabled
+        self._slots = threading.BoundedSemaphore(slots)
+        self._lock = threading.Lock()
+        self._tickets = itertools.count(1)
+        self._latest = {}   # key → newest ticket
+        self._turns = {}    # key → lock serialising that key's requests
+        self.admitted = 0
+        self.dropped = 0
+        self.inflight = 0   # requests queued or computing
+
+    def busy(self):
+        return self.inflight > 0
+
+    @contextmanager
+    def admit(self, key):
+        """Run the body for ``key`` unless it is superseded first (raises Superseded)."""
+        with self._lock:
+            self.inflight += 1
+        try:
+            with self._admit(key):
+                yield
+        finally:
+            with self._lock:
+                self.inflight -= 1
+
+    @contextmanager
+    def _admit(self, key):
+        if not self.enabled or key is None:
+            with self._slots:
+                yield
+            return
+        with self._lock:
+            ticket = self._latest[key] = next(self._tickets)
+            turn = self._turns.setdefault(key, threading.Lock())
+        with turn, self._slots:
+            with self._lock:
+                # waiters are not woken in order: a newer request may
+                # already have run and forgotten the key
+                if self._latest.get(key) != ticket:
+                    self.dropped += 1
+                    raise Superseded(key)
+                self.admitted += 1
+            try:
+                yield
+            finally:
+                with self._lock:
+                    if self._latest.get(key) == ticket:
+                        # nothing newer queued: forget the key
+                        del self._latest[key], self._turns[key]
+
+    def stats(self):
+        with self._lock:
+            return {"admitted": self.admitted, "dropped": self.dropped,
+                    "active_keys": len(self._latest), "inflight": self.inflight}
@@ -0,0 +1,294 @@
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  BMW Used Car Intelligence — pre-aggregated cube
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  Every listing falls in one cell of
+#      year × fuelType × transmission × model × engineSize × price bucket
+#  and each cell stores count, sum and sum of squares of the measures.
+#  KPI means and grouped charts roll the cells up instead of scanning
+#  rows, so their cost follows the number of cells, not of listings.
+#  Order statistics come from per-cell quantile sketches (bmw_sketch).
+import numpy as np
+import pandas as pd
+
+from bmw_agg import TABS, as_grouping, fuse
+from bmw_sketch import (CellHistogram, CellSketch, binned_kde, coarsen, exact_quantiles,
+                        quantile_frame, sketch_quantiles)
+
+DIMENSIONS = ["year", "fuelType", "transmission", "model", "engineSize"]
+MEASURES = ["price", "mileage", "mpg", "tax", "engineSize"]
+SKETCHED = ["price", "mileage", "mpg", "tax"]
+# Per-cell histograms and roughly how many bins each gets: mileage is
+# drawn as ~40 bars, price is the fine grid behind the violin KDE.
+HISTOGRAMS = {"mileage": 40, "price": 400}
+
+VIOLIN_POINTS = 120
+OUTLIER_CAP = 50
+
+# Matches the step of the price sliders, which start at the minimum price.
+PRICE_STEP = 500
+
+# Selections up to this many rows get exact quantiles from their rows
+# (a partition of at most this many values is well under a millisecond
+# or two); larger ones merge the cells' sketches.
+EXACT_ROWS = 50_000
+
+
+class Cube:
+    """Count / sum / sum-of-squares per cell, built once per dataset.
+
+    Price buckets alternate between grid points and the open gaps
+    between them — bucket 2k holds ``origin + k·step`` exactly, bucket
+    2k+1 holds everything strictly inside the next step — so the
+    inclusive ranges the sliders produce are exact unions of buckets.
+    """
+
+    def __init__(self, df, price_step=PRICE_STEP):
+        self.df = df
+        self.n = len(df)
+        self.labels, self.row_codes = {}, {}
+        for dim in DIMENSIONS:
+            s = df[dim]
+            if isinstance(s.dtype, pd.CategoricalDtype):
+                labels, codes = s.cat.categories.to_numpy(), s.array.codes
+            else:
+                labels, codes = np.unique(s.to_numpy(), return_inverse=True)
+            self.labels[dim] = labels
+            self.row_codes[dim] = codes.astype(np.int32, copy=False)
+
+        price = df["price"].to_numpy()
+        self.price_step = price_step
+        self.price_origin = int(price.min()) if self.n else 0
+        self.price_max = int(price.max()) if self.n else 0
+        self.row_codes["price_bucket"] = self._bucket(price)
+
+        # cell id per row: mixed-radix key over every dimension code
+        key, radix = np.zeros(self.n, dtype=np.int64), 1
+        self._radix = {}
+        for dim in DIMENSIONS + ["price_bucket"]:
+            size = (int(self.row_codes[dim].max()) + 1) if self.n else 1
+            self._radix[dim] = (radix, size)
+            key += self.row_codes[dim].astype(np.int64) * radix
+            radix *= size
+        cell_key, cell_of_row = np.unique(key, return_inverse=True)
+
+        self.cell_codes = {dim: (cell_key // r) % size for dim, (r, size) in self._radix.items()}
+        self.cell_count = np.bincount(cell_of_row, minlength=len(cell_key))
+        self.cell_sum, self.cell_sumsq = {}, {}
+        for m in MEASURES:
+            v = df[m].to_numpy().astype(np.float64)
+            self.cell_sum[m] = np.bincount(cell_of_row, weights=v, minlength=len(cell_key))
+            self.cell_sumsq[m] = np.bincount(cell_of_row, weights=v * v, minlength=len(cell_key))
+        self.sketches = {m: CellSketch(df[m].to_numpy(), cell_of_row, len(cell_key))
+                         for m in SKETCHED}
+        self.histograms = {m: CellHistogram(df[m].to_numpy(), cell_of_row, len(cell_key), bins)
+                           for m, bins in HISTOGRAMS.items()}
+
+    @property
+    def n_cells(self):
+        return len(self.cell_count)
+
+    def _bucket(self, price):
+        d = price.astype(np.int64) - self.price_origin
+        return (2 * (d // self.price_step) + (d % self.price_step != 0)).astype(np.int32)
+
+    # ── filter → cells ───────────────────────────
+    def _price_buckets(self, lo, hi):
+        """Inclusive bucket span for [lo, hi], or None if it cuts a bucket."""
+        def on_grid(v):
+            return (v - self.price_origin) % self.price_step == 0
+        b_lo = None if lo <= self.price_origin else (
+            int(self._bucket(np.array([lo]))[0]) if on_grid(lo) else False)
+        b_hi = None if hi >= self.price_max else (
+            int(self._bucket(np.array([hi]))[0]) if on_grid(hi) else False)
+        if b_lo is False or b_hi is False:
+            return None
+        return b_lo, b_hi
+
+    def exact(self, state):
+        """True when ``state`` can be answered from the cells alone."""
+        return self._price_buckets(*state.price) is not None
+
+    def _codes_in(self, dim, values):
+        codes = pd.Index(self.labels[dim]).get_indexer(list(values))
+        return codes[codes >= 0]
+
+    def cell_mask(self, state):
+        """Boolean mask over cells for a FilterState, or None if not exact."""
+        buckets = self._price_buckets(*state.price)
+        if buckets is None:
+            return None
+        years = self.labels["year"][self.cell_codes["year"]]
+        mask = (years >= state.year[0]) & (years <= state.year[1])
+        b_lo, b_hi = buckets
+        if b_lo is not None:
+            mask &= self.cell_codes["price_bucket"] >= b_lo
+        if b_hi is not None:
+            mask &= self.cell_codes["price_bucket"] <= b_hi
+        for dim in ("fuelType", "transmission", "model"):
+            values = getattr(state, dim)
+            if values is not None:
+                mask &= np.isin(self.cell_codes[dim], self._codes_in(dim, values))
+        return mask
+
+    # ── roll-up ──────────────────────────────────
+    def aggregate(self, state, groupings, rows=None, measures=MEASURES):
+        """Every grouping in ``groupings`` for the selection of ``state``.
+
+        The matching cells are picked once and fused into all groupings
+        (see bmw_agg).  When the price range does not fall on bucket
+        edges the cube cannot answer exactly; pass the selection's
+        ``rows`` and the same aggregation runs over them instead.
+        """
+        mask = self.cell_mask(state)
+        if mask is None:
+            if rows is None:
+                raise ValueError("price range is off the cube's bucket grid; pass rows=")
+            return self.aggregate_rows(rows, groupings, measures)
+        dims = {dim for g in groupings for dim in as_grouping(g)}
+        return fuse(self.labels, {dim: self.cell_codes[dim][mask] for dim in dims},
+                    self.cell_count[mask],
+                    {m: self.cell_sum[m][mask] for m in measures},
+                    {m: self.cell_sumsq[m][mask] for m in measures}, groupings)
+
+    def aggregate_rows(self, rows, groupings, measures=MEASURES):
+        """Same as ``aggregate`` but over listing ids, one sweep of the rows."""
+        dims = {dim for g in groupings for dim in as_grouping(g)}
+        values = {m: self.df[m].to_numpy()[rows].astype(np.float64) for m in measures}
+        return fuse(self.labels, {dim: self.row_codes[dim][rows] for dim in dims},
+                    len(rows), values, {m: v * v for m, v in values.items()}, groupings)
+
+    def tab(self, state, name, rows=None):
+        """Everything dashboard tab ``name`` draws, in one fused pass (bmw_agg.TABS)."""
+        spec = TABS[name]
+        return self.aggregate(state, spec["groupings"], rows, spec["measures"])
+
+    def rollup(self, state, by=(), rows=None):
+        """One grouping of the selection: ``count`` plus ``<measure>_mean``
+        and ``<measure>_std`` per non-empty group, sorted by the keys."""
+        return self.aggregate(state, [by], rows)[by]
+
+    def counts(self, state, dim, rows=None):
+        """Rows per ``dim`` value, largest first — a drop-in for value_counts."""
+        return self.aggregate(state, [dim], rows, measures=()).counts(dim)
+
+    def means(self, state, rows=None):
+        """Overall count and mean of every measure (NaN means for an empty selection)."""
+        return self.aggregate(state, [()], rows).means()
+
+    # ── order statistics ─────────────────────────
+    def _group_ids(self, codes, by):
+        key, radix = np.zeros(len(next(iter(codes.values()))) if codes else 0, dtype=np.int64), 1
+        for dim in reversed(by):
+            key += codes[dim].astype(np.int64) * radix
+            radix *= len(self.labels[dim])
+        return key
+
+    def quantiles(self, state, measure, qs=(0.25, 0.5, 0.75), by=(), rows=None, exact=None):
+        """Quantiles ``qs`` of ``measure`` per ``by`` group (one column per q).
+
+        With ``exact=None`` a selection of at most EXACT_ROWS rows — or
+        one the cube cannot answer — is computed exactly from ``rows``;
+        otherwise the cells' sketches are merged, within about 1% of the
+        exact order statistics (see bmw_sketch for the bound).
+        """
+        by, qs = as_grouping(by), list(qs)
+        n_groups = int(np.prod([len(self.labels[dim]) for dim in by]))
+        mask = self.cell_mask(state)
+        if exact is None:
+            exact = rows is not None and (mask is None or len(rows) <= EXACT_ROWS)
+        if exact:
+            if rows is None:
+                raise ValueError("exact quantiles need the selection's rows=")
+            group = self._group_ids({dim: self.row_codes[dim][rows] for dim in by}, by) if by else None
+            counts = np.bincount(group, minlength=n_groups) if by else np.array([len(rows)])
+            values = exact_quantiles(self.df[measure].to_numpy()[rows], group, n_groups, qs)
+        else:
+            if mask is None:
+                raise ValueError("price range is off the cube's bucket grid; pass rows=")
+            group = self._group_ids({dim: self.cell_codes[dim] for dim in by}, by) if by else None
+            count, total = self.sketches[measure].histograms(mask, group, n_groups)
+            counts, values = count.sum(axis=1), sketch_quantiles(count, total, qs)
+
+        codes, rest = [], np.arange(n_groups)
+        for dim in reversed(by):
+            codes.insert(0, rest % len(self.labels[dim]))
+            rest = rest // len(self.labels[dim])
+        return quantile_frame(self.labels, by, codes, counts, values, qs)
+
+    def median(self, state, measure, rows=None):
+        """Median of ``measure`` over the selection (NaN when it is empty)."""
+        q = self.quantiles(state, measure, [0.5], rows=rows)
+        return float(q[0.5].iat[0]) if len(q) else float("nan")
+
+    def box_stats(self, state, measure, by=(), rows=None):
+        """Box-plot summary per group: quartiles, median and Tukey fences
+        (1.5 × IQR, clipped to the data range) — what go.Box needs."""
+        by = as_grouping(by)
+        q = self.quantiles(state, measure, (0, 0.25, 0.5, 0.75, 1), by, rows)
+        iqr = q[0.75] - q[0.25]
+        return q[list(by) + ["count"]].assign(
+            lowerfence=np.maximum(q[0], q[0.25] - 1.5 * iqr), q1=q[0.25], median=q[0.5],
+            q3=q[0.75], upperfence=np.minimum(q[1], q[0.75] + 1.5 * iqr), min=q[0], max=q[1])
+
+    def outliers(self, measure, box, by, rows, cap=OUTLIER_CAP, seed=0):
+        """Up to ``cap`` listings per box_stats group lying outside its
+        fences — always the two most extreme, the rest sampled."""
+        by = as_grouping(by)
+        values = self.df[measure].to_numpy()[rows]
+        group = self._group_ids({dim: self.row_codes[dim][rows] for dim in by}, by)
+        ids = self._group_ids({dim: pd.Index(self.labels[dim]).get_indexer(box[dim]) for dim in by}, by)
+        rng = np.random.default_rng(seed)
+        out = []
+        for gid, lo, hi in zip(ids, box["lowerfence"], box["upperfence"]):
+            v = values[(group == gid) & ((values < lo) | (values > hi))]
+            if len(v) > cap:
+                ends = [v.argmin(), v.argmax()]
+                rest = rng.choice(np.setdiff1d(np.arange(len(v)), ends), cap - 2, replace=False)
+                v = v[np.r_[ends, rest]]
+            out.append(v)
+        return out
+
+    # ── histograms ───────────────────────────────
+    def histogram(self, state, measure, rows=None, by=(), bins=None):
+        """``(edges, counts)`` of ``measure`` on its global bins (exact).
+
+        With ``by``, ``counts`` has one row per group code combination,
+        empty groups included, in the order of the group keys.  ``bins``
+        asks for about that many bins, merged from the global ones.
+        """
+        by = as_grouping(by)
+        hist = self.histograms[measure]
+        n_groups = int(np.prod([len(self.labels[dim]) for dim in by]))
+        mask = self.cell_mask(state)
+        if mask is not None:
+            group = self._group_ids({dim: self.cell_codes[dim] for dim in by}, by) if by else None
+            counts = hist.counts(mask, group, n_groups)
+        elif rows is not None:
+            group = self._group_ids({dim: self.row_codes[dim][rows] for dim in by}, by) if by else None
+            counts = hist.row_counts(self.df[measure].to_numpy()[rows], group, n_groups)
+        else:
+            raise ValueError("price range is off the cube's bucket grid; pass rows=")
+        edges = hist.edges
+        if bins is not None:
+            edges, counts = coarsen(edges, counts, bins)
+        return edges, counts if by else counts[0]
+
+    def violins(self, state, measure, by, rows=None, points=VIOLIN_POINTS):
+        """Violin shapes per ``by`` group: box_stats plus ``grid`` / ``density``
+        arrays of a Gaussian KDE over the group's binned counts.
+
+        Bandwidth follows Silverman's rule, as Plotly's violins do, and
+        the grid spans the data range ± 2 bandwidths ("soft" span).
+        """
+        box = self.box_stats(state, measure, by, rows)
+        edges, counts = self.histogram(state, measure, rows, by)
+        counts = counts[counts.sum(axis=1) > 0]
+        std = self.rollup(state, by, rows)[f"{measure}_std"].fillna(0).to_numpy()
+        grids, densities = [], []
+        for i, row in enumerate(box.itertuples(index=False)):
+            spread = min(std[i], (row.q3 - row.q1) / 1.349) or std[i]
+            bw = 1.059 * spread * row.count ** -0.2 if spread > 0 else edges[1] - edges[0]
+            grid = np.linspace(row.min - 2 * bw, row.max + 2 * bw, points)
+            grids.append(grid)
+            densities.append(binned_kde(edges, counts[i], bw, grid))
+        return box.assign(grid=grids, density=densities)
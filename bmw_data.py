@@ -0,0 +1,247 @@
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  BMW Used Car Intelligence — shared dataset loader
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+# BMW_CSV points every entry point at another copy of the dataset
+# (e.g. a large synthetic one when measuring).
+CSV_PATH = os.environ.get(
+    "BMW_CSV", os.path.join(os.path.dirname(os.path.abspath(__file__)), "bmw.csv"))
+
+# ── Schema ────────────────────────────────────────────────────
+# String columns are low-cardinality, so they are held as categoricals
+# (integer codes + one dictionary).  Numeric widths are sized for the
+# value ranges of used-car listings, not for the 64-bit parser default.
+CATEGORICAL_COLUMNS = ["model", "transmission", "fuelType"]
+NUMERIC_DTYPES = {
+    "year":       "int16",
+    "price":      "int32",
+    "mileage":    "int32",
+    "tax":        "int16",
+    "mpg":        "float32",
+    "engineSize": "float32",
+}
+COLUMNS = ["model", "year", "price", "transmission", "mileage",
+           "fuelType", "tax", "mpg", "engineSize"]
+
+# Bump whenever the cleaning steps or dtypes above change, so existing
+# sidecars are rebuilt rather than served with a stale layout.
+SCHEMA_VERSION = 1
+
+
+def _strip_categories(s):
+    """Trim whitespace from category labels (the raw feed has ' 5 Series')."""
+    stripped = s.cat.categories.str.strip()
+    if stripped.is_unique:
+        return s.cat.rename_categories(stripped)
+    # " X1" and "X1" both present — merge them into one category
+    return s.astype(str).str.strip().astype("category")
+
+
+def parse_csv(path=CSV_PATH):
+    """Read and clean the raw CSV — the slow path behind the sidecar."""
+    df = pd.read_csv(path, usecols=COLUMNS,
+                     dtype={c: "category" for c in CATEGORICAL_COLUMNS})
+    df = df.dropna()
+    df["model"] = _strip_categories(df["model"])
+    df = df.drop_duplicates()
+    df = df.astype(NUMERIC_DTYPES)
+    return df.reset_index(drop=True)[COLUMNS]
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  COLUMNAR SIDECAR
+#  bmw.csv.cols/
+#  ├── manifest.json        → source size / mtime / sha256 + live version
+#  └── <version>/           → one .npy per column + meta.json (categories)
+#  Version directories are written once and never modified; a rebuild
+#  writes a new one and flips the manifest, so readers never see a
+#  half-written set of columns.  Temporaries a crashed writer left
+#  behind (.tmp-* directories, *.tmp files) are swept once they are
+#  older than TMP_MAX_AGE — younger ones may belong to a live writer.
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+TMP_MAX_AGE = 300.0  # seconds
+
+
+def sidecar_dir(path=CSV_PATH):
+    return path + ".cols"
+
+
+def _is_tmp(name):
+    return name.startswith(".tmp-") or name.endswith(".tmp")
+
+
+def _sweep_tmp(root, max_age=TMP_MAX_AGE):
+    """Remove temporaries in ``root`` older than ``max_age`` seconds."""
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return
+    cutoff = time.time() - max_age
+    for name in filter(_is_tmp, names):
+        p = os.path.join(root, name)
+        try:
+            if os.lstat(p).st_mtime >= cutoff:
+                continue
+            if os.path.isdir(p):
+                shutil.rmtree(p, ignore_errors=True)
+            else:
+                os.remove(p)
+        except OSError:
+            pass  # gone already, or not ours to remove
+
+
+def _file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _write_json(path, obj):
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(obj, f)
+    os.replace(tmp, path)
+
+
+def _read_manifest(path):
+    try:
+        with open(os.path.join(sidecar_dir(path), "manifest.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _sidecar_version(path):
+    """Return the live version directory if it still matches the CSV, else None."""
+    manifest = _read_manifest(path)
+    if not manifest or manifest.get("schema") != SCHEMA_VERSION:
+        return None
+    st = os.stat(path)
+    if st.st_size != manifest["size"]:
+        return None
+    if st.st_mtime_ns != manifest["mtime_ns"]:
+        # touched but maybe not edited — the content hash decides
+        if _file_sha256(path) != manifest["sha256"]:
+            return None
+        manifest["mtime_ns"] = st.st_mtime_ns
+        try:
+            _write_json(os.path.join(sidecar_dir(path), "manifest.json"), manifest)
+        except OSError:
+            pass
+    version_dir = os.path.join(sidecar_dir(path), manifest["version"])
+    return version_dir if os.path.isdir(version_dir) else None
+
+
+def write_sidecar(path, df, st=None, sha256=None):
+    """Persist a cleaned frame as per-column .npy files next to the CSV."""
+    st = st or os.stat(path)
+    sha256 = sha256 or _file_sha256(path)
+    root = sidecar_dir(path)
+    version = f"v{SCHEMA_VERSION}-{sha256[:16]}"
+    final = os.path.join(root, version)
+    os.makedirs(root, exist_ok=True)
+
+    if not os.path.isdir(final):
+        tmp = os.path.join(root, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp)
+        meta = {"rows": len(df), "categories": {}}
+        for c in COLUMNS:
+            if c in CATEGORICAL_COLUMNS:
+                np.save(os.path.join(tmp, f"{c}.npy"), df[c].cat.codes.to_numpy())
+                meta["categories"][c] = df[c].cat.categories.tolist()
+            else:
+                np.save(os.path.join(tmp, f"{c}.npy"), df[c].to_numpy())
+        _write_json(os.path.join(tmp, "meta.json"), meta)
+        try:
+            os.replace(tmp, final)
+        except OSError:
+            # another process published the same version first
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    _write_json(os.path.join(root, "manifest.json"), {
+        "schema": SCHEMA_VERSION, "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns, "sha256": sha256, "version": version,
+    })
+    for name in os.listdir(root):
+        if name not in (version, "manifest.json") and not _is_tmp(name) and not name.startswith("."):
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    _sweep_tmp(root)
+    return final
+
+
+def read_sidecar(version_dir, mmap=True):
+    """Open a sidecar version as a DataFrame.
+
+    With ``mmap`` the columns are read-only memory maps of the .npy files
+    and the frame is built around them without copying, so every process
+    that opens the same version shares one copy in the page cache.
+    ``df.attrs["version"]`` names the version, for keying derived results.
+    """
+    _sweep_tmp(os.path.dirname(version_dir))
+    with open(os.path.join(version_dir, "meta.json")) as f:
+        meta = json.load(f)
+    data = {}
+    for c in COLUMNS:
+        arr = np.load(os.path.join(version_dir, f"{c}.npy"),
+                      mmap_mode="r" if mmap else None).view(np.ndarray)
+        if c in CATEGORICAL_COLUMNS:
+            arr = pd.Categorical.from_codes(arr, meta["categories"][c])
+        data[c] = pd.Series(arr, name=c, copy=False)
+    df = pd.DataFrame(data, columns=COLUMNS, copy=False)
+    df.attrs["version"] = os.path.basename(version_dir)
+    return df
+
+
+def load_bmw(path=CSV_PATH, use_sidecar=True, mmap=True):
+    """Load the cleaned, compactly typed dataset.
+
+    The first call parses the CSV and writes the columnar sidecar; later
+    calls (and other processes) read the sidecar until the CSV changes.
+    By default the frame is backed by read-only memory maps — treat it as
+    immutable and derive filtered copies from it.
+    """
+    if not use_sidecar:
+        return parse_csv(path)
+    version_dir = _sidecar_version(path)
+    if version_dir is not None:
+        try:
+            return read_sidecar(version_dir, mmap)
+        except (OSError, ValueError, KeyError):
+            pass  # damaged or swept away mid-read — rebuild below
+    st, sha256 = os.stat(path), _file_sha256(path)
+    df = parse_csv(path)
+    df.attrs["version"] = f"v{SCHEMA_VERSION}-{sha256[:16]}"
+    try:
+        version_dir = write_sidecar(path, df, st, sha256)
+    except OSError:
+        return df  # read-only checkout: still serve the parsed frame
+    # reopen what was just written so this process maps the shared copy too
+    return read_sidecar(version_dir, mmap) if mmap else df
+
+
+def counts(s):
+    """`value_counts` without the zero rows categoricals keep for unused labels."""
+    vc = s.value_counts()
+    return vc[vc > 0]
+
+
+def kpi_text(value, spec, prefix="", suffix=""):
+    """A KPI figure formatted with ``spec`` — "—" for the NaN of an empty selection."""
+    return "—" if pd.isna(value) else f"{prefix}{value:{spec}}{suffix}"
+
+
+def for_display(df):
+    """Widen float32 columns back to 1 dp float64 so tables show 57.6, not 57.599998."""
+    floats = [c for c in df.columns if df[c].dtype == "float32"]
+    return df.astype({c: "float64" for c in floats}).round({c: 1 for c in floats})
@@ -0,0 +1,122 @@
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  BMW Used Car Intelligence — filtered-data export
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  Exports are written from a row selection in chunks of CHUNK_ROWS,
+#  so only one chunk's frame (and, for CSV, its text) is alive at a
+#  time, into a temporary file rather than memory.  The apps build a
+#  file only when its download is clicked and hand an open reader of it
+#  to st.download_button: the one whole copy is what Streamlit serves.
+#  ExportCache keeps the finished files per (filter state, format), on
+#  disk, deleting the least recently downloaded past its byte budget.
+#
+#      csv      text, opens anywhere; slowest to write, largest
+#      parquet  columnar + compressed; smallest download
+#      arrow    Arrow IPC file; fastest to write, zero-copy to read
+import atexit
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+CHUNK_ROWS = 100_000
+
+# format → (label, file extension, MIME type)
+FORMATS = {
+    "csv":     ("CSV", ".csv", "text/csv"),
+    "parquet": ("Parquet", ".parquet", "application/vnd.apache.parquet"),
+    "arrow":   ("Arrow IPC", ".arrow", "application/vnd.apache.arrow.file"),
+}
+
+
+def chunks(df, rows, size=CHUNK_ROWS):
+    """Frames of the selected ``rows`` of ``df``, ``size`` rows at a time."""
+    for start in range(0, max(len(rows), 1), size):
+        yield df.take(rows[start:start + size])
+
+
+def write(df, rows, fmt, out):
+    """Write the selected ``rows`` of ``df`` to the binary stream ``out``."""
+    if fmt == "csv":
+        for i, part in enumerate(chunks(df, rows)):
+            out.write(part.to_csv(index=False, header=i == 0).encode("utf-8"))
+        return
+    writer = None
+    for part in chunks(df, rows):
+        table = pa.Table.from_pandas(part, preserve_index=False)
+        if writer is None:
+            writer = (pq.ParquetWriter(out, table.schema, compression="zstd") if fmt == "parquet"
+                      else pa.ipc.new_file(out, table.schema))
+        writer.write_table(table)
+    writer.close()
+
+
+def write_file(df, rows, fmt):
+    """Write the export to a new temporary file (0600); its path and size."""
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format {fmt!r}; expected one of {list(FORMATS)}")
+    fd, path = tempfile.mkstemp(prefix="bmw-export-", suffix=FORMATS[fmt][1])
+    try:
+        with os.fdopen(fd, "wb") as out:
+            write(df, rows, fmt, out)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return path, os.path.getsize(path)
+
+
+class ExportCache:
+    """Export files on disk per (key, format), LRU-bounded by total bytes.
+
+    ``open`` hands out a reader of its own per download; deleting an
+    evicted file doesn't disturb a reader that still has it open.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._files = OrderedDict()   # (key, fmt) → (path, size)
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        atexit.register(self.clear)
+
+    def open(self, key, df, rows, fmt):
+        """A reader of the export of ``rows`` for ``key`` in ``fmt``,
+        written on the first request for it."""
+        with self._lock:
+            entry = self._files.get((key, fmt))
+            if entry is not None:
+                self._files.move_to_end((key, fmt))
+                self.hits += 1
+                return open(entry[0], "rb")
+            self.misses += 1
+        path, size = write_file(df, rows, fmt)
+        with self._lock:
+            self._drop((key, fmt))   # a concurrent miss that finished first
+            self._files[(key, fmt)] = (path, size)
+            self.nbytes += size
+            while self.nbytes > self.max_bytes and len(self._files) > 1:
+                self._drop(next(iter(self._files)))
+            return open(path, "rb")
+
+    def _drop(self, entry):
+        path, size = self._files.pop(entry, (None, 0))
+        self.nbytes -= size
+        if path is not None:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def clear(self):
+        with self._lock:
+            while self._files:
+                self._drop(next(iter(self._files)))
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._files), "bytes": self.nbytes,
+                    "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,199 @@
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  BMW Used Car Intelligence — filter indexes
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  A filter state resolves to a packed bitmap (one bit per row).  The
+#  categorical sidebar filters are answered from prebuilt per-value
+#  bitsets: OR within a column, AND across columns.  The numeric range
+#  filters binary-search a sorted permutation of their column.  Counts
+#  come from popcounts and the KPI means from masked reductions.
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+BITMAP_COLUMNS = ["fuelType", "transmission", "model", "engineSize"]
+RANGE_COLUMNS = ["year", "price", "mileage"]
+
+if hasattr(np, "bitwise_count"):
+    def _popcounts(bits):
+        """Set bits per row of a (k, nbytes) bitmap stack."""
+        return np.bitwise_count(bits.view(np.uint64)).sum(axis=-1, dtype=np.int64)
+else:  # numpy < 2.0
+    _POP8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcounts(bits):
+        return _POP8[bits].sum(axis=-1, dtype=np.int64)
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  FILTER STATE
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+class FilterState(NamedTuple):
+    """Normalised, hashable sidebar selection.
+
+    Ranges are inclusive ``(lo, hi)`` pairs.  For the value filters,
+    ``None`` means "no constraint" and an empty tuple matches nothing.
+    """
+    year: tuple
+    price: tuple
+    fuelType: tuple = None
+    transmission: tuple = None
+    model: tuple = None
+
+    @classmethod
+    def make(cls, year, price, fuelType=None, transmission=None, model=None):
+        def values(v):
+            return None if v is None else tuple(sorted(v))
+        return cls(tuple(int(x) for x in year), tuple(int(x) for x in price),
+                   values(fuelType), values(transmission), values(model))
+
+
+class Selection(NamedTuple):
+    """A resolved filter: packed bitmap, sorted row ids and row count."""
+    bits: np.ndarray
+    rows: np.ndarray
+    count: int
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  BITMAP INDEX
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+class BitmapIndex:
+    """One packed bitset per distinct value of a column."""
+
+    def __init__(self, series, nbytes):
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            labels, codes = series.cat.categories, series.array.codes
+        else:
+            labels, codes = np.unique(series.to_numpy(), return_inverse=True)
+        self.labels = pd.Index(labels)
+        self.bitmaps = np.zeros((len(self.labels), nbytes), dtype=np.uint8)
+        for k in range(len(self.labels)):
+            packed = np.packbits(codes == k)
+            self.bitmaps[k, :len(packed)] = packed
+
+    def select(self, values):
+        """OR together the bitsets of ``values`` (unknown labels match nothing)."""
+        rows = self.labels.get_indexer(list(values))
+        rows = rows[rows >= 0]
+        if not len(rows):
+            return np.zeros(self.bitmaps.shape[1], dtype=np.uint8)
+        return np.bitwise_or.reduce(self.bitmaps[rows], axis=0)
+
+    def counts(self, bits):
+        """Rows per label inside ``bits`` — a popcount per bitset, zeros dropped."""
+        vc = pd.Series(_popcounts(self.bitmaps & bits), index=self.labels, name="count")
+        return vc[vc > 0].sort_values(ascending=False, kind="stable")
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  SORTED RANGE INDEX
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+class SortedIndex:
+    """Sorted permutation of a numeric column for O(log n + k) range lookups."""
+
+    def __init__(self, values):
+        order = np.argsort(values, kind="stable")
+        self.order = order.astype(np.int32) if len(values) < 2**31 else order
+        self.sorted = values[self.order]
+
+    def _key(self, v):
+        # search with the column's own dtype — a Python int would make
+        # numpy upcast (copy) the whole sorted array on every lookup
+        dtype = self.sorted.dtype
+        if dtype.kind in "iu":
+            info = np.iinfo(dtype)
+            v = min(max(v, info.min), info.max)
+        return dtype.type(v)
+
+    def span(self, lo, hi):
+        """Positions in ``order`` of the rows with ``lo <= value <= hi``."""
+        return (int(np.searchsorted(self.sorted, self._key(lo), side="left")),
+                int(np.searchsorted(self.sorted, self._key(hi), side="right")))
+
+    def rows(self, lo, hi):
+        a, b = self.span(lo, hi)
+        return self.order[a:b]
+
+
+class DatasetIndex:
+    """All filter indexes for one (read-only) dataset frame."""
+
+    def __init__(self, df):
+        self.df = df
+        self.n = len(df)
+        # whole 64-bit words, so popcounts can run on uint64 views
+        self.nbytes = -(-self.n // 64) * 8
+        self.bitmaps = {c: BitmapIndex(df[c], self.nbytes) for c in BITMAP_COLUMNS}
+        self.ranges = {c: SortedIndex(df[c].to_numpy()) for c in RANGE_COLUMNS}
+        self.all_bits = self.pack(np.ones(self.n, dtype=bool))
+
+    # ── bitmap plumbing ──────────────────────────
+    def pack(self, mask):
+        bits = np.zeros(self.nbytes, dtype=np.uint8)
+        packed = np.packbits(mask)
+        bits[:len(packed)] = packed
+        return bits
+
+    def mask(self, bits):
+        return np.unpackbits(bits, count=self.n).view(bool)
+
+    def rows(self, bits):
+        return np.flatnonzero(self.mask(bits))
+
+    def count(self, bits):
+        return int(_popcounts(bits))
+
+    def range_bits(self, col, lo, hi):
+        """Bitmap of ``lo <= col <= hi``.
+
+        Selective ranges scatter their k row ids; near-total ranges start
+        from all-ones and clear the n - k rows outside.  Only when both
+        sides are large is a sequential compare cheaper than the random
+        writes, so that case scans the column instead.
+        """
+        index = self.ranges[col]
+        a, b = index.span(lo, hi)
+        k = b - a
+        if k == self.n:
+            return self.all_bits.copy()
+        if k <= self.n // 8:
+            mask = np.zeros(self.n, dtype=bool)
+            mask[index.order[a:b]] = True
+        elif self.n - k <= self.n // 8:
+            mask = np.ones(self.n, dtype=bool)
+            mask[index.order[:a]] = False
+            mask[index.order[b:]] = False
+        else:
+            values = self.df[col].to_numpy()
+            mask = (values >= index.sorted[a]) & (values <= index.sorted[b - 1])
+        return self.pack(mask)
+
+    # ── filter resolution ────────────────────────
+    def resolve(self, state):
+        """Resolve a FilterState to a packed row bitmap."""
+        bits = self.range_bits("year", *state.year)
+        bits &= self.range_bits("price", *state.price)
+        for col in ("fuelType", "transmission", "model"):
+            values = getattr(state, col)
+            if values is not None:
+                bits &= self.bitmaps[col].select(values)
+        return bits
+
+    def select(self, state):
+        """Resolve a FilterState to a compact Selection (row ids, not a frame)."""
+        bits = self.resolve(state)
+        rows = self.rows(bits)
+        return Selection(bits, rows.astype(np.int32) if self.n < 2**31 else rows, len(rows))
+
+    # ── masked reductions ────────────────────────
+    def counts(self, col, bits):
+        return self.bitmaps[col].counts(bits)
+
+    def mean(self, col, bits, mask=None):
+        n = self.count(bits)
+        if not n:
+            return float("nan")   # no rows, no average — not a zero one
+        mask = self.mask(bits) if mask is None else mask
+        total = np.add.reduce(self.df[col].to_numpy(), where=mask, dtype=np.float64)
+        return float(total / n)
@@ -0,0 +1,198 @@
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  BMW Used Car Intelligence — per-cell quantile sketches
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  Medians and quartiles are not sums, so the cube's count/sum cells
+#  cannot produce them.  Each cell therefore also keeps a log-bucketed
+#  histogram of every sketched measure (the DDSketch layout): bucket k
+#  holds values in (γ^(k-1), γ^k] with γ = (1+α)/(1-α), plus a bucket
+#  for zero.  Histograms merge by adding counts, so any filter's
+#  quantiles come from summing the matching cells' buckets.
+#
+#  Each bucket reports the mean of its values rather than its midpoint:
+#  that is exact whenever a bucket holds a single distinct value —
+#  typical of tax bands and round prices — and otherwise still lies in
+#  the bucket.  Error bound: a returned quantile is within a relative
+#  γ - 1 = 2α/(1-α) of the true order statistic(s) at that rank, i.e.
+#  about 1% for the default α = 0.5%.
+#
+#  Histogram charts use plain per-cell bin counts on fixed global edges
+#  (CellHistogram), which merge the same way and are exact; violins are
+#  kernel density estimates over those binned counts.
+import numpy as np
+import pandas as pd
+
+ALPHA = 0.005
+
+# (cell, bucket) pairs up to this many are counted densely with
+# bincount; past it the occupied pairs are compacted with np.unique.
+DENSE_PAIRS = 1 << 24
+
+
+def _sparse_pairs(cell_of_row, bins, n_cells, n_bins, weights=None):
+    """Occupied (cell, bin) pairs with their row counts (and weight sums)."""
+    pair = cell_of_row.astype(np.int64) * n_bins + bins
+    if n_cells * n_bins <= DENSE_PAIRS:
+        count = np.bincount(pair, minlength=n_cells * n_bins)
+        occupied = np.flatnonzero(count)
+        total = None if weights is None else \
+            np.bincount(pair, weights=weights, minlength=n_cells * n_bins)[occupied]
+        count = count[occupied]
+    else:
+        occupied, inverse, count = np.unique(pair, return_inverse=True, return_counts=True)
+        total = None if weights is None else \
+            np.bincount(inverse, weights=weights, minlength=len(occupied))
+    return ((occupied // n_bins).astype(np.int32), (occupied % n_bins).astype(np.int32),
+            count.astype(np.int64), total)
+
+
+class CellSketch:
+    """Sparse (cell, bucket) → count / sum histogram for one non-negative measure."""
+
+    def __init__(self, values, cell_of_row, n_cells, alpha=ALPHA):
+        self.alpha = alpha
+        self.log_gamma = np.log((1 + alpha) / (1 - alpha))
+        values = np.asarray(values, dtype=np.float64)
+        positive = values[values > 0]
+        self.k_min = int(self._log_key(positive.min())) if len(positive) else 0
+        keys = self.key(values)
+        self.n_keys = int(keys.max()) + 1 if len(keys) else 1
+
+        self.cell, self.bucket, self.count, self.total = \
+            _sparse_pairs(cell_of_row, keys, n_cells, self.n_keys, values)
+
+    def _log_key(self, x):
+        return np.ceil(np.log(x) / self.log_gamma)
+
+    def key(self, values):
+        """Bucket per value: 0 for zero (and below), 1.. for positives."""
+        keys = np.zeros(len(values), dtype=np.int64)
+        pos = values > 0
+        keys[pos] = self._log_key(values[pos]).astype(np.int64) - self.k_min + 1
+        return keys
+
+    def histograms(self, cell_mask, cell_group=None, n_groups=1):
+        """Merged (n_groups, n_keys) count and sum histograms of the masked cells."""
+        live = cell_mask[self.cell]
+        group = 0 if cell_group is None else cell_group[self.cell[live]].astype(np.int64)
+        idx = group * self.n_keys + self.bucket[live]
+        size = n_groups * self.n_keys
+        count = np.bincount(idx, weights=self.count[live], minlength=size)
+        total = np.bincount(idx, weights=self.total[live], minlength=size)
+        return count.reshape(n_groups, self.n_keys), total.reshape(n_groups, self.n_keys)
+
+
+def _nice_step(raw):
+    """Round a bin width up to two significant figures (5,350 → 5,400)."""
+    if raw <= 0:
+        return 1.0
+    unit = 10.0 ** (np.floor(np.log10(raw)) - 1)
+    return float(np.ceil(raw / unit) * unit)
+
+
+def global_edges(values, bins):
+    """About ``bins`` equal-width bins with round edges covering ``values``."""
+    lo, hi = (float(values.min()), float(values.max())) if len(values) else (0.0, 1.0)
+    step = _nice_step((hi - lo) / bins)
+    start = np.floor(lo / step) * step
+    n = max(int(np.ceil((hi - start) / step)), 1)
+    if start + n * step <= hi:
+        n += 1  # keep the maximum inside the last bin
+    return start + step * np.arange(n + 1)
+
+
+class CellHistogram:
+    """Sparse (cell, bin) → count histogram over fixed, dataset-wide edges.
+
+    Unlike the sketches this is exact: bins are shared by every cell, so
+    a filter's histogram is the sum of its cells' bin counts and its
+    payload is one count per bin however many rows match.
+    """
+
+    def __init__(self, values, cell_of_row, n_cells, bins):
+        self.edges = global_edges(values, bins)
+        self.cell, self.bin, self.count, _ = \
+            _sparse_pairs(cell_of_row, self.bin_of(values), n_cells, len(self.edges) - 1)
+
+    def bin_of(self, values):
+        # half-open [edge_i, edge_i+1) bins — the maximum sits below the last edge
+        return (np.searchsorted(self.edges, values, side="right") - 1).astype(np.int64)
+
+    def counts(self, cell_mask, cell_group=None, n_groups=1):
+        """(n_groups, bins) counts of the masked cells."""
+        n_bins = len(self.edges) - 1
+        live = cell_mask[self.cell]
+        group = 0 if cell_group is None else cell_group[self.cell[live]].astype(np.int64)
+        counts = np.bincount(group * n_bins + self.bin[live], weights=self.count[live],
+                             minlength=n_groups * n_bins)
+        return counts.astype(np.int64).reshape(n_groups, n_bins)
+
+    def row_counts(self, values, group=None, n_groups=1):
+        """Same as ``counts`` but binning raw row values."""
+        n_bins = len(self.edges) - 1
+        idx = self.bin_of(values) if group is None else group * n_bins + self.bin_of(values)
+        return np.bincount(idx, minlength=n_groups * n_bins).reshape(n_groups, n_bins)
+
+
+def coarsen(edges, counts, bins):
+    """Merge runs of adjacent equal-width bins down to about ``bins`` bins
+    (last axis of ``counts``); the last bin is padded with empty ones."""
+    factor = max(1, int(round((len(edges) - 1) / bins)))
+    if factor == 1:
+        return edges, counts
+    m = -(-counts.shape[-1] // factor)
+    pad = [(0, 0)] * (counts.ndim - 1) + [(0, m * factor - counts.shape[-1])]
+    counts = np.pad(counts, pad).reshape(*counts.shape[:-1], m, factor).sum(axis=-1)
+    return edges[0] + (edges[1] - edges[0]) * factor * np.arange(m + 1), counts
+
+
+def binned_kde(edges, counts, bandwidth, grid):
+    """Gaussian KDE of binned data at ``grid`` — every count sits at its
+    bin centre, so it rolls up from cell histograms like the counts do."""
+    centres = (edges[:-1] + edges[1:]) / 2
+    z = (grid[:, None] - centres[None, :]) / bandwidth
+    density = (np.exp(-0.5 * z * z) * counts[None, :]).sum(axis=1)
+    return density / (counts.sum() * bandwidth * np.sqrt(2 * np.pi))
+
+
+def sketch_quantiles(count, total, qs):
+    """Quantiles ``qs`` of each row of merged histograms, interpolated like
+    ``np.quantile``'s default (linear between the two order statistics)."""
+    out = np.full((len(count), len(qs)), np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        value = total / count
+    for g in range(len(count)):
+        n = count[g].sum()
+        if not n:
+            continue
+        cum = np.cumsum(count[g])
+        rank = np.asarray(qs, dtype=np.float64) * (n - 1)
+        lo = np.floor(rank)
+        at_lo = value[g][np.searchsorted(cum, lo, side="right")]
+        at_hi = value[g][np.searchsorted(cum, np.minimum(lo + 1, n - 1), side="right")]
+        out[g] = at_lo + (rank - lo) * (at_hi - at_lo)
+    return out
+
+
+def exact_quantiles(values, group, n_groups, qs):
+    """Exact grouped quantiles of row values (``group`` may be None)."""
+    out = np.full((n_groups, len(qs)), np.nan)
+    if group is None:
+        if len(values):
+            out[0] = np.quantile(values, qs)
+        return out
+    order = np.argsort(group, kind="stable")
+    bounds = np.searchsorted(group[order], np.arange(n_groups + 1))
+    for g in range(n_groups):
+        if bounds[g + 1] > bounds[g]:
+            out[g] = np.quantile(values[order[bounds[g]:bounds[g + 1]]], qs)
+    return out
+
+
+def quantile_frame(labels, by, group_codes, counts, values, qs):
+    """Assemble ``by`` label columns, ``count`` and one column per q."""
+    keep = counts > 0
+    out = {dim: labels[dim][codes[keep]] for dim, codes in zip(by, group_codes)}
+    out["count"] = counts[keep].astype(np.int64)
+    for i, q in enumerate(qs):
+        out[q] = values[keep, i]
+    return pd.DataFrame(out)
@@ -0,0 +1,288 @@
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  BMW Used Car Intelligence — host-wide result store
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  Every Dash worker and Streamlit process on a host computes the same
+#  figures and aggregates for the same filter states — mostly the
+#  default, unfiltered view.  ResultStore keeps them in one SQLite file
+#  that all of those processes open (WAL mode: readers never wait for
+#  the writer), keyed by
+#
+#      dataset version + CODE_VERSION · namespace (chart or tab id) · repr(key)
+#
+#  The dataset version is the content hash load_bmw stamps on its frame
+#  (df.attrs["version"]), so an edited bmw.csv gives new keys, and
+#  CODE_VERSION — a hash of the sources that compute what is stored —
+#  does the same for a deploy.  Entries of other versions stay (during a
+#  rolling deploy old and new workers share the file) but are the first
+#  to go when the store is over its byte budget, after which the least
+#  recently read entries are evicted.
+#
+#  Values are pickled, so the file must only be writable by the app's
+#  own user: the default lives in a 0700 directory of that user, any
+#  other directory must be owned by it and not group/world-writable, and
+#  each row is signed (HMAC-SHA256 over key and pickle) with a 0600 key
+#  file next to the database.  A row whose signature doesn't match is
+#  never unpickled.
+#
+#  SharedCache puts an in-process bmw_cache.LRUCache in front of it.
+#  The store is a cache, never a dependency: any SQLite error counts as
+#  a miss and the value is computed as usual.
+import hashlib
+import hmac
+import os
+import pickle
+import secrets
+import sqlite3
+import stat
+import tempfile
+import threading
+import time
+import weakref
+
+from bmw_cache import LRUCache
+
+MISSING = object()
+
+# The modules whose code decides what the apps store: figure specs and
+# aggregates, their classes and the compute functions around them.
+CODE_MODULES = ("bmw_agg.py", "bmw_charts.py", "bmw_cube.py", "bmw_index.py", "bmw_sketch.py",
+                "bmw_store.py", "app.py", "app1.py", "dash_app.py")
+
+
+def code_version():
+    """A hash of CODE_MODULES' sources: any change to them gives new keys."""
+    here, digest = os.path.dirname(os.path.abspath(__file__)), hashlib.sha256()
+    for name in CODE_MODULES:
+        try:
+            with open(os.path.join(here, name), "rb") as f:
+                digest.update(name.encode() + b"\0" + f.read() + b"\0")
+        except OSError:
+            pass   # an app that isn't deployed here
+    return digest.hexdigest()[:16]
+
+
+CODE_VERSION = code_version()
+
+# a hit only rewrites an entry's atime once it is this old, so reads
+# stay reads; eviction order is only this coarse
+ATIME_RESOLUTION = 60.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key     TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    size    INTEGER NOT NULL,
+    atime   REAL NOT NULL,
+    value   BLOB NOT NULL
+)
+"""
+
+
+_stores = weakref.WeakSet()
+
+
+def _after_fork():
+    for store in _stores:
+        store._lock = threading.Lock()   # may have been held by another thread
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def _check_private(path, mode_mask):
+    """Raise PermissionError unless ``path`` is this user's and none of
+    ``mode_mask``'s permission bits are set on it."""
+    st = os.lstat(path)
+    if st.st_uid != os.getuid() or st.st_mode & mode_mask or stat.S_ISLNK(st.st_mode):
+        raise PermissionError(f"{path} must be owned by uid {os.getuid()} "
+                              f"and have no {oct(mode_mask)} permission bits")
+
+
+def _secret(path):
+    """The signing key in ``path``, created (0600) on first use."""
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        pass
+    else:
+        with os.fdopen(fd, "wb") as f:
+            f.write(secrets.token_bytes(32))
+    _check_private(path, 0o077)
+    with open(path, "rb") as f:
+        key = f.read()
+    if len(key) < 32:
+        raise PermissionError(f"{path} is not a signing key")
+    return key
+
+
+def default_path():
+    """results.sqlite in this user's private (0700) temp directory."""
+    directory = os.path.join(tempfile.gettempdir(), f"bmw-results-{os.getuid()}")
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    _check_private(directory, 0o077)
+    return os.path.join(directory, "results.sqlite")
+
+
+class ResultStore:
+    """Signed, pickled results in a SQLite file shared by the processes of a host."""
+
+    def __init__(self, path, version, max_bytes):
+        # whoever can write the directory could swap the database or the key
+        _check_private(os.path.dirname(os.path.abspath(path)), 0o022)
+        self.path = path
+        self.version = f"{version}+code-{CODE_VERSION}"
+        self.max_bytes = max_bytes
+        self._secret = _secret(path + ".key")
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self.errors = 0
+        _stores.add(self)
+
+    def _connect(self):
+        # one connection per thread, reopened in forked children
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(SCHEMA)
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def _count(self, counter, n=1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + n)
+
+    def _key(self, namespace, key):
+        return hashlib.sha1(f"{self.version}\0{namespace}\0{key!r}".encode()).hexdigest()
+
+    def _sign(self, k, blob):
+        return hmac.new(self._secret, k.encode() + b"\0" + blob, hashlib.sha256).digest()
+
+    def get(self, namespace, key, default=None):
+        k = self._key(namespace, key)
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT value, atime FROM results WHERE key = ?", (k,)).fetchone()
+            if row is not None:
+                mac, blob = row[0][:32], row[0][32:]
+                if not hmac.compare_digest(mac, self._sign(k, blob)):
+                    raise pickle.UnpicklingError(f"bad signature on {namespace} entry")
+                now = time.time()
+                if now - row[1] > ATIME_RESOLUTION:
+                    conn.execute("UPDATE results SET atime = ? WHERE key = ?", (now, k))
+                value = pickle.loads(blob)
+        except (sqlite3.Error, pickle.UnpicklingError, EOFError):
+            self._count("errors")
+            row = None
+        if row is None:
+            self._count("misses")
+            return default
+        self._count("hits")
+        return value
+
+    def put(self, namespace, key, value):
+        blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(blob) > self.max_bytes:
+            return value
+        k = self._key(namespace, key)
+        try:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                         (k, self.version, len(blob), time.time(), self._sign(k, blob) + blob))
+            self._count("writes")
+            self._evict(conn)
+        except sqlite3.Error:
+            self._count("errors")
+        return value
+
+    def _evict(self, conn):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # down to 90% of the budget, so the next puts don't evict again;
+        # other dataset versions first, then the least recently read
+        excess, doomed = total - self.max_bytes * 9 // 10, []
+        for key, size in conn.execute("SELECT key, size FROM results ORDER BY version = ?, atime",
+                                      (self.version,)):
+            if excess <= 0:
+                break
+            doomed.append((key,))
+            excess -= size
+        conn.executemany("DELETE FROM results WHERE key = ?", doomed)
+        self._count("evictions", len(doomed))
+
+    def get_or_compute(self, namespace, key, compute):
+        value = self.get(namespace, key, MISSING)
+        if value is MISSING:
+            value = self.put(namespace, key, compute())
+        return value
+
+    def clear(self):
+        try:
+            self._connect().execute("DELETE FROM results")
+        except sqlite3.Error:
+            self._count("errors")
+
+    def stats(self):
+        try:
+            entries, nbytes = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        except sqlite3.Error:
+            entries = nbytes = None
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "path": self.path, "version": self.version,
+                "entries": entries, "bytes": nbytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "writes": self.writes, "evictions": self.evictions, "errors": self.errors,
+            }
+
+
+def open_store(version):
+    """The host's ResultStore for dataset ``version`` — None when there is
+    no version to key on, BMW_SHARED_CACHE=off, or the file can't be opened
+    (or its directory or key file is not private to this user)."""
+    path = os.environ.get("BMW_SHARED_CACHE")
+    if not version or path == "off":
+        return None
+    try:
+        store = ResultStore(path or default_path(), version,
+                            int(os.environ.get("BMW_SHARED_CACHE_MB", "256")) << 20)
+        store._connect()
+    except (sqlite3.Error, OSError):
+        return None
+    return store
+
+
+class SharedCache:
+    """Two tiers: an in-process LRUCache in front of an optional ResultStore.
+
+    Concurrent misses in one process compute once (LRUCache); a miss in
+    memory reads the store before computing, and writes what it computed.
+    """
+
+    def __init__(self, max_bytes, store, sizeof=None):
+        self.memory = LRUCache(max_bytes, **({"sizeof": sizeof} if sizeof else {}))
+        self.store = store
+
+    def get_or_compute(self, namespace, key, compute):
+        if self.store is None:
+            return self.memory.get_or_compute((namespace, key), compute)
+        return self.memory.get_or_compute(
+            (namespace, key), lambda: self.store.get_or_compute(namespace, key, compute))
+
+    def clear(self):
+        self.memory.clear()
+        if self.store is not None:
+            self.store.clear()
+
+    def stats(self):
+        return {"memory": self.memory.stats(),
+                "store": self.store.stats() if self.store is not None else None}
@@ -0,0 +1,115 @@
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  BMW Used Car Intelligence — server-side data table
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  Filtering, sorting and paging of a row selection without building
+#  the filtered frame: every step works on row ids and column arrays,
+#  and only the rows of the visible page are taken from the dataset.
+#
+#  Filters use the DataTable ``filter_query`` syntax, e.g.
+#      {price} >= 20000 && {model} contains X && {fuelType} = Diesel
+#  (braces are optional when typed by hand).
+import re
+
+import numpy as np
+import pandas as pd
+
+from bmw_data import for_display
+
+DEFAULT_SORT = [{"column_id": "price", "direction": "desc"}]
+
+_OPS = {"=": "eq", "!=": "ne", "<": "lt", "<=": "le", ">": "gt", ">=": "ge"}
+_NAMED = set(_OPS.values()) | {"contains", "datestartswith"}
+_TERM = re.compile(r"^\{?(?P<col>[A-Za-z_]\w*)\}?\s*"
+                   r"(?P<op>>=|<=|!=|=|<|>|[is]?(?:eq|ne|lt|le|gt|ge|contains|datestartswith))"
+                   r"\s*(?P<value>.*)$")
+
+
+def parse_query(query):
+    """``(column, op, value)`` terms of a filter query; unparseable terms are skipped."""
+    terms = []
+    for part in (query or "").split(" && "):
+        m = _TERM.match(part.strip())
+        if not m:
+            continue
+        op = m["op"]
+        # "i"/"s" prefixes are the case-(in)sensitive variants; matching is case-insensitive
+        op = _OPS.get(op, op[1:] if op not in _NAMED else op)
+        value = m["value"].strip()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'`":
+            value = value[1:-1]
+        terms.append((m["col"], op, value))
+    return terms
+
+
+def _values(df, col, rows):
+    """Comparable values of ``col`` at ``rows`` — float32 at its 1 dp display precision."""
+    values = df[col].to_numpy()[rows]
+    return np.round(values.astype(np.float64), 1) if values.dtype == np.float32 else values
+
+
+def _category_match(cats, op, value):
+    labels = cats.astype(str).str.lower()
+    value = value.lower()
+    if op == "contains":
+        return np.asarray(labels.str.contains(value, regex=False))
+    if op == "datestartswith":
+        return np.asarray(labels.str.startswith(value))
+    match = {"eq": labels == value, "ne": labels != value, "lt": labels < value,
+             "le": labels <= value, "gt": labels > value, "ge": labels >= value}[op]
+    return np.asarray(match)
+
+
+def filter_rows(df, rows, query):
+    """The ``rows`` matching every term of ``query``."""
+    for col, op, value in parse_query(query):
+        if col not in df.columns or not len(rows):
+            continue
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            # match the few labels once, then look the codes up
+            keep = _category_match(series.cat.categories, op, value)[series.array.codes[rows]]
+        elif op in ("contains", "datestartswith"):
+            text = _values(df, col, rows).astype(str)
+            keep = np.char.find(text, value) >= 0 if op == "contains" else np.char.startswith(text, value)
+        else:
+            try:
+                number = float(value)
+            except ValueError:
+                continue
+            values = _values(df, col, rows)
+            keep = {"eq": values == number, "ne": values != number, "lt": values < number,
+                    "le": values <= number, "gt": values > number, "ge": values >= number}[op]
+        rows = rows[keep]
+    return rows
+
+
+def sort_rows(df, rows, sort_by):
+    """``rows`` ordered by the DataTable ``sort_by`` list (first entry
+    primary); ties keep dataset order, so pages never overlap."""
+    keys = [rows]
+    for s in reversed(sort_by or []):
+        if s["column_id"] not in df.columns:
+            continue
+        series = df[s["column_id"]]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            rank = np.argsort(np.argsort(series.cat.categories.astype(str)))
+            key = rank[series.array.codes[rows]].astype(np.float64)
+        else:
+            key = series.to_numpy()[rows].astype(np.float64)
+        keys.append(-key if s["direction"] == "desc" else key)
+    return rows if len(keys) == 1 else rows[np.lexsort(keys)]
+
+
+def page_frame(df, ordered, page_current, page_size, columns):
+    """One page of the already filtered and sorted row ids, ready to display."""
+    start = page_current * page_size
+    return for_display(df.take(ordered[start:start + page_size])[columns]).reset_index(drop=True)
+
+
+def page(df, ordered, page_current, page_size, columns):
+    """``page_frame`` as DataTable records."""
+    return page_frame(df, ordered, page_current, page_size, columns).to_dict("records")
+
+
+def page_count(n, page_size):
+    return max(1, -(-n // page_size))
@@ -0,0 +1,106 @@
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  BMW Used Car Intelligence — startup warm-up
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  After a deploy the first visitors would pay for the default view and
+#  for the popular one-filter views.  Each app hands a Warmup its own
+#  ``warm(year, fuels, trans, price, models)`` — the figures and
+#  aggregates that view reads, through the app's caches — and a daemon
+#  thread runs it over warm_filters() while the app already serves:
+#
+#      the default view (every fuel type and transmission, no model)
+#      each fuel type alone, each transmission alone
+#      each of the BMW_WARMUP_MODELS (10) most listed models alone
+#
+#  ``record(state)`` counts the first ``track`` requests and how many of
+#  them asked for a state the warm-up had already finished.
+#  BMW_WARMUP=0 turns it off.
+import logging
+import os
+import threading
+import time
+
+from bmw_data import counts
+
+log = logging.getLogger(__name__)
+
+ENABLED = os.environ.get("BMW_WARMUP", "1") != "0"
+TOP_MODELS = int(os.environ.get("BMW_WARMUP_MODELS", "10"))
+
+
+def warm_filters(df, top_models=TOP_MODELS):
+    """(label, (year, fuels, trans, price, models)) of the views to warm,
+    as the sidebar widgets report them — the default view first."""
+    year = [int(df["year"].min()), int(df["year"].max())]
+    price = [int(df["price"].min()), int(df["price"].max())]
+    fuels = sorted(df["fuelType"].unique().tolist())
+    trans = sorted(df["transmission"].unique().tolist())
+    plan = [("default", (year, fuels, trans, price, []))]
+    plan += [(f"fuelType={f}", (year, [f], trans, price, [])) for f in fuels]
+    plan += [(f"transmission={t}", (year, fuels, [t], price, [])) for t in trans]
+    plan += [(f"model={m}", (year, fuels, trans, price, [m]))
+             for m in counts(df["model"]).index[:top_models]]
+    return plan
+
+
+class Warmup:
+    """Run ``warm(*filters)`` over ``plan`` in a background thread.
+
+    ``key(*filters)`` is the state a request for those filters records.
+    """
+
+    def __init__(self, plan, warm, key, track=1000):
+        self.plan = plan
+        self.track = track
+        self._warm = warm
+        self._key = key
+        self._warmed = set()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="bmw-warmup", daemon=True)
+        self.started = None
+        self.seconds = None
+        self.errors = 0
+        self.requests = 0
+        self.served = 0
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def wait(self):
+        """Block until the warm-up has finished (at once if it never started)."""
+        if self.started is not None:
+            self._thread.join()
+
+    def _run(self):
+        for label, filters in self.plan:
+            try:
+                self._warm(*filters)
+            except Exception:
+                # a view that fails here fails again when asked for, in-request
+                log.exception("warm-up of %s failed", label)
+                self.errors += 1
+                continue
+            with self._lock:
+                self._warmed.add(self._key(*filters))
+        self.seconds = time.perf_counter() - self.started
+        log.info("warm-up: %d of %d views in %.1fs", len(self._warmed), len(self.plan), self.seconds)
+
+    def record(self, state):
+        """Count a request for ``state`` among the early ones."""
+        with self._lock:
+            if self.requests >= self.track:
+                return
+            self.requests += 1
+            if state in self._warmed:
+                self.served += 1
+            if self.requests == self.track:
+                log.info("warm-up served %d of the first %d requests", self.served, self.track)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "views": len(self.plan), "warmed": len(self._warmed), "errors": self.errors,
+                "running": self._thread.is_alive(), "seconds": self.seconds,
+                "requests": self.requests, "served_warm": self.served,
+            }
@@ -2,17 +2,36 @@
 #  BMW Used Car Intelligence — Dash + Plotly Professional Dashboard
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 import os
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
 import dash
-from dash import dcc, html, Input, Output, dash_table, callback
+from dash import dcc, html, Input, Output, State, ClientsideFunction, dash_table, callback
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
-import plotly.express as px
 import plotly.graph_objects as go
+from plotly.colors import sequential
 import pandas as pd
 import numpy as np
 
+from bmw_data import CSV_PATH, kpi_text, load_bmw
+from bmw_index import DatasetIndex, FilterState
+from bmw_cache import LRUCache
+from bmw_cube import Cube
+from bmw_charts import (FOLLOWS, binned_histogram, box_figure, bubble_figure, category_bar, donut,
+                        heatmap, hierarchy, layout_value, ranked_bar, tiered_scatter, violin_figure)
+from bmw_coalesce import Coalescer, Superseded
+from bmw_store import SharedCache, open_store
+import bmw_warmup
+import bmw_blob
+import bmw_table
+
 # ── Data ──────────────────────────────────────────────────────
-CSV_PATH = os.path.join(os.path.dirname(__file__), "bmw.csv")
-raw_df = pd.read_csv(CSV_PATH).dropna().drop_duplicates()
+# read-only memory maps of bmw.csv.cols/ — WSGI workers share the pages
+raw_df = load_bmw(CSV_PATH)
+index = DatasetIndex(raw_df)
+cube = Cube(raw_df)
 
 # ── Brand palette & chart theme ───────────────────────────────
 BMW_BLUE   = "#1C69D4"
@@ -177,6 +196,13 @@ body {
 .Select-placeholder   { color: #64748b !important; }
 .VirtualizedSelectOption { color: #CBD5E1 !important; }
 
+/* ─ chart jobs ─ */
+.chart-busy { opacity: .45; transition: opacity .2s; }
+.chart-job { height: 3px; margin: -.2rem 0 .2rem; position: relative; visibility: hidden; }
+.chart-job.active { visibility: visible; }
+.chart-job-bar { height: 100%; width: 0; background: #1C69D4; border-radius: 2px; transition: width .2s; }
+.chart-job-label { position: absolute; right: 0; top: 4px; color: #64748b; font-size: .68rem; }
+
 .rc-slider-track { background-color: #1C69D4 !important; }
 .rc-slider-handle { border-color: #1C69D4 !important; background: #fff !important; }
 .rc-slider-rail { background-color: #1e293b !important; }
@@ -232,7 +258,13 @@ def chart_card(title, subtitle, graph_id, height=380):
     return html.Div(className="glass-card", children=[
         html.P(title, className="card-title"),
         html.P(subtitle, className="card-sub"),
-        dcc.Graph(id=graph_id, config={"displayModeBar": False},
+        # progress strip of a chart served by a job (CHART JOBS)
+        html.Div(id=f"{graph_id}-job", className="chart-job", children=[
+            html.Div(id=f"{graph_id}-job-bar", className="chart-job-bar"),
+            html.Span(id=f"{graph_id}-job-label", className="chart-job-label"),
+        ]) if graph_id in CHART_JOBS else None,
+        # starts as the chart's skeleton; its callback patches in the traces
+        dcc.Graph(id=graph_id, figure=SKELETONS[graph_id], config={"displayModeBar": False},
                   style={"height": f"{height}px"}),
     ])
 
@@ -257,6 +289,7 @@ sidebar = html.Div(className="sidebar", children=[
         marks={y: {"label": str(y), "style": {"color": "#64748b", "fontSize": ".68rem"}}
                for y in range(int(raw_df["year"].min()), int(raw_df["year"].max()) + 1, 2)},
         tooltip={"placement": "bottom", "always_visible": False},
+        updatemode="mouseup",   # see SLIDER UPDATES
     ),
     html.Br(),
 
@@ -290,6 +323,7 @@ sidebar = html.Div(className="sidebar", children=[
         value=[int(raw_df["price"].min()), int(raw_df["price"].max())],
         step=500,
         tooltip={"placement": "bottom", "always_visible": False},
+        updatemode="mouseup",
         marks={
             int(raw_df["price"].min()): {"label": f"£{int(raw_df['price'].min()):,}", "style": {"color": "#64748b", "fontSize": ".68rem"}},
             int(raw_df["price"].max()): {"label": f"£{int(raw_df['price'].max()):,}", "style": {"color": "#64748b", "fontSize": ".68rem"}},
@@ -341,23 +375,156 @@ main_content = html.Div(className="main-content", children=[
     ]),
 ])
 
-app.layout = html.Div([sidebar, main_content])
+def serve_layout():
+    # a fresh id per page load keys that page's requests in the coalescer
+    stores = [dcc.Store(id="session-id", data=uuid.uuid4().hex)]
+    if CLIENTSIDE:
+        stores.append(dcc.Store(id="client-data", data=CLIENT_DATA))   # see BROWSER-SIDE MODE
+    return html.Div([*stores, sidebar, main_content])
+
+
+app.layout = serve_layout
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  SLIDER UPDATES
+#  release  the sliders set their value when the handle is let go (default)
+#  live     the value follows the drag, once it has rested for
+#           SLIDER_DEBOUNCE_MS — debounced in the browser, so the
+#           positions passed over never become requests
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+SLIDER_UPDATE      = os.environ.get("BMW_SLIDER_UPDATE", "release")
+SLIDER_DEBOUNCE_MS = int(os.environ.get("BMW_SLIDER_DEBOUNCE_MS", "300"))
+
+# drag_value → value after a pause; letting go sets value itself and
+# cancels the pending timer
+DEBOUNCE_JS = """
+function (drag, value) {
+    const pending = window.bmwDebounce = window.bmwDebounce || {};
+    const key = "%(id)s";
+    if (pending[key]) {
+        clearTimeout(pending[key].timer);
+        pending[key].resolve(window.dash_clientside.no_update);
+        delete pending[key];
+    }
+    const released = dash_clientside.callback_context.triggered.some(t => t.prop_id === key + ".value");
+    if (released || JSON.stringify(drag) === JSON.stringify(value)) {
+        return window.dash_clientside.no_update;
+    }
+    return new Promise(resolve => {
+        pending[key] = {resolve, timer: setTimeout(() => { delete pending[key]; resolve(drag); }, %(ms)d)};
+    });
+}
+"""
+
+if SLIDER_UPDATE == "live":
+    for _slider in ("filter-year", "filter-price"):
+        app.clientside_callback(DEBOUNCE_JS % {"id": _slider, "ms": SLIDER_DEBOUNCE_MS},
+                                Output(_slider, "value"),
+                                Input(_slider, "drag_value"), Input(_slider, "value"),
+                                prevent_initial_call=True)
 
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 #  FILTER HELPER
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-def filter_df(year_range, fuels, trans, price_range, models):
-    dff = raw_df.copy()
-    dff = dff[dff["year"].between(year_range[0], year_range[1])]
-    if fuels:
-        dff = dff[dff["fuelType"].isin(fuels)]
-    if trans:
-        dff = dff[dff["transmission"].isin(trans)]
-    dff = dff[dff["price"].between(price_range[0], price_range[1])]
-    if models:
-        dff = dff[dff["model"].isin(models)]
-    return dff
+CHOICES = {c: frozenset(raw_df[c].unique().tolist()) for c in ("fuelType", "transmission", "model")}
+
+
+def filter_state(year_range, fuels, trans, price_range, models):
+    # an empty dropdown means "all" here, unlike the Streamlit multiselects,
+    # and so does one with every value picked: both are None, so a view
+    # has one key in the caches and in the warm-up's record
+    def narrowing(values, column):
+        return None if not values or CHOICES[column] <= set(values) else values
+    return FilterState.make(year_range, price_range, narrowing(fuels, "fuelType"),
+                            narrowing(trans, "transmission"), narrowing(models, "model"))
+
+
+# One slider move fires the master callback plus every chart callback of
+# the active tab with the same inputs: resolve each distinct filter state
+# once per process and keep it as row ids, not as a copied frame.
+selection_cache = LRUCache(int(os.environ.get("BMW_SELECTION_CACHE_MB", "64")) << 20)
+
+
+# Requests that a newer one from the same page has made moot are dropped
+# before they compute (bmw_coalesce); COMPUTE_SLOTS bounds how many
+# filter callbacks compute at once, so under load the rest queue here,
+# where superseding can still reach them.
+COMPUTE_SLOTS = int(os.environ.get("BMW_COMPUTE_SLOTS", str(os.cpu_count() or 4)))
+coalescer = Coalescer(COMPUTE_SLOTS, enabled=os.environ.get("BMW_COALESCE", "1") != "0")
+
+
+@contextmanager
+def latest_only(session, region):
+    """Admit a filter callback through the coalescer; a superseded one answers 204."""
+    try:
+        with coalescer.admit((session, region) if session else None):
+            yield
+    except Superseded:
+        raise PreventUpdate
+
+
+# Finished figures (as the specs figure_patch sends) and KPI numbers are
+# shared by every worker on the host: in memory first, then the SQLite
+# store (bmw_store) keyed on the dataset version, so a state one worker
+# has drawn is a read for all the others, and for the next deployment
+# as long as bmw.csv is unchanged.
+figure_cache = SharedCache(int(os.environ.get("BMW_FIGURE_CACHE_MB", "32")) << 20,
+                           open_store(raw_df.attrs.get("version")))
+
+
+@server.route("/_stats/cache")
+def cache_stats():
+    return {"warmup": warmup.stats(), "coalescer": coalescer.stats(), "figures": figure_cache.stats(),
+            "selections": selection_cache.stats(), "tabs": tab_cache.stats(),
+            "tables": table_cache.stats()}
+
+
+def select_rows(year_range, fuels, trans, price_range, models):
+    state = filter_state(year_range, fuels, trans, price_range, models)
+    return selection_cache.get_or_compute(state, lambda: index.select(state))
+
+
+# Every chart callback of a tab reads the same fused roll-up (bmw_agg):
+# the first one to arrive computes it for the whole tab, the rest hit.
+tab_cache = LRUCache(int(os.environ.get("BMW_TAB_CACHE_MB", "16")) << 20)
+
+
+def cube_args(year_range, fuels, trans, price_range, models):
+    """(state, rows) for a Cube query — rows are only resolved when the
+    price range is off the cube's bucket grid and it has to fall back."""
+    state = filter_state(year_range, fuels, trans, price_range, models)
+    if cube.exact(state):
+        return state, None
+    return state, select_rows(year_range, fuels, trans, price_range, models).rows
+
+
+def tab_stats(year_range, fuels, trans, price_range, models, tab):
+    """Fused aggregates for one tab, shared by all of its chart callbacks."""
+    args = (year_range, fuels, trans, price_range, models)
+
+    def compute():
+        state, rows = cube_args(*args)
+        return cube.tab(state, tab, rows)
+    return tab_cache.get_or_compute((filter_state(*args), tab), compute)
+
+
+# The data explorer pages through the filtered, sorted row ids of the
+# whole selection; keeping them makes turning a page a slice + take.
+table_cache = LRUCache(int(os.environ.get("BMW_TABLE_CACHE_MB", "32")) << 20)
+
+
+def table_rows(year_range, fuels, trans, price_range, models, sort_by, filter_query):
+    """Row ids of the data table: the selection, narrowed by the table's
+    own filter query and ordered by its sort_by."""
+    args = (year_range, fuels, trans, price_range, models)
+    sort_key = tuple((s["column_id"], s["direction"]) for s in sort_by or ())
+
+    def compute():
+        rows = bmw_table.filter_rows(raw_df, select_rows(*args).rows, filter_query)
+        return bmw_table.sort_rows(raw_df, rows, sort_by)
+    return table_cache.get_or_compute((filter_state(*args), sort_key, filter_query or ""), compute)
 
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -438,24 +605,33 @@ def make_inventory():
     ])
 
 
-def make_data_explorer(dff):
-    col_order = ["model", "year", "price", "transmission", "mileage", "fuelType", "tax", "mpg", "engineSize"]
-    table_df = dff[col_order].sort_values("price", ascending=False).reset_index(drop=True)
-    stats_df = dff.describe().T.reset_index().rename(columns={"index": "Column"})
-    for c in stats_df.columns[1:]:
-        stats_df[c] = stats_df[c].apply(lambda x: f"{x:,.1f}")
+TABLE_COLUMNS = ["model", "year", "price", "transmission", "mileage", "fuelType", "tax", "mpg", "engineSize"]
+TABLE_PAGE_SIZE = 20
+
 
+STATS_COLUMNS = ["Column", "count", "mean", "std", "min", "25%", "50%", "75%", "max"]
+
+
+def make_data_explorer():
     return html.Div([
         html.Div(className="glass-card", children=[
             html.P("Filtered Dataset", className="card-title"),
-            html.P(f"Showing {len(dff):,} records — use sidebar to refine", className="card-sub"),
+            html.P(id="data-count", className="card-sub"),
             dash_table.DataTable(
                 id="data-table",
-                columns=[{"name": c.title(), "id": c} for c in col_order],
-                data=table_df.head(500).to_dict("records"),
-                page_size=20,
-                sort_action="native",
-                filter_action="native",
+                # rows, sorting and filtering are served by update_data_explorer
+                columns=[{"name": c.title(), "id": c,
+                          "type": "text" if isinstance(raw_df[c].dtype, pd.CategoricalDtype) else "numeric"}
+                         for c in TABLE_COLUMNS],
+                data=[],
+                page_current=0,
+                page_size=TABLE_PAGE_SIZE,
+                page_action="custom",
+                sort_action="custom",
+                sort_mode="multi",
+                sort_by=bmw_table.DEFAULT_SORT,
+                filter_action="custom",
+                filter_query="",
                 style_table={"overflowX": "auto"},
                 style_header={
                     "backgroundColor": "#0f172a", "color": "#94A3B8",
@@ -485,8 +661,8 @@ def make_data_explorer(dff):
             html.P("Quick Statistics", className="card-title"),
             html.P("Summary of numeric columns in current filter", className="card-sub"),
             dash_table.DataTable(
-                columns=[{"name": c, "id": c} for c in stats_df.columns],
-                data=stats_df.to_dict("records"),
+                id="data-stats",
+                columns=[{"name": c, "id": c} for c in STATS_COLUMNS],
                 style_header={
                     "backgroundColor": "#0f172a", "color": "#94A3B8",
                     "fontWeight": "600", "fontSize": ".78rem",
@@ -504,314 +680,550 @@ def make_data_explorer(dff):
 
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-#  MASTER CALLBACK — updates everything in one pass
+#  FIGURES — OVERVIEW TAB
+#  Traces only: theme and axes live in the chart's skeleton below.
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-@callback(
-    Output("hero-subtitle", "children"),
-    Output("kpi-row", "children"),
-    Output("tab-content", "children"),
-    Input("filter-year", "value"),
-    Input("filter-fuel", "value"),
-    Input("filter-trans", "value"),
-    Input("filter-price", "value"),
-    Input("filter-model", "value"),
-    Input("main-tabs", "active_tab"),
-)
-def update_dashboard(year_range, fuels, trans, price_range, models, active_tab):
-    dff = filter_df(year_range, fuels, trans, price_range, models)
-    n_filtered = len(dff)
-    n_total = len(raw_df)
+def fuel_bar_figure(stats):
+    fig = category_bar(stats.counts("fuelType"), "Fuel Type", PALETTE)
+    return fig.update_traces(textposition="outside", marker_line_width=0, marker_cornerradius=5)
 
-    # ── Hero subtitle ────────────────────────────
-    subtitle = f"Real-time analytics across {n_filtered:,} listings from a universe of {n_total:,} vehicles"
 
-    # ── KPIs ─────────────────────────────────────
-    avg_price   = dff["price"].mean()      if n_filtered else 0
-    avg_mileage = dff["mileage"].mean()    if n_filtered else 0
-    avg_mpg     = dff["mpg"].mean()        if n_filtered else 0
-    avg_engine  = dff["engineSize"].mean() if n_filtered else 0
+def trans_donut_figure(stats):
+    tc = stats.counts("transmission")
+    fig = donut(tc, "Transmission", 0.55)
+    return fig.update_traces(textinfo="percent+label", textfont_size=12, pull=[0.02]*len(tc))
 
-    kpis = [
-        kpi_card("💷", f"£{avg_price:,.0f}",        "Avg Price",   "blue"),
-        kpi_card("🛣️", f"{avg_mileage:,.0f}",       "Avg Mileage", "cyan"),
-        kpi_card("⛽", f"{avg_mpg:.1f}",             "Avg MPG",     "green"),
-        kpi_card("🔧", f"{avg_engine:.1f}L",         "Avg Engine",  "amber"),
-    ]
 
-    # ── Tab content ──────────────────────────────
-    if active_tab == "tab-overview":
-        content = make_overview()
-    elif active_tab == "tab-pricing":
-        content = make_pricing()
-    elif active_tab == "tab-inventory":
-        content = make_inventory()
-    else:
-        content = make_data_explorer(dff)
-
-    return subtitle, kpis, content
-
-
-# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-#  CHART CALLBACKS — OVERVIEW TAB
-# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-@callback(Output("chart-fuel-bar", "figure"),
-          Input("filter-year", "value"), Input("filter-fuel", "value"),
-          Input("filter-trans", "value"), Input("filter-price", "value"),
-          Input("filter-model", "value"), Input("main-tabs", "active_tab"))
-def chart_fuel_bar(yr, fu, tr, pr, mo, tab):
-    if tab != "tab-overview":
-        raise dash.exceptions.PreventUpdate
-    dff = filter_df(yr, fu, tr, pr, mo)
-    fc = dff["fuelType"].value_counts().reset_index()
-    fc.columns = ["Fuel Type", "Count"]
-    fig = px.bar(fc, x="Fuel Type", y="Count", color="Fuel Type",
-                 color_discrete_sequence=PALETTE, text_auto=True)
-    fig.update_layout(**CHART_TPL, showlegend=False, height=370)
-    fig.update_traces(textposition="outside", marker_line_width=0, marker_cornerradius=5)
-    return apply_grid(fig)
-
-
-@callback(Output("chart-trans-donut", "figure"),
-          Input("filter-year", "value"), Input("filter-fuel", "value"),
-          Input("filter-trans", "value"), Input("filter-price", "value"),
-          Input("filter-model", "value"), Input("main-tabs", "active_tab"))
-def chart_trans_donut(yr, fu, tr, pr, mo, tab):
-    if tab != "tab-overview":
-        raise dash.exceptions.PreventUpdate
-    dff = filter_df(yr, fu, tr, pr, mo)
-    tc = dff["transmission"].value_counts().reset_index()
-    tc.columns = ["Transmission", "Count"]
-    fig = px.pie(tc, names="Transmission", values="Count", hole=0.55,
-                 color_discrete_sequence=PALETTE)
-    fig.update_layout(**CHART_TPL, height=370, showlegend=True,
-                      legend=dict(orientation="h", y=-0.15, x=0.5, xanchor="center"))
-    fig.update_traces(textinfo="percent+label", textfont_size=12,
-                      pull=[0.02]*len(tc))
-    return apply_grid(fig)
-
-
-@callback(Output("chart-price-trend", "figure"),
-          Input("filter-year", "value"), Input("filter-fuel", "value"),
-          Input("filter-trans", "value"), Input("filter-price", "value"),
-          Input("filter-model", "value"), Input("main-tabs", "active_tab"))
-def chart_price_trend(yr, fu, tr, pr, mo, tab):
-    if tab != "tab-overview":
-        raise dash.exceptions.PreventUpdate
-    dff = filter_df(yr, fu, tr, pr, mo)
-    agg = dff.groupby("year").agg(avg_price=("price", "mean")).reset_index()
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(
+def price_trend_figure(stats):
+    agg = stats["year"].rename(columns={"price_mean": "avg_price"})
+    return go.Figure(go.Scatter(
         x=agg["year"], y=agg["avg_price"], mode="lines+markers",
         line=dict(color=CYAN, width=3, shape="spline"),
         marker=dict(size=8, color=CYAN, line=dict(width=2, color=BG_DARK)),
         fill="tozeroy", fillcolor="rgba(34,211,238,0.08)",
         hovertemplate="<b>%{x}</b><br>Avg: £%{y:,.0f}<extra></extra>",
     ))
-    fig.update_layout(**CHART_TPL, height=380,
-                      xaxis=dict(title="Year", dtick=1),
-                      yaxis=dict(title="Avg Price (£)", tickprefix="£", separatethousands=True))
-    return apply_grid(fig)
-
-
-@callback(Output("chart-mpg-box", "figure"),
-          Input("filter-year", "value"), Input("filter-fuel", "value"),
-          Input("filter-trans", "value"), Input("filter-price", "value"),
-          Input("filter-model", "value"), Input("main-tabs", "active_tab"))
-def chart_mpg_box(yr, fu, tr, pr, mo, tab):
-    if tab != "tab-overview":
-        raise dash.exceptions.PreventUpdate
-    dff = filter_df(yr, fu, tr, pr, mo)
-    fig = px.box(dff, x="fuelType", y="mpg", color="fuelType",
-                 color_discrete_sequence=PALETTE)
-    fig.update_layout(**CHART_TPL, height=370, showlegend=False,
-                      xaxis_title="Fuel Type", yaxis_title="MPG")
-    return apply_grid(fig)
-
-
-@callback(Output("chart-engine-donut", "figure"),
-          Input("filter-year", "value"), Input("filter-fuel", "value"),
-          Input("filter-trans", "value"), Input("filter-price", "value"),
-          Input("filter-model", "value"), Input("main-tabs", "active_tab"))
-def chart_engine_donut(yr, fu, tr, pr, mo, tab):
-    if tab != "tab-overview":
-        raise dash.exceptions.PreventUpdate
-    dff = filter_df(yr, fu, tr, pr, mo)
-    ec = dff["engineSize"].value_counts().sort_index().reset_index()
-    ec.columns = ["Engine (L)", "Count"]
-    ec["Engine (L)"] = ec["Engine (L)"].astype(str) + "L"
-    fig = px.pie(ec, names="Engine (L)", values="Count", hole=0.5,
-                 color_discrete_sequence=PALETTE)
-    fig.update_layout(**CHART_TPL, height=370,
-                      legend=dict(orientation="h", y=-0.2, x=0.5, xanchor="center"))
-    fig.update_traces(textinfo="percent+label", textfont_size=11)
-    return apply_grid(fig)
-
-
-# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-#  CHART CALLBACKS — PRICING TAB
-# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-@callback(Output("chart-scatter", "figure"),
-          Input("filter-year", "value"), Input("filter-fuel", "value"),
-          Input("filter-trans", "value"), Input("filter-price", "value"),
-          Input("filter-model", "value"), Input("main-tabs", "active_tab"))
-def chart_scatter(yr, fu, tr, pr, mo, tab):
-    if tab != "tab-pricing":
-        raise dash.exceptions.PreventUpdate
-    dff = filter_df(yr, fu, tr, pr, mo)
-    fig = px.scatter(dff, x="mileage", y="price", color="fuelType",
-                     size="engineSize", opacity=0.65,
-                     hover_data=["model", "year", "transmission"],
-                     color_discrete_sequence=PALETTE)
-    fig.update_layout(**CHART_TPL, height=440,
-                      xaxis_title="Mileage", yaxis_title="Price (£)",
-                      legend=dict(orientation="h", y=-0.18, x=0.5, xanchor="center"))
-    return apply_grid(fig)
-
-
-@callback(Output("chart-mileage-hist", "figure"),
-          Input("filter-year", "value"), Input("filter-fuel", "value"),
-          Input("filter-trans", "value"), Input("filter-price", "value"),
-          Input("filter-model", "value"), Input("main-tabs", "active_tab"))
-def chart_mileage_hist(yr, fu, tr, pr, mo, tab):
-    if tab != "tab-pricing":
-        raise dash.exceptions.PreventUpdate
-    dff = filter_df(yr, fu, tr, pr, mo)
-    fig = px.histogram(dff, x="mileage", nbins=40,
-                       color_discrete_sequence=[BMW_BLUE], marginal="box")
-    fig.update_layout(**CHART_TPL, height=440,
-                      xaxis_title="Mileage", yaxis_title="Frequency", bargap=0.03)
-    fig.update_traces(marker_line_width=0)
-    return apply_grid(fig)
-
-
-@callback(Output("chart-violin", "figure"),
-          Input("filter-year", "value"), Input("filter-fuel", "value"),
-          Input("filter-trans", "value"), Input("filter-price", "value"),
-          Input("filter-model", "value"), Input("main-tabs", "active_tab"))
-def chart_violin(yr, fu, tr, pr, mo, tab):
-    if tab != "tab-pricing":
-        raise dash.exceptions.PreventUpdate
-    dff = filter_df(yr, fu, tr, pr, mo)
-    fig = px.violin(dff, x="fuelType", y="price", color="fuelType",
-                    box=True, points=False, color_discrete_sequence=PALETTE)
-    fig.update_layout(**CHART_TPL, height=420, showlegend=False,
-                      xaxis_title="Fuel Type", yaxis_title="Price (£)")
-    return apply_grid(fig)
-
-
-@callback(Output("chart-heatmap", "figure"),
-          Input("filter-year", "value"), Input("filter-fuel", "value"),
-          Input("filter-trans", "value"), Input("filter-price", "value"),
-          Input("filter-model", "value"), Input("main-tabs", "active_tab"))
-def chart_heatmap(yr, fu, tr, pr, mo, tab):
-    if tab != "tab-pricing":
-        raise dash.exceptions.PreventUpdate
-    dff = filter_df(yr, fu, tr, pr, mo)
-    heat = dff.pivot_table(values="price", index="fuelType", columns="year", aggfunc="mean")
-    fig = px.imshow(heat, text_auto=",.0f", color_continuous_scale="Blues", aspect="auto")
-    fig.update_layout(**CHART_TPL, height=350,
-                      xaxis_title="Year", yaxis_title="Fuel Type",
-                      coloraxis_colorbar=dict(title="Avg £", tickprefix="£"))
-    return apply_grid(fig)
-
-
-# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-#  CHART CALLBACKS — INVENTORY TAB
-# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-@callback(Output("chart-top-models", "figure"),
-          Input("filter-year", "value"), Input("filter-fuel", "value"),
-          Input("filter-trans", "value"), Input("filter-price", "value"),
-          Input("filter-model", "value"), Input("main-tabs", "active_tab"))
-def chart_top_models(yr, fu, tr, pr, mo, tab):
-    if tab != "tab-inventory":
-        raise dash.exceptions.PreventUpdate
-    dff = filter_df(yr, fu, tr, pr, mo)
-    top = dff["model"].value_counts().head(12).reset_index()
-    top.columns = ["Model", "Count"]
-    fig = px.bar(top, x="Count", y="Model", orientation="h",
-                 color="Count", color_continuous_scale=["#0f172a", BMW_BLUE, CYAN],
-                 text_auto=True)
-    fig.update_layout(**CHART_TPL, height=480, coloraxis_showscale=False)
-    fig.update_yaxes(autorange="reversed")
-    fig.update_traces(marker_line_width=0, textposition="outside", marker_cornerradius=4)
-    return apply_grid(fig)
-
-
-@callback(Output("chart-engine-pie", "figure"),
-          Input("filter-year", "value"), Input("filter-fuel", "value"),
-          Input("filter-trans", "value"), Input("filter-price", "value"),
-          Input("filter-model", "value"), Input("main-tabs", "active_tab"))
-def chart_engine_pie(yr, fu, tr, pr, mo, tab):
-    if tab != "tab-inventory":
-        raise dash.exceptions.PreventUpdate
-    dff = filter_df(yr, fu, tr, pr, mo)
-    ec = dff["engineSize"].value_counts().sort_index().reset_index()
-    ec.columns = ["Engine (L)", "Count"]
-    ec["Engine (L)"] = ec["Engine (L)"].astype(str) + "L"
-    fig = px.pie(ec, names="Engine (L)", values="Count", hole=0.5,
-                 color_discrete_sequence=PALETTE)
-    fig.update_layout(**CHART_TPL, height=480,
-                      legend=dict(orientation="h", y=-0.2, x=0.5, xanchor="center"))
-    fig.update_traces(textinfo="percent+label", textfont_size=11)
-    return apply_grid(fig)
-
-
-@callback(Output("chart-treemap", "figure"),
-          Input("filter-year", "value"), Input("filter-fuel", "value"),
-          Input("filter-trans", "value"), Input("filter-price", "value"),
-          Input("filter-model", "value"), Input("main-tabs", "active_tab"))
-def chart_treemap(yr, fu, tr, pr, mo, tab):
-    if tab != "tab-inventory":
-        raise dash.exceptions.PreventUpdate
-    dff = filter_df(yr, fu, tr, pr, mo)
-    tree = dff.groupby(["model", "transmission"]).size().reset_index(name="count")
+
+
+def mpg_box_figure(state, rows):
+    box = cube.box_stats(state, "mpg", "fuelType", rows)
+    return box_figure(box, "fuelType", PALETTE, cube.outliers("mpg", box, "fuelType", rows))
+
+
+def engine_counts(stats):
+    ec = stats.counts("engineSize").sort_index()
+    ec.index = ec.index.to_series().astype(str) + "L"
+    return ec
+
+
+def engine_donut_figure(stats):
+    fig = donut(engine_counts(stats), "Engine (L)", 0.5)
+    return fig.update_traces(textinfo="percent+label", textfont_size=11)
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  FIGURES — PRICING TAB
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+def scatter_figure(rows):
+    return tiered_scatter(raw_df, rows, PALETTE, opacity=0.65)
+
+
+def mileage_hist_figure(state, rows):
+    edges, hist = cube.histogram(state, "mileage", rows)
+    # with the rows, small selections get exact quartiles
+    box = cube.box_stats(state, "mileage", rows=rows)
+    fig = binned_histogram(edges, hist, box.iloc[0] if len(box) else None, "mileage", BMW_BLUE)
+    return fig.update_traces(marker_line_width=0)
+
+
+def price_violin_figure(state, rows):
+    return violin_figure(cube.violins(state, "price", "fuelType", rows), "fuelType", PALETTE)
+
+
+def heatmap_figure(stats):
+    return heatmap(stats["fuelType", "year"].pivot(index="fuelType", columns="year", values="price_mean"))
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  FIGURES — INVENTORY TAB
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+def top_models_figure(stats):
+    fig = ranked_bar(stats.counts("model").head(12), "Model", "Count")
+    return fig.update_traces(marker_line_width=0, textposition="outside", marker_cornerradius=4)
+
+
+def engine_pie_figure(stats):
+    fig = donut(engine_counts(stats), "Engine (L)", 0.5)
+    return fig.update_traces(textinfo="percent+label", textfont_size=11)
+
+
+def treemap_figure(stats):
+    tree = stats["model", "transmission"][["model", "transmission", "count"]]
     tree = tree.sort_values("count", ascending=False).head(40)
-    fig = px.treemap(tree, path=["model", "transmission"], values="count",
-                     color="count", color_continuous_scale=["#0f172a", BMW_BLUE, CYAN])
-    fig.update_layout(**CHART_TPL, height=460, coloraxis_showscale=False)
-    fig.update_traces(marker_line_width=1, marker_line_color="rgba(255,255,255,0.06)",
-                      textfont_size=13)
-    return apply_grid(fig)
-
-
-@callback(Output("chart-sunburst", "figure"),
-          Input("filter-year", "value"), Input("filter-fuel", "value"),
-          Input("filter-trans", "value"), Input("filter-price", "value"),
-          Input("filter-model", "value"), Input("main-tabs", "active_tab"))
-def chart_sunburst(yr, fu, tr, pr, mo, tab):
-    if tab != "tab-inventory":
-        raise dash.exceptions.PreventUpdate
-    dff = filter_df(yr, fu, tr, pr, mo)
-    sun = dff.assign(engine_label=dff["engineSize"].astype(str) + "L")
-    sun = sun.groupby(["fuelType", "transmission", "engine_label"]).size().reset_index(name="count")
-    fig = px.sunburst(sun, path=["fuelType", "transmission", "engine_label"],
-                      values="count", color_discrete_sequence=PALETTE)
-    fig.update_layout(**CHART_TPL, height=450)
-    fig.update_traces(textfont_size=12)
-    return apply_grid(fig)
-
-
-@callback(Output("chart-efficiency", "figure"),
-          Input("filter-year", "value"), Input("filter-fuel", "value"),
-          Input("filter-trans", "value"), Input("filter-price", "value"),
-          Input("filter-model", "value"), Input("main-tabs", "active_tab"))
-def chart_efficiency(yr, fu, tr, pr, mo, tab):
-    if tab != "tab-inventory":
-        raise dash.exceptions.PreventUpdate
-    dff = filter_df(yr, fu, tr, pr, mo)
-    eff = dff.groupby("fuelType").agg(
-        mpg=("mpg", "mean"), tax=("tax", "mean"),
-        count=("price", "count"), price=("price", "mean"),
-    ).reset_index()
-    fig = px.scatter(eff, x="mpg", y="tax", size="count", color="fuelType",
-                     hover_data=["price"], color_discrete_sequence=PALETTE, size_max=55)
-    fig.update_layout(**CHART_TPL, height=450,
-                      xaxis_title="Avg MPG", yaxis_title="Avg Tax (£)")
-    return apply_grid(fig)
+    sectors = hierarchy(tree, ["model", "transmission"], "count", color="count")
+    return go.Figure(go.Treemap(
+        ids=sectors["ids"], labels=sectors["labels"], parents=sectors["parents"],
+        values=sectors["values"], branchvalues="total", textfont_size=13,
+        marker=dict(colors=sectors["colors"], coloraxis="coloraxis",
+                    line=dict(width=1, color="rgba(255,255,255,0.06)")),
+        hovertemplate="%{label}<br>count=%{value}<br>parent=%{parent}<extra></extra>",
+    ))
+
+
+def sunburst_figure(stats):
+    sun = stats["fuelType", "transmission", "engineSize"]
+    sun = sun.assign(engine_label=sun["engineSize"].astype(str) + "L")
+    sectors = hierarchy(sun, ["fuelType", "transmission", "engine_label"], "count")
+    return go.Figure(go.Sunburst(
+        ids=sectors["ids"], labels=sectors["labels"], parents=sectors["parents"],
+        values=sectors["values"], branchvalues="total", textfont_size=12,
+        hovertemplate="%{label}<br>count=%{value}<br>parent=%{parent}<extra></extra>",
+    ))
+
+
+def efficiency_figure(stats):
+    eff = stats["fuelType"].rename(
+        columns={"mpg_mean": "mpg", "tax_mean": "tax", "price_mean": "price"})
+    return bubble_figure(eff, "mpg", "tax", "count", "fuelType", PALETTE, size_max=55, hover=["price"])
+
+
+def overview_figures(yr, fu, tr, pr, mo):
+    state, rows = filter_state(yr, fu, tr, pr, mo), select_rows(yr, fu, tr, pr, mo).rows
+    stats = tab_stats(yr, fu, tr, pr, mo, "overview")
+    return (fuel_bar_figure(stats), trans_donut_figure(stats), price_trend_figure(stats),
+            mpg_box_figure(state, rows), engine_donut_figure(stats))
+
+
+def pricing_figures(yr, fu, tr, pr, mo):
+    state, rows = filter_state(yr, fu, tr, pr, mo), select_rows(yr, fu, tr, pr, mo).rows
+    stats = tab_stats(yr, fu, tr, pr, mo, "pricing")
+    return mileage_hist_figure(state, rows), heatmap_figure(stats)
+
+
+def inventory_figures(yr, fu, tr, pr, mo):
+    stats = tab_stats(yr, fu, tr, pr, mo, "inventory")
+    return top_models_figure(stats), engine_pie_figure(stats), efficiency_figure(stats)
+
+
+# the slow charts, one figure each (see CHART JOBS)
+def scatter_chart(yr, fu, tr, pr, mo):
+    return scatter_figure(select_rows(yr, fu, tr, pr, mo).rows)
+
+
+def violin_chart(yr, fu, tr, pr, mo):
+    state, rows = filter_state(yr, fu, tr, pr, mo), select_rows(yr, fu, tr, pr, mo).rows
+    return price_violin_figure(state, rows)
+
+
+def treemap_chart(yr, fu, tr, pr, mo):
+    return treemap_figure(tab_stats(yr, fu, tr, pr, mo, "inventory"))
+
+
+def sunburst_chart(yr, fu, tr, pr, mo):
+    return sunburst_figure(tab_stats(yr, fu, tr, pr, mo, "inventory"))
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  FIGURE SKELETONS
+#  Template, theme, axes and legends never change with the filters.
+#  Each chart's styled layout is built once, here, and ships with its
+#  tab (chart_card); a filter change only sends a dash.Patch with the
+#  new traces plus the layout entries that follow the data.
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+LEGEND_BELOW = dict(orientation="h", x=0.5, xanchor="center")
+RANK_SCALE   = ["#0f172a", BMW_BLUE, CYAN]
+
+# graph id → (height, data-driven layout entries, static layout)
+CHARTS = {
+    "chart-fuel-bar":     (370, (), dict(showlegend=False, xaxis_title="Fuel Type", yaxis_title="Count")),
+    "chart-trans-donut":  (370, (), dict(showlegend=True, piecolorway=PALETTE, legend=dict(LEGEND_BELOW, y=-0.15))),
+    "chart-price-trend":  (380, (), dict(xaxis=dict(title="Year", dtick=1),
+                                         yaxis=dict(title="Avg Price (£)", tickprefix="£", separatethousands=True))),
+    "chart-mpg-box":      (370, (), dict(showlegend=False, xaxis_title="Fuel Type", yaxis_title="MPG")),
+    "chart-engine-donut": (370, (), dict(piecolorway=PALETTE, legend=dict(LEGEND_BELOW, y=-0.2))),
+    "chart-scatter":      (440, FOLLOWS[tiered_scatter], dict(xaxis_title="Mileage", yaxis_title="Price (£)",
+                                                               legend=dict(LEGEND_BELOW, y=-0.18))),
+    "chart-mileage-hist": (440, FOLLOWS[binned_histogram], dict(xaxis_title="Mileage", yaxis_title="Frequency",
+                                                                bargap=0.03)),
+    "chart-violin":       (420, FOLLOWS[violin_figure], dict(showlegend=False, xaxis_title="Fuel Type",
+                                                             yaxis_title="Price (£)")),
+    "chart-heatmap":      (350, (), dict(xaxis_title="Year", yaxis=dict(title="Fuel Type", autorange="reversed"),
+                                         coloraxis=dict(colorscale=sequential.Blues,
+                                                        colorbar=dict(title="Avg £", tickprefix="£")))),
+    "chart-top-models":   (480, (), dict(xaxis_title="Count", yaxis=dict(title="Model", autorange="reversed"),
+                                         coloraxis=dict(colorscale=RANK_SCALE, showscale=False))),
+    "chart-engine-pie":   (480, (), dict(piecolorway=PALETTE, legend=dict(LEGEND_BELOW, y=-0.2))),
+    "chart-treemap":      (460, (), dict(coloraxis=dict(colorscale=RANK_SCALE, showscale=False))),
+    "chart-sunburst":     (450, (), dict(sunburstcolorway=PALETTE)),
+    "chart-efficiency":   (450, (), dict(xaxis_title="Avg MPG", yaxis_title="Avg Tax (£)",
+                                         legend=dict(title="fuelType", itemsizing="constant"))),
+}
+
+TAB_FIGURES = {
+    "overview":  (overview_figures, ["chart-fuel-bar", "chart-trans-donut", "chart-price-trend",
+                                     "chart-mpg-box", "chart-engine-donut"]),
+    "pricing":   (pricing_figures, ["chart-mileage-hist", "chart-heatmap"]),
+    "inventory": (inventory_figures, ["chart-top-models", "chart-engine-pie", "chart-efficiency"]),
+}
+
+# graph id → builder of the slow charts, each served by its own job
+CHART_JOBS = {
+    "chart-scatter":  scatter_chart,
+    "chart-violin":   violin_chart,
+    "chart-treemap":  treemap_chart,
+    "chart-sunburst": sunburst_chart,
+}
+
+
+def skeleton(fig, graph_id):
+    """``fig`` styled as chart ``graph_id``, without its traces."""
+    height, _, layout = CHARTS[graph_id]
+    fig.update_layout(**CHART_TPL, height=height, **layout)
+    return {"data": [], "layout": apply_grid(fig).to_dict()["layout"]}
+
+
+def chart_spec(fig, graph_id):
+    """What chart ``graph_id`` takes from ``fig``: its traces, plus the
+    layout entries that follow the data (by dotted path)."""
+    spec = fig.to_dict()
+    return {"data": spec["data"],
+            "layout": {path: layout_value(spec["layout"], path) for path in CHARTS[graph_id][1]}}
+
+
+def figure_patch(spec):
+    """A dash.Patch giving a chart the traces and layout entries of ``spec``."""
+    patch = dash.Patch()
+    patch["data"] = spec["data"]
+    for path, value in spec["layout"].items():
+        *parents, key = path.split(".")
+        node = patch["layout"]
+        for p in parents:
+            node = node[p]
+        node[key] = value
+    return patch
+
+
+def server_charts(tab):
+    """The charts of ``tab`` its server callback patches."""
+    return [g for g in TAB_FIGURES[tab][1] if g not in CLIENT_CHARTS]
+
+
+def tab_specs(tab, *filters):
+    """chart_spec of every chart of ``tab``, through the figure cache."""
+    build, graph_ids = TAB_FIGURES[tab]
+    return figure_cache.get_or_compute(
+        tab, filter_state(*filters),
+        lambda: tuple(chart_spec(fig, g) for g, fig in zip(graph_ids, build(*filters))))
+
+
+def tab_patches(tab, *filters):
+    return tuple(figure_patch(spec) for g, spec in zip(TAB_FIGURES[tab][1], tab_specs(tab, *filters))
+                 if g not in CLIENT_CHARTS)
+
+
+def trace_template(fig, fields):
+    """The trace of ``fig`` without the data ``fields`` the browser fills in."""
+    trace = fig.to_dict()["data"][0]
+    for path in fields:
+        *parents, key = path.split(".")
+        node = trace
+        for p in parents:
+            node = node[p]
+        node.pop(key, None)
+    return trace
+
+
+# ── Browser-side mode ─────────────────────────────────────────
+# BMW_CLIENTSIDE=1 serves the KPI row and these charts from a copy of
+# the filter columns in the page (assets/bmw_clientside.js): graph id →
+# the data fields of its trace that the browser fills in.
+CLIENTSIDE = (os.environ.get("BMW_CLIENTSIDE") == "1"
+              and len(raw_df) <= int(os.environ.get("BMW_CLIENTSIDE_MAX_ROWS", "400000")))
+CLIENT_CHARTS = {
+    "chart-fuel-bar":    ("x", "y", "marker.color"),
+    "chart-trans-donut": ("labels", "values", "pull"),
+    "chart-price-trend": ("x", "y"),
+    "chart-top-models":  ("x", "y", "marker.color"),
+} if CLIENTSIDE else {}
+CLIENT_COLUMNS = ["year", "price", "mileage", "mpg", "engineSize", "fuelType", "transmission", "model"]
+
+# built from the unfiltered data, so data-driven entries start sensible
+FULL_FILTERS = ([int(raw_df["year"].min()), int(raw_df["year"].max())], [], [],
+                [int(raw_df["price"].min()), int(raw_df["price"].max())], [])
+SKELETONS, CLIENT_TRACES = {}, {}
+for _build, _graph_ids in TAB_FIGURES.values():
+    for _graph_id, _fig in zip(_graph_ids, _build(*FULL_FILTERS)):
+        if _graph_id in CLIENT_CHARTS:
+            CLIENT_TRACES[_graph_id] = trace_template(_fig, CLIENT_CHARTS[_graph_id])
+        SKELETONS[_graph_id] = skeleton(_fig, _graph_id)
+SKELETONS.update({g: skeleton(build(*FULL_FILTERS), g) for g, build in CHART_JOBS.items()})
+
+CLIENT_DATA = {"dataset": bmw_blob.encode(raw_df, CLIENT_COLUMNS), "traces": CLIENT_TRACES,
+               "palette": PALETTE} if CLIENTSIDE else None
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  CALLBACKS — one per page region
+#  The header reacts to the filters, the tab shell to the tab switch,
+#  and each tab has a single callback returning its quick figures;
+#  the slow charts (CHART JOBS) get one callback each.  A tab's callback
+#  outputs exist only while it is rendered, so the renderer never sends
+#  requests for hidden tabs.
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+FILTERS = [Input("filter-year", "value"), Input("filter-fuel", "value"),
+           Input("filter-trans", "value"), Input("filter-price", "value"),
+           Input("filter-model", "value")]
+SESSION = State("session-id", "data")
+
+
+SUMMARY = [Output("hero-subtitle", "children"), Output("kpi-row", "children")]
+
+
+def update_summary(year_range, fuels, trans, price_range, models, session):
+    # every filter change and page load runs this callback once: the
+    # warm-up counts requests here (the tab callbacks only count them in
+    # browser-side mode, which has no summary callback)
+    warmup.record(filter_state(year_range, fuels, trans, price_range, models))
+    with latest_only(session, "summary"):
+        return summary(year_range, fuels, trans, price_range, models)
+
+
+def summary(year_range, fuels, trans, price_range, models):
+    n_filtered, means = kpi_numbers(year_range, fuels, trans, price_range, models)
+    n_total = len(raw_df)
+
+    # ── Hero subtitle ────────────────────────────
+    subtitle = f"Real-time analytics across {n_filtered:,} listings from a universe of {n_total:,} vehicles"
+
+    # ── KPIs ─────────────────────────────────────
+    avg_price   = means["price"]
+    avg_mileage = means["mileage"]
+    avg_mpg     = means["mpg"]
+    avg_engine  = means["engineSize"]
+
+    kpis = [
+        kpi_card("💷", kpi_text(avg_price, ",.0f", "£"),          "Avg Price",   "blue"),
+        kpi_card("🛣️", kpi_text(avg_mileage, ",.0f"),             "Avg Mileage", "cyan"),
+        kpi_card("⛽", kpi_text(avg_mpg, ".1f"),                  "Avg MPG",     "green"),
+        kpi_card("🔧", kpi_text(avg_engine, ".1f", suffix="L"),   "Avg Engine",  "amber"),
+    ]
+    return subtitle, kpis
+
+
+def kpi_numbers(year_range, fuels, trans, price_range, models):
+    """(listings, measure means) of the selection, through the figure cache."""
+    state = filter_state(year_range, fuels, trans, price_range, models)
+
+    def compute():
+        sel = select_rows(year_range, fuels, trans, price_range, models)
+        return sel.count, cube.means(state, sel.rows)
+    return figure_cache.get_or_compute("summary", state, compute)
+
+
+if not CLIENTSIDE:
+    callback(*SUMMARY, *FILTERS, SESSION)(update_summary)
+
+
+@callback(Output("tab-content", "children"), Input("main-tabs", "active_tab"))
+def render_tab(active_tab):
+    if active_tab == "tab-overview":
+        return make_overview()
+    if active_tab == "tab-pricing":
+        return make_pricing()
+    if active_tab == "tab-inventory":
+        return make_inventory()
+    return make_data_explorer()
+
+
+@callback(*[Output(g, "figure") for g in server_charts("overview")], *FILTERS, SESSION)
+def update_overview(yr, fu, tr, pr, mo, session):
+    if CLIENTSIDE:
+        warmup.record(filter_state(yr, fu, tr, pr, mo))
+    with latest_only(session, "overview"):
+        return tab_patches("overview", yr, fu, tr, pr, mo)
+
+
+@callback(*[Output(g, "figure") for g in server_charts("pricing")], *FILTERS, SESSION)
+def update_pricing(yr, fu, tr, pr, mo, session):
+    if CLIENTSIDE:
+        warmup.record(filter_state(yr, fu, tr, pr, mo))
+    with latest_only(session, "pricing"):
+        return tab_patches("pricing", yr, fu, tr, pr, mo)
+
+
+@callback(*[Output(g, "figure") for g in server_charts("inventory")], *FILTERS, SESSION)
+def update_inventory(yr, fu, tr, pr, mo, session):
+    if CLIENTSIDE:
+        warmup.record(filter_state(yr, fu, tr, pr, mo))
+    with latest_only(session, "inventory"):
+        return tab_patches("inventory", yr, fu, tr, pr, mo)
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  BROWSER-SIDE MODE
+#  With BMW_CLIENTSIDE=1 (datasets up to BMW_CLIENTSIDE_MAX_ROWS) the
+#  page holds the filter columns as a dictionary-encoded, gzipped blob
+#  (bmw_blob) in the "client-data" store, sent once with the layout.
+#  The KPI row and the CLIENT_CHARTS are then computed in the browser
+#  (assets/bmw_clientside.js): a filter change costs those no request,
+#  and the server callbacks above only cover the remaining charts.
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+if CLIENTSIDE:
+    CLIENT_DATA_STATE = State("client-data", "data")
+    app.clientside_callback(ClientsideFunction("bmw", "summary"),
+                            *SUMMARY, *FILTERS, CLIENT_DATA_STATE)
+    app.clientside_callback(ClientsideFunction("bmw", "overview"),
+                            *[Output(g, "figure") for g in TAB_FIGURES["overview"][1] if g in CLIENT_CHARTS],
+                            *FILTERS, CLIENT_DATA_STATE,
+                            *[State(g, "figure") for g in TAB_FIGURES["overview"][1] if g in CLIENT_CHARTS])
+    app.clientside_callback(ClientsideFunction("bmw", "inventory"),
+                            Output("chart-top-models", "figure"),
+                            *FILTERS, CLIENT_DATA_STATE, State("chart-top-models", "figure"))
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  CHART JOBS
+#  On big datasets the scatter, violin, treemap and sunburst run as
+#  background callbacks: each job is a process forked from this one
+#  (it shares the dataset's pages), tracked in a local diskcache — no
+#  Redis or Celery.  Re-triggering a chart while its job runs makes the
+#  renderer send the old job along, and dash terminates it, so a slider
+#  dragged through five positions leaves one job, not five; leaving the
+#  tab cancels it too.  While a job runs the chart dims and a progress
+#  strip fills above it.  Below BACKGROUND_ROWS the fork and the polling
+#  cost more than the chart, and the same callbacks run in-request.
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+BACKGROUND_ROWS = int(os.environ.get("BMW_BACKGROUND_ROWS", "200000"))
+BACKGROUND = len(raw_df) >= BACKGROUND_ROWS
+JOB_POLL_MS = int(os.environ.get("BMW_JOB_POLL_MS", "250"))
+
+if BACKGROUND:
+    import diskcache
+    job_manager = dash.DiskcacheManager(diskcache.Cache(
+        os.environ.get("BMW_JOB_CACHE", os.path.join(tempfile.gettempdir(), "bmw-dash-jobs"))))
+
+
+def job_progress(step, total, label):
+    return {"width": f"{100 * step // total}%"}, label
+
+
+def job_spec(graph_id, yr, fu, tr, pr, mo, set_progress=lambda _: None):
+    """chart_spec of the slow chart ``graph_id``, through the figure cache."""
+    def compute():
+        set_progress(job_progress(1, 3, "Selecting listings…"))
+        fig = CHART_JOBS[graph_id](yr, fu, tr, pr, mo)
+        set_progress(job_progress(2, 3, "Drawing…"))
+        return chart_spec(fig, graph_id)
+    # a job process's memory tier dies with it; the store keeps its work
+    return figure_cache.get_or_compute(graph_id, filter_state(yr, fu, tr, pr, mo), compute)
+
+
+def chart_job(graph_id):
+    """Register the callback serving the slow chart ``graph_id``."""
+    running = [(Output(graph_id, "className"), "chart-busy", ""),
+               (Output(f"{graph_id}-job", "className"), "chart-job active", "chart-job")]
+
+    def run(set_progress, yr, fu, tr, pr, mo, session):
+        return figure_patch(job_spec(graph_id, yr, fu, tr, pr, mo, set_progress))
+
+    if not BACKGROUND:
+        def serve(yr, fu, tr, pr, mo, session):
+            with latest_only(session, graph_id):
+                return run(lambda _: None, yr, fu, tr, pr, mo, session)
+        return callback(Output(graph_id, "figure"), *FILTERS, SESSION, running=running)(serve)
+    # in the background the renderer's oldJob already retires superseded jobs
+    return callback(
+        Output(graph_id, "figure"), *FILTERS, SESSION,
+        background=True, manager=job_manager, interval=JOB_POLL_MS, running=running,
+        progress=[Output(f"{graph_id}-job-bar", "style"), Output(f"{graph_id}-job-label", "children")],
+        progress_default=[{"width": "0%"}, ""],
+        cancel=[Input("main-tabs", "active_tab")],
+    )(run)
+
+
+for _graph_id in CHART_JOBS:
+    chart_job(_graph_id)
+
+
+@callback(
+    Output("data-table", "data"), Output("data-table", "page_count"),
+    Output("data-count", "children"), Output("data-stats", "data"),
+    Input("data-table", "page_current"), Input("data-table", "page_size"),
+    Input("data-table", "sort_by"), Input("data-table", "filter_query"),
+    *FILTERS, SESSION,
+)
+def update_data_explorer(page_current, page_size, sort_by, filter_query, yr, fu, tr, pr, mo, session):
+    with latest_only(session, "data"):
+        return data_explorer(page_current, page_size, sort_by, filter_query, yr, fu, tr, pr, mo)
+
+
+def data_explorer(page_current, page_size, sort_by, filter_query, yr, fu, tr, pr, mo):
+    ordered = table_rows(yr, fu, tr, pr, mo, sort_by, filter_query)
+    pages = bmw_table.page_count(len(ordered), page_size)
+    page_current = min(page_current or 0, pages - 1)
+    data = bmw_table.page(raw_df, ordered, page_current, page_size, TABLE_COLUMNS)
+    count = f"Showing {len(ordered):,} records — use sidebar to refine"
+    if dash.ctx.triggered_id == "data-table":
+        # paging / sorting / the table's own filter leave the selection as is
+        return data, pages, count, dash.no_update
+
+    return data, pages, count, figure_cache.get_or_compute(
+        "data-stats", filter_state(yr, fu, tr, pr, mo), lambda: describe(yr, fu, tr, pr, mo))
+
+
+def describe(yr, fu, tr, pr, mo):
+    sel = select_rows(yr, fu, tr, pr, mo)
+    stats_df = raw_df.take(sel.rows).describe().T.reset_index().rename(columns={"index": "Column"})
+    for c in stats_df.columns[1:]:
+        stats_df[c] = stats_df[c].apply(lambda x: f"{x:,.1f}")
+    return stats_df.to_dict("records")
+
+
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  WARM-UP
+#  In the serving process — the dev server, or each gunicorn worker
+#  right after its fork — a background thread computes the KPIs, every
+#  tab's figures and the slow charts of the default view and the
+#  popular one-filter views (bmw_warmup) into the figure cache, and so
+#  into the host's result store: a piece another worker has already
+#  stored is read, not computed again.  It works one piece
+#  at a time, in a compute slot, and only while no request is queued or
+#  computing: a visitor waits for at most the piece in progress.
+#  /_stats/cache reports how many of the first requests found their
+#  view warm.
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+def warm(yr, fu, tr, pr, mo):
+    pieces = [lambda: kpi_numbers(yr, fu, tr, pr, mo)]
+    pieces += [lambda tab=tab: tab_specs(tab, yr, fu, tr, pr, mo) for tab in TAB_FIGURES]
+    pieces += [lambda g=g: job_spec(g, yr, fu, tr, pr, mo) for g in CHART_JOBS]
+    for piece in pieces:
+        while coalescer.busy():
+            time.sleep(0.02)
+        with coalescer.admit(None):
+            piece()
+
+
+warmup = bmw_warmup.Warmup(bmw_warmup.warm_filters(raw_df), warm, filter_state)
+
+
+def init():
+    """Get the serving process ready — run from __main__ and, under
+    gunicorn, in each worker after its fork (post_fork), never on import.
+
+    Dash finishes its setup — the callback map, asset and script lists —
+    in a before_request hook that marks itself done before it is: two
+    first requests on a threaded worker can find callbacks missing, so
+    one request settles it here.  Then the warm-up thread starts, once
+    (not in a preloading master, where fork() would drop it).
+    """
+    server.test_client().get("/_dash-dependencies")
+    if bmw_warmup.ENABLED and warmup.started is None:
+        warmup.start()
 
 
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 #  RUN
 # ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 if __name__ == "__main__":
+    init()
     app.run(debug=True, port=8050)
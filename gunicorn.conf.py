@@ -0,0 +1,45 @@
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  BMW Used Car Intelligence — gunicorn deployment of dash_app
+# ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+#  Preload-and-fork: the master imports dash_app once — maps the
+#  sidecar, builds the indexes, the cube and the chart skeletons — and
+#  forks every worker from that, so the workers start with all of it in
+#  shared copy-on-write pages instead of each building a private copy.
+#  The master forks at once; each worker runs dash_app.init() (post_fork)
+#  and warms up in a background thread while it already serves, reading
+#  the views other workers have warmed from the host's result store.
+#
+#  Two things copy shared pages back into a worker one by one: the
+#  cyclic GC, which writes to the header of every container it scans,
+#  and reference counting, which writes to every object a request
+#  touches.  Right before forking, the master collects once and calls
+#  gc.freeze(), which puts everything it built out of the collector's
+#  reach; and the bulk data — columns, bitmaps, sort orders, cube codes
+#  and sketches — is numpy buffers (the columns file-backed memory
+#  maps), with one refcount per array rather than one per value.
+#
+#      gunicorn dash_app:server                 # reads this file from the cwd
+#      BMW_WORKERS=16 gunicorn dash_app:server
+#      BMW_PRELOAD=0 gunicorn dash_app:server   # every worker imports dash_app itself
+#
+#  bench_memory.py measures per-worker USS / PSS in each mode.
+import gc
+import os
+
+bind = os.environ.get("BMW_BIND", "127.0.0.1:8050")
+workers = int(os.environ.get("BMW_WORKERS", str(os.cpu_count() or 1)))
+worker_class = "gthread"
+threads = int(os.environ.get("BMW_THREADS", "4"))
+preload_app = os.environ.get("BMW_PRELOAD", "1") != "0"
+gc_freeze = preload_app and os.environ.get("BMW_GC_FREEZE", "1") != "0"
+
+
+def pre_fork(server, worker):
+    if gc_freeze:
+        gc.collect()   # the startup garbage, while it can still be freed
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    import dash_app   # preloaded: a lookup; otherwise the worker's own import
+    dash_app.init()
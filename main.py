@@ -1,14 +1,12 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 
+from bmw_data import load_bmw, counts
+
 def main():
-    df = pd.read_csv('bmw.csv')
-   
-    df.dropna(inplace=True)
-    df.drop_duplicates(inplace=True)
+    df = load_bmw()
     
     # 1. Bar Chart: Count of cars by fuel type
-    fuel_counts = df['fuelType'].value_counts()
+    fuel_counts = counts(df['fuelType'])
     plt.figure(figsize=(10, 6))
     plt.bar(fuel_counts.index, fuel_counts.values, color=['blue', 'green', 'orange', 'red', 'purple'])
     plt.xlabel('Fuel Type')
@@ -17,7 +15,7 @@ def main():
     plt.tight_layout()
     
     # 2. Pie Chart: Distribution by transmission type
-    transmission_counts = df['transmission'].value_counts()
+    transmission_counts = counts(df['transmission'])
     plt.figure(figsize=(8, 8))
     plt.pie(transmission_counts.values, labels=transmission_counts.index, autopct='%1.1f%%', 
             colors=['skyblue', 'lightgreen', 'salmon'])
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from bmw_data import CSV_PATH, parse_csv
+from bmw_index import FilterState
+
+N_STATES = 300
+
+
+@pytest.fixture(scope="session")
+def df():
+    # parsed in-process: the tests never write the sidecar
+    return parse_csv(CSV_PATH)
+
+
+@pytest.fixture(scope="session")
+def states(df):
+    """Random filter states: ranges from empty to whole, value filters
+    unset (None), a random subset, or matching nothing (empty tuple)."""
+    rng = np.random.default_rng(0)
+
+    def span(col):
+        lo, hi = int(df[col].min()), int(df[col].max())
+        a, b = sorted(rng.integers(lo - 2, hi + 3, size=2))
+        return (lo, hi) if rng.random() < 0.3 else (int(a), int(b))
+
+    def values(col):
+        labels = df[col].cat.categories
+        r = rng.random()
+        if r < 0.4:
+            return None
+        if r < 0.45:
+            return ()
+        return rng.choice(labels, size=rng.integers(1, len(labels) + 1), replace=False).tolist()
+
+    return [FilterState.make(span("year"), span("price"), values("fuelType"),
+                             values("transmission"), values("model"))
+            for _ in range(N_STATES)]
+
+
+def reference_mask(df, state):
+    """The rows ``state`` selects, the way pandas would filter them."""
+    mask = df["year"].between(*state.year) & df["price"].between(*state.price)
+    for col in ("fuelType", "transmission", "model"):
+        values = getattr(state, col)
+        if values is not None:
+            mask &= df[col].isin(values)
+    return mask.to_numpy()
+
+
+def reference_rollup(df, mask, by, measures):
+    """``count`` plus ``<measure>_mean`` / ``_std`` per group, via groupby."""
+    g = df[mask].groupby(list(by), observed=True, sort=True)
+    out = g.size().rename("count").to_frame()
+    for m in measures:
+        out[f"{m}_mean"] = g[m].mean().astype(np.float64)
+        out[f"{m}_std"] = g[m].std().astype(np.float64)
+    return out.reset_index()
+
+
+def on_grid(cube, state):
+    """``state`` with its price range snapped out to the cube's bucket
+    grid, so the cube answers it from the cells alone."""
+    lo, hi = state.price
+    step, origin = cube.price_step, cube.price_origin
+    lo = origin + (lo - origin) // step * step
+    hi = origin - (origin - hi) // step * step
+    return state._replace(price=(lo, hi))
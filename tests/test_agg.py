@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+import bmw_agg
+from bmw_agg import TABS, group
+from bmw_cube import Cube
+from bmw_index import DatasetIndex
+from conftest import on_grid, reference_mask, reference_rollup
+
+
+@pytest.fixture(scope="module")
+def cube(df):
+    return Cube(df)
+
+
+@pytest.fixture(scope="module")
+def index(df):
+    return DatasetIndex(df)
+
+
+def assert_frames_close(got, want, msg):
+    assert list(got.columns) == list(want.columns), msg
+    assert len(got) == len(want), msg
+    for col in got.columns:
+        if got[col].dtype.kind in "fi":
+            np.testing.assert_allclose(got[col].to_numpy(np.float64), want[col].to_numpy(np.float64),
+                                       rtol=1e-6, atol=1e-2, err_msg=f"{col} {msg}")
+        else:
+            assert list(got[col]) == list(want[col]), f"{col} {msg}"
+
+
+@pytest.mark.parametrize("tab", list(TABS))
+def test_fused_tab_matches_groupby(df, cube, index, states, tab):
+    spec = TABS[tab]
+    for state in states[:60]:
+        got = cube.tab(state, tab, index.select(state).rows)
+        mask = reference_mask(df, state)
+        for by in spec["groupings"]:
+            want = reference_rollup(df, mask, by, spec["measures"])
+            assert_frames_close(got[by], want, f"{by} {state}")
+
+
+@pytest.mark.parametrize("tab", list(TABS))
+def test_cells_match_rows(cube, index, states, tab):
+    # the same fused pass over cube cells and over raw listings
+    spec = TABS[tab]
+    for state in states[:60]:
+        state = on_grid(cube, state)
+        rows = index.select(state).rows
+        cells = cube.aggregate(state, spec["groupings"], measures=spec["measures"])
+        listings = cube.aggregate_rows(rows, spec["groupings"], spec["measures"])
+        for by in spec["groupings"]:
+            assert_frames_close(cells[by], listings[by], f"{by} {state}")
+
+
+def test_fuse_matches_one_group_per_grouping(cube):
+    rows = np.arange(cube.n)
+    groupings = TABS["inventory"]["groupings"]
+    values = {m: cube.df[m].to_numpy()[rows].astype(np.float64) for m in ("price", "mpg")}
+    sumsq = {m: v * v for m, v in values.items()}
+    fused = cube.aggregate_rows(rows, groupings, list(values))
+    for by in groupings:
+        alone = group(cube.labels, by, {dim: cube.row_codes[dim] for dim in by},
+                      np.ones(cube.n), values, sumsq)
+        assert_frames_close(fused[by], alone, by)
+
+
+def test_sparse_bins_match_dense(cube, index, states, monkeypatch):
+    groupings = TABS["inventory"]["groupings"]
+    rows = [index.select(state).rows for state in states[:30]]
+    dense = [cube.aggregate_rows(r, groupings) for r in rows]
+    monkeypatch.setattr(bmw_agg, "DENSE_BINS", 0)
+    for r, want in zip(rows, dense):
+        got = cube.aggregate_rows(r, groupings)
+        for by in groupings:
+            assert_frames_close(got[by], want[by], by)
@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from bmw_charts import FOLLOWS, binned_histogram, swap_traces
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOX = {"count": 3, "q1": 2.0, "median": 3.0, "q3": 4.0, "lowerfence": 1.0, "upperfence": 5.0}
+
+
+def marginal_axes_resolve(fig):
+    layout = fig.layout.to_plotly_json()
+    for trace in fig.data:
+        for axis in (trace.xaxis or "x", trace.yaxis or "y"):
+            name = axis[0] + "axis" + axis[1:]
+            assert name in ("xaxis", "yaxis") or name in layout, f"{trace.type} on missing {name}"
+
+
+def test_histogram_skeleton_from_empty_selection():
+    edges = np.linspace(0, 100, 5)
+    skeleton = binned_histogram(edges, np.zeros(4), None, "mileage", "#1C69D4")
+    fig = binned_histogram(edges, np.arange(4), BOX, "mileage", "#1C69D4")
+    swapped = swap_traces(skeleton, fig, FOLLOWS[binned_histogram])
+    assert [t.type for t in swapped.data] == ["bar", "box"]
+    marginal_axes_resolve(swapped)
+    assert swapped.layout.yaxis.domain == fig.layout.yaxis.domain
+
+
+@pytest.mark.parametrize("script, tab", [("app1.py", "💰  Pricing Deep-Dive"), ("app.py", "Price Analysis")])
+def test_app_mileage_after_widening_empty_filter(script, tab, monkeypatch):
+    monkeypatch.setenv("BMW_SHARED_CACHE", "off")
+    monkeypatch.setenv("BMW_WARMUP", "0")
+    at = AppTest.from_file(os.path.join(ROOT, script), default_timeout=120)
+    at.run()
+    fuels = at.multiselect[0].value
+    for value in ([], fuels):   # the skeleton comes from the empty selection
+        at.multiselect[0].set_value(value)
+        at.session_state["active_tab"] = tab
+        at.run()
+    assert not at.exception
+    fig = at.session_state["chart_skeletons"]["mileage"]
+    assert [t.type for t in fig.data] == ["bar", "box"]
+    marginal_axes_resolve(fig)
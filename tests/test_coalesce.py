@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+from bmw_coalesce import Coalescer, Superseded
+
+
+def run(coalescer, key, started=None, release=None, log=None, name=None):
+    """Start one request in a thread; ``log`` records "ran"/"dropped" per name."""
+    def body():
+        try:
+            with coalescer.admit(key):
+                if started is not None:
+                    started.set()
+                if release is not None:
+                    release.wait(5)
+                log[name] = "ran"
+        except Superseded:
+            log[name] = "dropped"
+    t = threading.Thread(target=body)
+    t.start()
+    return t
+
+
+def wait_inflight(coalescer, n):
+    deadline = time.monotonic() + 5
+    while coalescer.inflight < n:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+@pytest.mark.parametrize("waiting", [1, 2, 5])
+def test_waiting_requests_are_superseded_by_the_newest(waiting):
+    c, log = Coalescer(slots=4), {}
+    started, release = threading.Event(), threading.Event()
+    threads = [run(c, "k", started, release, log, "first")]
+    assert started.wait(5)
+    for i in range(waiting):
+        threads.append(run(c, "k", log=log, name=i))
+        wait_inflight(c, i + 2)
+    release.set()
+    for t in threads:
+        t.join(5)
+    # only the first (already running) and the newest request compute
+    assert log == {"first": "ran", **{i: "dropped" for i in range(waiting - 1)}, waiting - 1: "ran"}
+    assert c.stats() == {"admitted": 2, "dropped": waiting - 1, "active_keys": 0, "inflight": 0}
+
+
+@pytest.mark.parametrize("enabled, keys", [(True, ["a", "b", "c"]), (True, [None, None, None]),
+                                           (False, ["k", "k", "k"])])
+def test_unrelated_requests_all_run(enabled, keys):
+    c, log = Coalescer(slots=4, enabled=enabled), {}
+    started, release = threading.Event(), threading.Event()
+    first = run(c, keys[0], started, release, log, "first")
+    assert started.wait(5)
+    # nothing supersedes them, so they run while the first still holds its slot
+    for i, key in enumerate(keys[1:]):
+        run(c, key, log=log, name=i).join(5)
+        assert log[i] == "ran"
+    release.set()
+    first.join(5)
+    assert set(log.values()) == {"ran"} and len(log) == len(keys)
+    assert c.dropped == 0
+
+
+def test_slots_bound_concurrency():
+    c, lock = Coalescer(slots=2), threading.Lock()
+    active = peak = 0
+
+    def body(key):
+        nonlocal active, peak
+        with c.admit(key):
+            with lock:
+                active += 1
+                peak = max(peak, active)
+            time.sleep(0.01)
+            with lock:
+                active -= 1
+
+    threads = [threading.Thread(target=body, args=(f"k{i}",)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert peak == 2
+    assert c.stats()["admitted"] == 8 and not c.busy()
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from bmw_cube import MEASURES, Cube
+from bmw_data import counts
+from bmw_index import DatasetIndex
+from conftest import on_grid, reference_mask, reference_rollup
+
+
+@pytest.fixture(scope="module")
+def cube(df):
+    return Cube(df)
+
+
+@pytest.fixture(scope="module")
+def index(df):
+    return DatasetIndex(df)
+
+
+@pytest.fixture(scope="module")
+def selections(df, cube, index, states):
+    """(state, rows, reference mask) for each random state and for the
+    same state snapped onto the cube's price grid."""
+    out = []
+    for state in states[:100]:
+        for s in (state, on_grid(cube, state)):
+            out.append((s, index.select(s).rows, reference_mask(df, s)))
+    return out
+
+
+def test_grid_states_are_exact(cube, selections):
+    assert any(cube.exact(s) for s, _, _ in selections)
+    assert not all(cube.exact(s) for s, _, _ in selections)
+
+
+@pytest.mark.parametrize("by", [("fuelType",), ("model", "transmission"), ("year",),
+                                ("fuelType", "transmission", "engineSize")])
+def test_rollup_matches_groupby(df, cube, selections, by):
+    for state, rows, mask in selections:
+        got = cube.rollup(state, by, rows)
+        want = reference_rollup(df, mask, by, MEASURES)
+        assert len(got) == len(want), state
+        for dim in by:
+            assert list(got[dim]) == list(want[dim]), state
+        assert np.array_equal(got["count"], want["count"]), state
+        for m in MEASURES:
+            # sums of squares cancel to about 1e-8 of the values' scale
+            # when a group is (nearly) constant
+            atol = 1e-6 * float(df[m].abs().max())
+            for stat in ("mean", "std"):
+                col = f"{m}_{stat}"
+                np.testing.assert_allclose(got[col], want[col], rtol=1e-6, atol=atol,
+                                           err_msg=f"{col} {state}")
+
+
+@pytest.mark.parametrize("dim", ["model", "fuelType"])
+def test_counts_match_value_counts(df, cube, selections, dim):
+    for state, rows, mask in selections:
+        got = cube.counts(state, dim, rows)
+        assert got.to_dict() == counts(df[dim][mask]).to_dict(), state
+
+
+def test_means_match_pandas(df, cube, selections):
+    for state, rows, mask in selections:
+        got = cube.means(state, rows)
+        assert got["count"] == mask.sum(), state
+        for m in MEASURES:
+            if mask.any():
+                assert got[m] == pytest.approx(df[m][mask].mean(), rel=1e-6), state
+            else:
+                assert np.isnan(got[m]), state
+
+
+def test_off_grid_without_rows_raises(cube, selections):
+    state = next(s for s, _, _ in selections if not cube.exact(s))
+    with pytest.raises(ValueError):
+        cube.rollup(state, ("fuelType",))
+
+
+@pytest.mark.parametrize("cap", [50, 3])
+def test_outliers_lie_outside_fences(df, cube, selections, cap):
+    for state, rows, mask in selections[::4]:
+        box = cube.box_stats(state, "mpg", "fuelType", rows)
+        got = cube.outliers("mpg", box, "fuelType", rows, cap=cap)
+        assert len(got) == len(box), state
+        for label, lo, hi, points in zip(box["fuelType"], box["lowerfence"], box["upperfence"], got):
+            v = df["mpg"].to_numpy()[mask & (df["fuelType"] == label).to_numpy()]
+            outside = np.sort(v[(v < lo) | (v > hi)])
+            if len(outside) <= cap:
+                assert np.array_equal(np.sort(points), outside), (state, label)
+            else:
+                assert len(points) == cap, (state, label)
+                assert points.min() == outside[0] and points.max() == outside[-1]
+                assert np.isin(points, outside).all(), (state, label)
@@ -0,0 +1,42 @@
+import os
+import shutil
+import time
+
+import pytest
+
+import bmw_data
+from bmw_data import CSV_PATH, load_bmw, sidecar_dir
+
+
+@pytest.fixture
+def csv(tmp_path):
+    path = str(tmp_path / "bmw.csv")
+    shutil.copyfile(CSV_PATH, path)
+    return path
+
+
+def leave_tmp(root, age):
+    """A crashed writer's leftovers, ``age`` seconds old."""
+    stamp = time.time() - age
+    d = os.path.join(root, f".tmp-{age}")
+    os.makedirs(d)
+    open(os.path.join(d, "price.npy"), "wb").close()
+    f = os.path.join(root, f"manifest.json.{age}.tmp")
+    open(f, "w").close()
+    for p in (d, f):
+        os.utime(p, (stamp, stamp))
+    return d, f
+
+
+@pytest.mark.parametrize("rebuild", [True, False])
+def test_stale_temporaries_are_swept(csv, rebuild):
+    root = sidecar_dir(csv)
+    load_bmw(csv)
+    stale = leave_tmp(root, int(bmw_data.TMP_MAX_AGE) + 60)
+    fresh = leave_tmp(root, 5)
+    if rebuild:
+        os.remove(os.path.join(root, "manifest.json"))
+    df = load_bmw(csv)   # a rebuild runs write_sidecar, a plain load read_sidecar
+    assert len(df) == len(bmw_data.parse_csv(csv))
+    assert not any(os.path.exists(p) for p in stale)
+    assert all(os.path.exists(p) for p in fresh)
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+
+from bmw_data import counts
+from bmw_index import BITMAP_COLUMNS, DatasetIndex
+from conftest import reference_mask
+
+
+@pytest.fixture(scope="module")
+def index(df):
+    return DatasetIndex(df)
+
+
+@pytest.mark.parametrize("col", BITMAP_COLUMNS)
+def test_bitmap_select_matches_isin(df, index, col):
+    rng = np.random.default_rng(1)
+    labels = list(df[col].cat.categories) if hasattr(df[col], "cat") else sorted(df[col].unique())
+    for _ in range(20):
+        values = list(rng.choice(labels, size=rng.integers(1, len(labels) + 1), replace=False))
+        bits = index.bitmaps[col].select(values + ["no such value"])
+        assert np.array_equal(index.mask(bits), df[col].isin(values).to_numpy())
+    assert not index.mask(index.bitmaps[col].select([])).any()
+
+
+def test_resolve_matches_pandas(df, index, states):
+    for state in states:
+        sel = index.select(state)
+        expected = np.flatnonzero(reference_mask(df, state))
+        assert np.array_equal(sel.rows, expected), state
+        assert sel.count == len(expected)
+
+
+@pytest.mark.parametrize("col", ["fuelType", "transmission", "model"])
+def test_counts_match_value_counts(df, index, states, col):
+    for state in states[:50]:
+        mask = reference_mask(df, state)
+        got = index.counts(col, index.resolve(state))
+        assert got.to_dict() == counts(df[col][mask]).to_dict(), state
+
+
+def test_mean_matches_pandas(df, index, states):
+    for state in states[:50]:
+        mask = reference_mask(df, state)
+        got = index.mean("price", index.resolve(state))
+        if mask.any():
+            assert got == pytest.approx(df["price"][mask].mean())
+        else:
+            assert np.isnan(got)
+
+
+@pytest.mark.parametrize("col", ["year", "price", "mileage"])
+def test_sorted_index_rows_match_between(df, index, col):
+    values = df[col].to_numpy()
+    lo, hi = int(values.min()), int(values.max())
+    rng = np.random.default_rng(2)
+    bounds = [(lo, hi), (lo - 10**12, hi + 10**12), (hi + 1, hi + 5), (lo, lo)]
+    bounds += [tuple(sorted(rng.integers(lo - 5, hi + 6, size=2).tolist())) for _ in range(50)]
+    for a, b in bounds:
+        expected = np.flatnonzero((values >= a) & (values <= b))
+        assert np.array_equal(np.sort(index.ranges[col].rows(a, b)), expected), (a, b)
+
+
+@pytest.mark.parametrize("share", [0.0, 0.05, 0.5, 0.95, 1.0])
+def test_range_bits_each_strategy(df, index, share):
+    # selective ranges scatter, near-total ones clear, the rest scan
+    values = np.sort(df["price"].to_numpy())
+    lo = int(values[0])
+    hi = int(values[min(int(share * len(values)), len(values) - 1)]) if share else lo - 1
+    expected = df["price"].between(lo, hi).to_numpy()
+    assert np.array_equal(index.mask(index.range_bits("price", lo, hi)), expected)
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+from bmw_cube import SKETCHED, Cube
+from bmw_index import DatasetIndex
+from bmw_sketch import ALPHA
+from conftest import on_grid, reference_mask
+
+QS = [0, 0.1, 0.25, 0.5, 0.75, 0.9, 1]
+
+# relative error bound of a sketched quantile (see bmw_sketch)
+BOUND = (1 + ALPHA) / (1 - ALPHA) - 1
+
+
+@pytest.fixture(scope="module")
+def cube(df):
+    return Cube(df)
+
+
+@pytest.fixture(scope="module")
+def index(df):
+    return DatasetIndex(df)
+
+
+@pytest.fixture(scope="module")
+def selections(df, cube, index, states):
+    out = []
+    for state in states[:80]:
+        state = on_grid(cube, state)
+        out.append((state, index.select(state).rows, reference_mask(df, state)))
+    return out
+
+
+def reference_quantiles(df, mask, measure, by):
+    sel = df[mask]
+    if not len(sel):
+        return np.empty((0, len(QS)))
+    if not by:
+        return sel[measure].quantile(QS).to_numpy()[None, :]
+    return sel.groupby(list(by), observed=True)[measure].quantile(QS).unstack().to_numpy()
+
+
+@pytest.mark.parametrize("measure", SKETCHED)
+@pytest.mark.parametrize("by", [(), ("fuelType",), ("model", "transmission")])
+def test_exact_quantiles_match_pandas(df, cube, selections, measure, by):
+    for state, rows, mask in selections:
+        got = cube.quantiles(state, measure, QS, by, rows, exact=True)
+        want = reference_quantiles(df, mask, measure, by)
+        assert got.shape[0] == want.shape[0], state
+        np.testing.assert_allclose(got[QS].to_numpy(), want, rtol=1e-6, err_msg=str(state))
+
+
+@pytest.mark.parametrize("measure", SKETCHED)
+@pytest.mark.parametrize("by", [(), ("fuelType",), ("model", "transmission")])
+def test_sketch_quantiles_within_bound(cube, selections, measure, by):
+    for state, rows, _ in selections:
+        exact = cube.quantiles(state, measure, QS, by, rows, exact=True)
+        sketch = cube.quantiles(state, measure, QS, by, rows, exact=False)
+        assert np.array_equal(sketch["count"], exact["count"]), state
+        for dim in by:
+            assert list(sketch[dim]) == list(exact[dim]), state
+        want, got = exact[QS].to_numpy(), sketch[QS].to_numpy()
+        assert (np.abs(got - want) <= BOUND * np.abs(want) + 1e-9).all(), state
+
+
+def test_median_of_empty_selection_is_nan(cube, index, states):
+    state = states[0]._replace(model=())
+    assert np.isnan(cube.median(state, "price", index.select(state).rows))
+
+
+@pytest.mark.parametrize("by", [("fuelType",), ("transmission",)])
+def test_box_stats_match_pandas(df, cube, selections, by):
+    for state, rows, mask in selections:
+        box = cube.box_stats(state, "mpg", by, rows)
+        g = df[mask].groupby(list(by), observed=True)["mpg"]
+        q1, q3 = g.quantile(0.25), g.quantile(0.75)
+        lo, hi = g.min(), g.max()
+        iqr = q3 - q1
+        assert list(box[by[0]]) == list(q1.index), state
+        np.testing.assert_allclose(box["q1"], q1, rtol=1e-6)
+        np.testing.assert_allclose(box["median"], g.median(), rtol=1e-6)
+        np.testing.assert_allclose(box["q3"], q3, rtol=1e-6)
+        np.testing.assert_allclose(box["lowerfence"], np.maximum(lo, q1 - 1.5 * iqr), rtol=1e-6)
+        np.testing.assert_allclose(box["upperfence"], np.minimum(hi, q3 + 1.5 * iqr), rtol=1e-6)
+        assert np.array_equal(box["count"], g.size()), state
+
+
+@pytest.mark.parametrize("measure", ["mileage", "price"])
+@pytest.mark.parametrize("bins", [None, 20])
+def test_histogram_matches_np_histogram(df, cube, index, states, measure, bins):
+    values = df[measure].to_numpy()
+    for state in states[:40]:
+        for s in (state, on_grid(cube, state)):
+            mask = reference_mask(df, s)
+            edges, counts = cube.histogram(s, measure, index.select(s).rows, bins=bins)
+            assert edges[0] <= values.min() and values.max() < edges[-1]
+            assert np.array_equal(counts, np.histogram(values[mask], edges)[0]), s
+
+
+def test_grouped_histogram_matches_np_histogram(df, cube, index, states):
+    values, labels = df["mileage"].to_numpy(), cube.labels["fuelType"]
+    for state in states[:40]:
+        for s in (state, on_grid(cube, state)):
+            mask = reference_mask(df, s)
+            edges, counts = cube.histogram(s, "mileage", index.select(s).rows, by="fuelType")
+            assert counts.shape == (len(labels), len(edges) - 1)
+            for label, row in zip(labels, counts):
+                sel = mask & (df["fuelType"] == label).to_numpy()
+                assert np.array_equal(row, np.histogram(values[sel], edges)[0]), (s, label)
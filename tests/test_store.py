@@ -0,0 +1,107 @@
+import os
+import sqlite3
+
+import pytest
+
+import bmw_store
+from bmw_store import ResultStore, SharedCache, open_store
+
+
+@pytest.fixture
+def path(tmp_path):
+    os.chmod(tmp_path, 0o700)
+    return str(tmp_path / "results.sqlite")
+
+
+def entries(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+
+
+def test_round_trip_and_misses(path):
+    store = ResultStore(path, "v1", 1 << 20)
+    calls = []
+    for _ in range(3):
+        assert store.get_or_compute("chart", (1, "a"), lambda: calls.append(1) or {"x": [1, 2]}) \
+            == {"x": [1, 2]}
+    assert len(calls) == 1
+    assert store.get("chart", (2, "a")) is None
+    assert store.stats()["hits"] == 2 and store.stats()["misses"] == 2
+
+
+def test_tampered_row_is_a_miss(path):
+    store = ResultStore(path, "v1", 1 << 20)
+    store.put("chart", "k", [1, 2, 3])
+    with sqlite3.connect(path) as conn:
+        conn.execute("UPDATE results SET value = substr(value, 1, 32) || ?", (b"not a pickle",))
+    assert store.get("chart", "k", "missing") == "missing"
+    assert store.stats()["errors"] == 1
+
+
+def test_row_signed_with_another_key_is_a_miss(path):
+    ResultStore(path, "v1", 1 << 20).put("chart", "k", [1, 2, 3])
+    os.remove(path + ".key")
+    store = ResultStore(path, "v1", 1 << 20)
+    assert store.get("chart", "k", "missing") == "missing"
+    assert store.stats()["errors"] == 1
+
+
+def test_versions_key_entries(path, monkeypatch):
+    old = ResultStore(path, "v1", 1 << 20)
+    old.put("chart", "k", "old")
+    assert ResultStore(path, "v2", 1 << 20).get("chart", "k") is None
+    monkeypatch.setattr(bmw_store, "CODE_VERSION", "next-deploy")
+    new = ResultStore(path, "v1", 1 << 20)
+    assert new.get("chart", "k") is None
+    new.put("chart", "k", "new")
+    # a rolling deploy: the old workers still read their own entries
+    assert old.get("chart", "k") == "old" and new.get("chart", "k") == "new"
+
+
+def test_eviction_to_ninety_percent_oldest_first(path, monkeypatch):
+    clock = iter(range(1_000_000))
+    monkeypatch.setattr(bmw_store.time, "time", lambda: float(next(clock)))
+    store = ResultStore(path, "v1", 10_000)
+    blob = b"x" * 900
+    for i in range(11):
+        store.put("chart", i, blob)
+    count, nbytes = entries(path)
+    assert nbytes <= 9_000 and count < 11
+    assert store.get("chart", 10) == blob
+    survivors = [i for i in range(11) if store.get("chart", i) is not None]
+    assert survivors == list(range(11 - count, 11))
+
+
+def test_eviction_takes_other_versions_first(path, monkeypatch):
+    clock = iter(range(1_000_000))
+    monkeypatch.setattr(bmw_store.time, "time", lambda: float(next(clock)))
+    current, other = ResultStore(path, "v1", 10_000), ResultStore(path, "v0", 10_000)
+    for i in range(5):
+        current.put("chart", i, b"x" * 900)
+    for i in range(5):
+        other.put("chart", i, b"x" * 900)   # read more recently, but stale
+    current.put("chart", 5, b"x" * 900)
+    assert all(current.get("chart", i) is not None for i in range(6))
+    assert sum(other.get("chart", i) is not None for i in range(5)) < 5
+
+
+def test_private_directory_required(tmp_path, monkeypatch):
+    os.chmod(tmp_path, 0o777)
+    with pytest.raises(PermissionError):
+        ResultStore(str(tmp_path / "results.sqlite"), "v1", 1 << 20)
+    monkeypatch.setenv("BMW_SHARED_CACHE", str(tmp_path / "results.sqlite"))
+    assert open_store("v1") is None
+
+
+def test_shared_cache_reads_through_the_store(path):
+    store, calls = ResultStore(path, "v1", 1 << 20), []
+
+    def compute():
+        calls.append(1)
+        return "value"
+
+    assert SharedCache(1 << 20, store).get_or_compute("tab", "k", compute) == "value"
+    # another process: empty memory tier, same file
+    assert SharedCache(1 << 20, ResultStore(path, "v1", 1 << 20)).get_or_compute(
+        "tab", "k", compute) == "value"
+    assert len(calls) == 1
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+
+from bmw_index import DatasetIndex
+from bmw_table import filter_rows, parse_query, sort_rows
+
+
+@pytest.fixture(scope="module")
+def index(df):
+    return DatasetIndex(df)
+
+
+@pytest.mark.parametrize("query, terms", [
+    ("{price} >= 20000", [("price", "ge", "20000")]),
+    ("price<5000 && {model} contains X", [("price", "lt", "5000"), ("model", "contains", "X")]),
+    ('{fuelType} = "Diesel"', [("fuelType", "eq", "Diesel")]),
+    ("{model} ieq ' 3 Series'", [("model", "eq", " 3 Series")]),
+    ("{year} sge 2019 && nonsense", [("year", "ge", "2019")]),
+    ("", []),
+    (None, []),
+])
+def test_parse_query(query, terms):
+    assert parse_query(query) == terms
+
+
+def reference_filter(df, rows, terms):
+    sub = df.iloc[rows]
+    keep = np.ones(len(sub), dtype=bool)
+    for col, op, value in terms:
+        s = sub[col]
+        if s.dtype == "category":
+            s, value = s.astype(str).str.lower(), value.lower()
+        elif op not in ("contains", "datestartswith"):
+            s = s.astype(np.float64).round(1)
+            value = float(value)
+        else:
+            s = s.astype(np.float64).round(1).astype(str) if s.dtype == np.float32 else s.astype(str)
+        if op == "contains":
+            keep &= s.str.contains(value, regex=False).to_numpy()
+        elif op == "datestartswith":
+            keep &= s.str.startswith(value).to_numpy()
+        else:
+            keep &= getattr(s, op)(value).to_numpy()
+    return rows[keep]
+
+
+def random_query(df, rng):
+    terms = []
+    for _ in range(rng.integers(1, 4)):
+        col = rng.choice(["price", "mileage", "year", "mpg", "engineSize",
+                          "model", "transmission", "fuelType"])
+        if df[col].dtype == "category":
+            label = str(rng.choice(df[col].cat.categories))
+            op = rng.choice(["=", "!=", "contains"])
+            value = label[1:3] if op == "contains" else label.upper()
+        else:
+            op = rng.choice(["=", "!=", "<", "<=", ">", ">="])
+            value = str(rng.choice(df[col].to_numpy()).round(1)) if col in ("mpg", "engineSize") \
+                else str(int(rng.choice(df[col].to_numpy())))
+        terms.append(f"{{{col}}} {op} {value}")
+    return " && ".join(terms)
+
+
+def test_filter_rows_matches_pandas(df, index, states):
+    rng = np.random.default_rng(3)
+    for state in states[:100]:
+        rows = index.select(state).rows
+        query = random_query(df, rng)
+        got = filter_rows(df, rows, query)
+        assert np.array_equal(got, reference_filter(df, rows, parse_query(query))), (state, query)
+
+
+def test_filter_rows_contains_numbers(df):
+    rows = np.arange(len(df))
+    got = filter_rows(df, rows, "{mileage} contains 999")
+    assert np.array_equal(got, np.flatnonzero(df["mileage"].astype(str).str.contains("999")))
+
+
+@pytest.mark.parametrize("sort_by", [
+    [{"column_id": "price", "direction": "desc"}],
+    [{"column_id": "model", "direction": "asc"}, {"column_id": "mileage", "direction": "desc"}],
+    [{"column_id": "fuelType", "direction": "desc"}, {"column_id": "year", "direction": "asc"}],
+    [{"column_id": "mpg", "direction": "asc"}],
+    [],
+])
+def test_sort_rows_matches_stable_sort(df, index, states, sort_by):
+    for state in states[:50]:
+        rows = index.select(state).rows
+        sub = df.iloc[rows].astype({c: str for c in ("model", "transmission", "fuelType")})
+        want = rows if not sort_by else \
+            sub.assign(_row=rows).sort_values(
+                [s["column_id"] for s in sort_by],
+                ascending=[s["direction"] == "asc" for s in sort_by], kind="stable")["_row"].to_numpy()
+        assert np.array_equal(sort_rows(df, rows, sort_by), want), (state, sort_by)